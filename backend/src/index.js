@@ -1,3 +1,4 @@
+const crypto = require('crypto');
 const express = require('express');
 const cors = require('cors');
 
@@ -22,6 +23,26 @@ app.use(cors(corsOptions));
 
 app.use(express.json());
 
+// Log requests carrying the bot's trace id with their duration, so a slow
+// WhatsApp reply can be matched to the backend calls it made. The bot's ids
+// are 16 hex digits; anything else gets a fresh id instead of being echoed
+// into the response headers and the log
+const TRACE_ID = /^[0-9a-f]{16}$/;
+
+app.use((req, res, next) => {
+  let traceId = req.get('X-Trace-Id');
+  if (!traceId) return next();
+  if (!TRACE_ID.test(traceId)) traceId = crypto.randomBytes(8).toString('hex');
+
+  const start = process.hrtime.bigint();
+  res.setHeader('X-Trace-Id', traceId);
+  res.on('finish', () => {
+    const ms = Number(process.hrtime.bigint() - start) / 1e6;
+    console.log(`[trace ${traceId}] ${req.method} ${req.originalUrl} ${res.statusCode} ${ms.toFixed(1)}ms`);
+  });
+  next();
+});
+
 // Routes
 app.use('/api/auth', require('./routes/auth'));
 app.use('/api/admin', authMiddleware(['ADMIN']),require('./routes/admin'));
@@ -0,0 +1,25 @@
+const crypto = require('crypto');
+
+// Weak ETag built from row versions (row counts and latest update times)
+// instead of the response body, so an unchanged resource can be answered
+// with a 304 before its full query runs
+const versionTag = (...parts) => {
+  const hash = crypto.createHash('sha1');
+  for (const part of parts) {
+    hash.update(`${part instanceof Date ? part.getTime() : part}|`);
+  }
+  return `W/"${hash.digest('base64url')}"`;
+};
+
+// Sets the ETag and answers 304 if the client's copy is still current.
+// Returns true when the response has been sent.
+const notModified = (req, res, tag) => {
+  res.set({ ETag: tag, 'Cache-Control': 'private, no-cache' });
+  if (req.fresh) {
+    res.status(304).end();
+    return true;
+  }
+  return false;
+};
+
+module.exports = { versionTag, notModified };
@@ -1,6 +1,15 @@
 const express = require('express');
 const router = express.Router();
+const crypto = require('crypto');
+const { Prisma } = require('@prisma/client');
 const prisma = require('../config/prisma'); // adjust path as needed
+const { versionTag, notModified } = require('../middleware/etag');
+
+// Runs in the transaction of every attendance write, so the attendance ETag changes with each
+// commit whatever order they land in; raw SQL leaves Session.updatedAt, which versions the
+// session list, alone
+const bumpAttendanceVersion = (client, sessionId) =>
+  client.$executeRaw`UPDATE "Session" SET "attendanceVersion" = "attendanceVersion" + 1 WHERE "id" = ${sessionId}`;
 
 // @route   GET /api/teachers/assignments
 // @desc    Get teaching assignments for the logged in teacher
@@ -9,6 +18,20 @@ router.get('/assignments', async (req, res) => {
   try {
     const teacherId = req.user.teacher.id;  // We are able to do this because of the auth middleware
     
+    // Courses and branches are never edited, so the assignment rows alone version the list
+    const version = await prisma.teachingAssignment.aggregate({
+      where: {
+        teacherId,
+        active: true
+      },
+      _count: { _all: true },
+      _max: { updatedAt: true }
+    });
+
+    if (notModified(req, res, versionTag('assignments', teacherId, version._count._all, version._max.updatedAt))) {
+      return;
+    }
+
     const assignments = await prisma.teachingAssignment.findMany({
       where: {
         teacherId,
@@ -32,6 +55,129 @@ router.get('/assignments', async (req, res) => {
   }
 });
 
+// @route   GET /api/teachers/assignments/:assignmentId/attendance
+// @desc    Get the full attendance history (every session, every student) for a teaching assignment
+//          Pass ?limit=N (and ?cursor=<last student id>) to page through the
+//          students; each page carries only that page's records, sessions are
+//          sent with the first page and the response includes nextCursor
+// @access  Teacher
+router.get('/assignments/:assignmentId/attendance', async (req, res) => {
+  const { assignmentId } = req.params;
+  const { limit, cursor } = req.query;
+
+  try {
+    // Verify the teacher is assigned to this course
+    const assignment = await prisma.teachingAssignment.findFirst({
+      where: {
+        id: assignmentId,
+        teacherId: req.user.teacher.id,
+        active: true
+      }
+    });
+
+    if (!assignment) {
+      return res.status(403).json({ message: 'Not authorized to view attendance for this course' });
+    }
+
+    const studentSelect = {
+      id: true,
+      rollNumber: true,
+      user: {
+        select: {
+          firstName: true,
+          lastName: true
+        }
+      }
+    };
+
+    if (limit !== undefined) {
+      const take = Math.min(Math.max(parseInt(limit, 10) || 100, 1), 500);
+
+      // Fetch one extra row to know whether another page exists
+      const rows = await prisma.student.findMany({
+        where: {
+          attendances: {
+            some: { session: { assignmentId } }
+          }
+        },
+        select: studentSelect,
+        orderBy: {
+          rollNumber: 'asc'
+        },
+        take: take + 1,
+        ...(cursor && { cursor: { id: cursor }, skip: 1 })
+      });
+
+      const hasMore = rows.length > take;
+      const students = hasMore ? rows.slice(0, take) : rows;
+
+      const records = await prisma.attendance.findMany({
+        where: {
+          session: { assignmentId },
+          studentId: { in: students.map(student => student.id) }
+        },
+        select: {
+          sessionId: true,
+          studentId: true,
+          present: true
+        }
+      });
+
+      const sessions = cursor ? undefined : await prisma.session.findMany({
+        where: { assignmentId },
+        select: { id: true, date: true, topic: true },
+        orderBy: [
+          { date: 'asc' },
+          { id: 'asc' }
+        ]
+      });
+
+      return res.json({
+        sessions,
+        students,
+        records,
+        nextCursor: hasMore ? students[students.length - 1].id : null
+      });
+    }
+
+    const sessions = await prisma.session.findMany({
+      where: { assignmentId },
+      select: { id: true, date: true, topic: true },
+      orderBy: [
+        { date: 'asc' },
+        { id: 'asc' }
+      ]
+    });
+
+    // Only the fields needed to build the matrix, no nested objects
+    const records = await prisma.attendance.findMany({
+      where: {
+        session: { assignmentId }
+      },
+      select: {
+        sessionId: true,
+        studentId: true,
+        present: true
+      }
+    });
+
+    const students = await prisma.student.findMany({
+      where: {
+        id: { in: [...new Set(records.map(record => record.studentId))] }
+      },
+      select: studentSelect,
+      orderBy: {
+        rollNumber: 'asc'
+      }
+    });
+
+    res.json({ sessions, students, records });
+  } catch (error) {
+    console.error('Get assignment attendance error:', error);
+    res.status(500).json({ message: 'Server error' });
+  }
+});
+
 // @route   POST /api/teachers/sessions
 // @desc    Create a new class session
 // @access  Teacher
@@ -99,9 +245,12 @@ router.post('/sessions', async (req, res) => {
 
 // @route   GET /api/teachers/sessions/:assignmentId
 // @desc    Get all sessions for a teaching assignment
+//          Pass ?limit=N (and ?cursor=<last session id>) to page through
+//          the history; the response is then { sessions, nextCursor }
 // @access  Teacher
 router.get('/sessions/:assignmentId', async (req, res) => {
   const { assignmentId } = req.params;
+  const { limit, cursor } = req.query;
 
   try {
     // Verify the teacher is assigned to this course
@@ -117,6 +266,42 @@ router.get('/sessions/:assignmentId', async (req, res) => {
       return res.status(403).json({ message: 'Not authorized to view sessions for this course' });
     }
 
+    const version = await prisma.session.aggregate({
+      where: { assignmentId },
+      _count: { _all: true },
+      _max: { updatedAt: true }
+    });
+
+    if (notModified(req, res, versionTag('sessions', assignmentId, limit, cursor,
+      version._count._all, version._max.updatedAt))) {
+      return;
+    }
+
+    if (limit !== undefined) {
+      const take = Math.min(Math.max(parseInt(limit, 10) || 10, 1), 100);
+
+      // Fetch one extra row to know whether another page exists
+      const rows = await prisma.session.findMany({
+        where: {
+          assignmentId
+        },
+        orderBy: [
+          { date: 'desc' },
+          { id: 'desc' }
+        ],
+        take: take + 1,
+        ...(cursor && { cursor: { id: cursor }, skip: 1 })
+      });
+
+      const hasMore = rows.length > take;
+      const page = hasMore ? rows.slice(0, take) : rows;
+
+      return res.json({
+        sessions: page,
+        nextCursor: hasMore ? page[page.length - 1].id : null
+      });
+    }
+
     // Get sessions
     const sessions = await prisma.session.findMany({
       where: {
@@ -134,11 +319,22 @@ router.get('/sessions/:assignmentId', async (req, res) => {
   }
 });
 
+// Rows whose markedAt is slightly older than a delta cursor are sent again,
+// so a write stamped just before the previous delta but committed after it is
+// not missed; clients apply deltas idempotently
+const DELTA_OVERLAP_MS = 5000;
+
 // @route   GET /api/teachers/sessions/:sessionId/attendance
 // @desc    Get attendance for a specific session
+//          Pass ?since=<markedAt> to get only the records changed since then;
+//          the response is then { records, cursor }, where cursor is the
+//          latest markedAt seen and is passed as since on the next call
+//          Pass ?format=roster for the bot's compact roster: parallel arrays
+//          of only the fields it reads, plus the delta cursor
 // @access  Teacher
 router.get('/sessions/:sessionId/attendance', async (req, res) => {
   const { sessionId } = req.params;
+  const { since, format } = req.query;
 
   try {
     // First verify this session belongs to this teacher
@@ -153,6 +349,105 @@ router.get('/sessions/:sessionId/attendance', async (req, res) => {
       return res.status(403).json({ message: 'Not authorized to view this session' });
     }
 
+    if (since !== undefined) {
+      const sinceTime = Date.parse(since);
+      if (Number.isNaN(sinceTime)) {
+        return res.status(400).json({ message: 'since must be an ISO timestamp' });
+      }
+
+      const records = await prisma.attendance.findMany({
+        where: {
+          sessionId,
+          markedAt: { gt: new Date(sinceTime - DELTA_OVERLAP_MS) }
+        },
+        select: {
+          id: true,
+          sessionId: true,
+          studentId: true,
+          enrollmentId: true,
+          present: true,
+          markedAt: true,
+          // Only needed for students added to the session after the roster was fetched
+          student: {
+            select: {
+              id: true,
+              rollNumber: true,
+              user: {
+                select: {
+                  firstName: true,
+                  lastName: true
+                }
+              }
+            }
+          }
+        }
+      });
+
+      const latest = records.reduce((max, record) => Math.max(max, record.markedAt.getTime()), sinceTime);
+      return res.json({ records, cursor: new Date(latest).toISOString() });
+    }
+
+    // Marks are versioned by the session's attendanceVersion, read above before the body query, so a
+    // write committing in between can only make the tag older than the body; new sessions fill in
+    // their rows outside a transaction, hence the count. Student names come from their users
+    const [marks, names] = await Promise.all([
+      prisma.attendance.aggregate({
+        where: { sessionId },
+        _count: { _all: true }
+      }),
+      prisma.user.aggregate({
+        where: { student: { attendances: { some: { sessionId } } } },
+        _max: { updatedAt: true }
+      })
+    ]);
+
+    if (notModified(req, res, versionTag('attendance', sessionId, format, session.attendanceVersion,
+      marks._count._all, names._max.updatedAt))) {
+      return;
+    }
+
+    if (format === 'roster') {
+      const rows = await prisma.attendance.findMany({
+        where: {
+          sessionId
+        },
+        select: {
+          studentId: true,
+          present: true,
+          markedAt: true,
+          student: {
+            select: {
+              rollNumber: true,
+              user: {
+                select: {
+                  firstName: true,
+                  lastName: true
+                }
+              }
+            }
+          }
+        },
+        orderBy: {
+          student: {
+            rollNumber: 'asc'
+          }
+        }
+      });
+
+      const roster = { cursor: null, studentIds: [], present: [], rollNumbers: [], firstNames: [], lastNames: [] };
+      let latest = null;
+      for (const row of rows) {
+        roster.studentIds.push(row.studentId);
+        roster.present.push(row.present ? 1 : 0);
+        roster.rollNumbers.push(row.student.rollNumber);
+        roster.firstNames.push(row.student.user.firstName);
+        roster.lastNames.push(row.student.user.lastName);
+        if (!latest || row.markedAt > latest) latest = row.markedAt;
+      }
+      roster.cursor = latest && latest.toISOString();
+      return res.json(roster);
+    }
+
     // Get attendance with student details
     const attendance = await prisma.attendance.findMany({
       where: {
@@ -191,6 +486,10 @@ router.put('/attendance/:attendanceId', async (req, res) => {
   const { attendanceId } = req.params;
   const { present } = req.body;
 
+  if (typeof present !== 'boolean') {
+    return res.status(400).json({ message: 'present must be a boolean' });
+  }
+
   try {
     // Verify this attendance record belongs to a session taught by this teacher
     const attendance = await prisma.attendance.findUnique({
@@ -209,14 +508,17 @@ router.put('/attendance/:attendanceId', async (req, res) => {
     }
 
     // Update attendance
-    const updatedAttendance = await prisma.attendance.update({
-      where: { id: attendanceId },
-      data: {
-        present,
-        markedBy: req.user.id,
-        markedAt: new Date() // Update timestamp when attendance is modified
-      }
-    });
+    const [updatedAttendance] = await prisma.$transaction([
+      prisma.attendance.update({
+        where: { id: attendanceId },
+        data: {
+          present,
+          markedBy: req.user.id,
+          markedAt: new Date() // Update timestamp when attendance is modified
+        }
+      }),
+      bumpAttendanceVersion(prisma, attendance.sessionId)
+    ]);
 
     res.json(updatedAttendance);
   } catch (error) {
@@ -237,6 +539,10 @@ router.put('/attendance/batch/:sessionId', async (req, res) => {
       return res.status(400).json({ msg: 'Attendance records array is required' });
     }
 
+    if (!attendanceRecords.every(record => typeof record?.studentId === 'string' && typeof record.present === 'boolean')) {
+      return res.status(400).json({ msg: 'Each attendance record needs a studentId and a boolean present' });
+    }
+
     // Verify the session exists and belongs to the teacher
     const session = await prisma.session.findUnique({
       where: { id: sessionId },
@@ -256,14 +562,14 @@ router.put('/attendance/batch/:sessionId', async (req, res) => {
     // Get the specific assignment details to filter students correctly
     const assignment = session.assignment;
 
-    // Process each attendance record in the batch
-    const results = await Promise.all(attendanceRecords.map(async record => {
-      const { studentId, present } = record;
-      
-      // Find the enrollment for this student-session combination
-      const enrollment = await prisma.enrollment.findFirst({
+    // A student listed twice keeps their last mark
+    const marks = new Map(attendanceRecords.map(({ studentId, present }) => [studentId, present]));
+
+    const results = await prisma.$transaction(async tx => {
+      // Resolve every student's enrollment in this specific class section in one query
+      const enrollments = await tx.enrollment.findMany({
         where: {
-          studentId,
+          studentId: { in: [...marks.keys()] },
           courseId: assignment.courseId,
           semester: assignment.semester,
           section: assignment.section,
@@ -271,37 +577,41 @@ router.put('/attendance/batch/:sessionId', async (req, res) => {
             branchId: assignment.branchId
           },
           active: true
-        }
+        },
+        select: { id: true, studentId: true }
       });
+      // Keep one enrollment per student, as findFirst did
+      const enrollmentIds = new Map();
+      for (const { studentId, id } of enrollments) {
+        if (!enrollmentIds.has(studentId)) enrollmentIds.set(studentId, id);
+      }
 
-      if (!enrollment) {
-        return { studentId, status: 'failed', msg: 'Student not enrolled in this specific class section' };
+      // Insert or update all rows in one statement; ids are generated here as Prisma would
+      const markedAt = new Date();
+      const rows = [...enrollmentIds].map(([studentId, enrollmentId]) =>
+        Prisma.sql`(${crypto.randomUUID()}, ${studentId}, ${enrollmentId}, ${marks.get(studentId)})`
+      );
+      const written = rows.length === 0 ? [] : await tx.$queryRaw`
+        INSERT INTO "Attendance" ("id", "sessionId", "studentId", "enrollmentId", "present", "markedAt", "markedBy")
+        SELECT v."id", ${sessionId}, v."studentId", v."enrollmentId", v."present", ${markedAt}, ${req.user.id}
+        FROM (VALUES ${Prisma.join(rows)}) AS v("id", "studentId", "enrollmentId", "present")
+        ON CONFLICT ("sessionId", "studentId") DO UPDATE
+        SET "present" = EXCLUDED."present", "markedAt" = EXCLUDED."markedAt", "markedBy" = EXCLUDED."markedBy"
+        RETURNING *
+      `;
+      if (written.length > 0) {
+        await bumpAttendanceVersion(tx, sessionId);
       }
+      const attendanceByStudent = new Map(written.map(attendance => [attendance.studentId, attendance]));
 
-      // Update or create attendance record
-      const attendance = await prisma.attendance.upsert({
-        where: {
-          sessionId_studentId: {
-            sessionId,
-            studentId
-          }
-        },
-        update: {
-          present,
-          markedAt: new Date(),
-          markedBy: req.user.id
-        },
-        create: {
-          sessionId,
-          studentId,
-          enrollmentId: enrollment.id,
-          present,
-          markedBy: req.user.id
+      // Same per-record shape and order as the request
+      return attendanceRecords.map(({ studentId }) => {
+        if (!enrollmentIds.has(studentId)) {
+          return { studentId, status: 'failed', msg: 'Student not enrolled in this specific class section' };
         }
+        return { studentId, status: 'success', attendance: attendanceByStudent.get(studentId) };
       });
-
-      return { studentId, status: 'success', attendance };
-    }));
+    });
 
     res.json(results);
   } catch (err) {
@@ -0,0 +1,160 @@
+from typing import Dict, List, Tuple
+from collections import deque
+from contextlib import asynccontextmanager
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Priority classes, lower is more urgent
+PRIORITY_ROLL_CALL = 0      # marking attendance, student check-ins
+PRIORITY_INTERACTIVE = 1    # login, choosing a session, entering a topic, student queries
+PRIORITY_BROWSING = 2       # assignment lists, help text, reports
+PRIORITY_NAMES = {
+    PRIORITY_ROLL_CALL: "roll_call",
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_BROWSING: "browsing"
+}
+
+# Webhooks processed at once; the rest wait in a priority queue of bounded length
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "32"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "200"))
+# How long a queued webhook may wait for a slot, per priority. Twilio gives up
+# on a webhook after 15 seconds, so roll-call traffic gets most of that budget.
+ADMISSION_DEADLINES = {
+    PRIORITY_ROLL_CALL: 8.0,
+    PRIORITY_INTERACTIVE: 4.0,
+    PRIORITY_BROWSING: 2.0
+}
+# Queue waits kept for the percentile metrics
+WAIT_SAMPLE_SIZE = 1000
+
+
+class AdmissionController:
+    """Bounded concurrency with a priority queue and per-priority deadlines.
+
+    When the queue is full a new request displaces the least urgent queued one
+    if it is more urgent; otherwise it is shed. Queued requests that reach
+    their deadline are shed as well. Shed requests get a cheap busy reply.
+    """
+
+    def __init__(self, max_concurrent: int = ADMISSION_MAX_CONCURRENT, max_queue: int = ADMISSION_MAX_QUEUE,
+                 deadlines: Dict[int, float] = ADMISSION_DEADLINES):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.deadlines = deadlines
+        self.active = 0
+        # Heap of (priority, arrival sequence, future); displaced entries stay until popped
+        self.queue: List[Tuple[int, int, asyncio.Future]] = []
+        self.queued = 0
+        self.sequence = itertools.count()
+        self.admitted = {priority: 0 for priority in PRIORITY_NAMES}
+        self.shed = {reason: {priority: 0 for priority in PRIORITY_NAMES}
+                     for reason in ("queue_full", "displaced", "deadline")}
+        self.waits: deque = deque(maxlen=WAIT_SAMPLE_SIZE)
+
+    async def acquire(self, priority: int) -> Tuple[bool, float]:
+        """Wait for a slot; returns (admitted, seconds spent queued)"""
+        if self.active < self.max_concurrent and not self.queued:
+            self.active += 1
+            self.admitted[priority] += 1
+            return True, 0.0
+
+        if self.queued >= self.max_queue and not self._displace(priority):
+            self.shed["queue_full"][priority] += 1
+            return False, 0.0
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.queue, (priority, next(self.sequence), future))
+        self.queued += 1
+        start = time.perf_counter()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.deadlines[priority])
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            # The client went away; hand a slot granted meanwhile to the next waiter
+            if future.done() and future.result():
+                self.release()
+            elif not future.done():
+                future.cancel()
+                self.queued -= 1
+            raise
+
+        # A slot granted just as the deadline fired is still taken
+        if future.done():
+            admitted = future.result()
+        else:
+            future.cancel()
+            self.queued -= 1
+            admitted = False
+            self.shed["deadline"][priority] += 1
+
+        waited = time.perf_counter() - start
+        self.waits.append(waited)
+        if admitted:
+            self.admitted[priority] += 1
+        return admitted, waited
+
+    def _displace(self, priority: int) -> bool:
+        """Shed the least urgent, most recent queued request if it is less urgent than priority"""
+        candidates = [entry for entry in self.queue if not entry[2].done()]
+        if not candidates:
+            return False
+        victim = max(candidates, key=lambda entry: (entry[0], entry[1]))
+        if victim[0] <= priority:
+            return False
+
+        victim[2].set_result(False)
+        self.queued -= 1
+        self.shed["displaced"][victim[0]] += 1
+        return True
+
+    def release(self):
+        self.active -= 1
+        while self.queue:
+            _, _, future = heapq.heappop(self.queue)
+            if not future.done():
+                self.queued -= 1
+                self.active += 1
+                future.set_result(True)
+                return
+
+    @asynccontextmanager
+    async def slot(self, priority: int):
+        """Hold a processing slot for the enclosed block; yields (admitted, seconds queued)"""
+        admitted, waited = await self.acquire(priority)
+        try:
+            yield admitted, waited
+        finally:
+            if admitted:
+                self.release()
+
+    def metrics(self) -> Dict:
+        waits = sorted(self.waits)
+
+        def percentile(p: float) -> float:
+            return round(waits[min(int(len(waits) * p), len(waits) - 1)] * 1000, 1) if waits else 0.0
+
+        return {
+            "maxConcurrent": self.max_concurrent,
+            "maxQueue": self.max_queue,
+            "active": self.active,
+            "queued": self.queued,
+            "admitted": {PRIORITY_NAMES[p]: count for p, count in self.admitted.items()},
+            "shed": {
+                reason: {PRIORITY_NAMES[p]: count for p, count in counts.items()}
+                for reason, counts in self.shed.items()
+            },
+            "queueWaitMs": {
+                "samples": len(waits),
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+                "max": round(waits[-1] * 1000, 1) if waits else 0.0
+            }
+        }
@@ -0,0 +1,208 @@
+from typing import Dict, List, Optional, Set
+from datetime import datetime, timedelta
+import logging
+
+import numpy as np
+
+from models import AssignmentAttendance
+
+logger = logging.getLogger(__name__)
+
+# Reload a matrix from the backend after this long, to pick up marks made outside the bot
+ANALYTICS_TTL = timedelta(minutes=10)
+# Upper bound on the number of assignment matrices kept in memory
+MAX_CACHED_ASSIGNMENTS = 256
+DEFAULT_THRESHOLD = 75.0
+# Shown by the bot and the API for a threshold outside 0 < threshold <= 100
+THRESHOLD_ERROR = "Threshold must be above 0 and at most 100"
+
+
+class AttendanceMatrix:
+    """Students x sessions boolean attendance matrix for one teaching assignment.
+
+    Columns are sessions in chronological order. The array is over-allocated
+    along both axes so new sessions and students can be appended without
+    copying it each time.
+    """
+
+    def __init__(self, assignment_id: str, students: List[Dict], session_ids: List[str]):
+        self.assignment_id = assignment_id
+        self.students = students
+        self.student_index = {student['id']: i for i, student in enumerate(students)}
+        self.session_ids = list(session_ids)
+        self.session_index = {session_id: j for j, session_id in enumerate(self.session_ids)}
+        capacity = max(8, len(self.session_ids) * 2)
+        self.present = np.zeros((len(students), capacity), dtype=bool)
+        self.loaded_at = datetime.now()
+        self.tokens: Set[str] = set()
+
+    @classmethod
+    def from_history(cls, assignment_id: str, history: AssignmentAttendance) -> "AttendanceMatrix":
+        """Build a matrix from the /assignments/:id/attendance payload"""
+        sessions = history.sessions
+        students = [
+            {"id": student.id, "rollNumber": student.rollNumber, "name": student.name}
+            for student in history.students
+        ]
+        matrix = cls(assignment_id, students, [s.id for s in sessions])
+
+        records = history.records
+        if records:
+            rows = np.fromiter(
+                (matrix.student_index.get(r.studentId, -1) for r in records), dtype=np.int64, count=len(records)
+            )
+            cols = np.fromiter(
+                (matrix.session_index.get(r.sessionId, -1) for r in records), dtype=np.int64, count=len(records)
+            )
+            values = np.fromiter((r.present for r in records), dtype=bool, count=len(records))
+            known = (rows >= 0) & (cols >= 0)
+            matrix.present[rows[known], cols[known]] = values[known]
+
+        return matrix
+
+    @property
+    def session_count(self) -> int:
+        return len(self.session_ids)
+
+    def view(self) -> np.ndarray:
+        """The populated part of the matrix"""
+        return self.present[:len(self.students), :self.session_count]
+
+    def add_session(self, session_id: str):
+        """Append an empty (all absent) column for a newly created session"""
+        if session_id in self.session_index:
+            return
+        if self.session_count == self.present.shape[1]:
+            grown = np.zeros((self.present.shape[0], self.present.shape[1] * 2), dtype=bool)
+            grown[:, :self.session_count] = self.present[:, :self.session_count]
+            self.present = grown
+        self.session_index[session_id] = self.session_count
+        self.session_ids.append(session_id)
+
+    def add_student(self, student: Dict) -> int:
+        """Append a row for a student who was not in the loaded history"""
+        row = self.student_index[student['id']] = len(self.students)
+        if row == self.present.shape[0]:
+            grown = np.zeros((max(8, row * 2), self.present.shape[1]), dtype=bool)
+            grown[:row] = self.present
+            self.present = grown
+        self.students.append(student)
+        return row
+
+    def apply_marks(self, session_id: str, records: List[Dict]):
+        """Apply {"studentId", "present"} marks for one session in place"""
+        col = self.session_index.get(session_id)
+        if col is None:
+            return
+        for record in records:
+            row = self.student_index.get(record['studentId'])
+            if row is None:
+                row = self.add_student({"id": record['studentId']})
+            self.present[row, col] = bool(record.get('present'))
+
+    def percentages(self) -> np.ndarray:
+        """Per-student attendance percentage over all sessions"""
+        if not self.session_count:
+            return np.zeros(len(self.students))
+        return self.view().sum(axis=1) * (100.0 / self.session_count)
+
+    def absence_streaks(self) -> np.ndarray:
+        """Per-student number of consecutive absences up to the latest session"""
+        latest_first = self.view()[:, ::-1]
+        ever_present = latest_first.any(axis=1)
+        return np.where(ever_present, latest_first.argmax(axis=1), self.session_count)
+
+    def student_stats(self, rows: Optional[np.ndarray] = None) -> List[Dict]:
+        """Per-student percentage, attended count and current absence streak"""
+        percentages = self.percentages()
+        streaks = self.absence_streaks()
+        attended = self.view().sum(axis=1)
+        if rows is None:
+            rows = np.arange(len(self.students))
+
+        return [
+            {
+                "studentId": self.students[i]['id'],
+                "rollNumber": self.students[i].get('rollNumber'),
+                "name": self.students[i].get('name', ''),
+                "attended": int(attended[i]),
+                "percentage": round(float(percentages[i]), 1),
+                "absenceStreak": int(streaks[i])
+            }
+            for i in rows
+        ]
+
+    def defaulters(self, threshold: float = DEFAULT_THRESHOLD) -> List[Dict]:
+        """Students below the threshold, lowest attendance first"""
+        percentages = self.percentages()
+        below = np.flatnonzero(percentages < threshold)
+        below = below[np.argsort(percentages[below], kind='stable')]
+        return self.student_stats(below)
+
+    def summary(self, threshold: float = DEFAULT_THRESHOLD) -> Dict:
+        """Assignment level report used by the bot command and the API"""
+        percentages = self.percentages()
+        return {
+            "assignmentId": self.assignment_id,
+            "totalSessions": self.session_count,
+            "totalStudents": len(self.students),
+            "averagePercentage": round(float(percentages.mean()), 1) if len(percentages) else 0.0,
+            "threshold": threshold,
+            "defaulters": self.defaulters(threshold)
+        }
+
+
+class AttendanceAnalytics:
+    """Process-wide cache of attendance matrices, kept current from the bot's own writes"""
+
+    def __init__(self, ttl: timedelta = ANALYTICS_TTL, max_assignments: int = MAX_CACHED_ASSIGNMENTS):
+        self.ttl = ttl
+        self.max_assignments = max_assignments
+        self.matrices: Dict[str, AttendanceMatrix] = {}
+        self.session_assignments: Dict[str, str] = {}
+
+    def get(self, assignment_id: str, user_token: str) -> Optional[AttendanceMatrix]:
+        """Cached matrix if it is fresh and this token has already loaded it"""
+        matrix = self.matrices.get(assignment_id)
+        if matrix is None or user_token not in matrix.tokens:
+            return None
+        if datetime.now() - matrix.loaded_at > self.ttl:
+            self.discard(assignment_id)
+            return None
+        return matrix
+
+    def load(self, assignment_id: str, history: AssignmentAttendance, user_token: str) -> AttendanceMatrix:
+        """Build and cache a matrix from a freshly fetched history"""
+        if assignment_id not in self.matrices and len(self.matrices) >= self.max_assignments:
+            oldest = min(self.matrices.values(), key=lambda m: m.loaded_at)
+            self.discard(oldest.assignment_id)
+
+        previous = self.matrices.get(assignment_id)
+        matrix = AttendanceMatrix.from_history(assignment_id, history)
+        # The backend authorized this token for the assignment when it returned the history
+        matrix.tokens = (previous.tokens if previous else set()) | {user_token}
+        self.matrices[assignment_id] = matrix
+        for session_id in matrix.session_ids:
+            self.session_assignments[session_id] = assignment_id
+
+        logger.info(f"Loaded attendance matrix for {assignment_id}: "
+                    f"{len(matrix.students)} students x {matrix.session_count} sessions")
+        return matrix
+
+    def discard(self, assignment_id: str):
+        matrix = self.matrices.pop(assignment_id, None)
+        if matrix:
+            for session_id in matrix.session_ids:
+                self.session_assignments.pop(session_id, None)
+
+    def on_session_created(self, assignment_id: str, session_id: str):
+        matrix = self.matrices.get(assignment_id)
+        if matrix is not None:
+            matrix.add_session(session_id)
+            self.session_assignments[session_id] = assignment_id
+
+    def on_attendance_marked(self, session_id: str, records: List[Dict]):
+        assignment_id = self.session_assignments.get(session_id)
+        matrix = self.matrices.get(assignment_id) if assignment_id else None
+        if matrix is not None:
+            matrix.apply_marks(session_id, records)
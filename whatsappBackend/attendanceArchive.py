@@ -0,0 +1,444 @@
+"""Columnar on-disk archive of attendance marks for semester-wide reports.
+
+Marks are kept as three fixed-width columns, one element per (session,
+student) mark: a session index (uint32), a student index (uint32) and a
+present flag (bool). Ids are dictionary-encoded: the indices point into id
+lists kept in a JSON dictionary, together with assignment details (course,
+branch, semester) used to group reports. The columns are memory-mapped, so
+reports scan them with NumPy without loading anything up front.
+
+Each session's marks form one contiguous block, sorted by student index, so
+a new mark updates its present flag in place. A session whose roster
+changes is written again as a new block at the end of the columns, and the
+old block becomes garbage. When more than half of the rows are garbage, the
+columns are compacted into a new generation of files. The dictionary is
+replaced atomically after the columns are written, and it names the
+generation, so a crash at any point leaves the previous state intact.
+
+The archive fills from data the bot already fetches: rosters as they are
+opened, assignment histories loaded for analytics, and marks as they are
+written. An assignment only counts as covered once its full history has been
+loaded; until then the archive holds just the sessions this process opened,
+and reports say which assignments are partial.
+
+Methods block on file I/O, so the bot calls them through asyncio.to_thread;
+a lock lets one run at a time.
+"""
+from typing import Dict, Iterable, List, Optional
+from functools import wraps
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from models import AttendanceRecord, Session, TeachingAssignment
+
+logger = logging.getLogger(__name__)
+
+ATTENDANCE_ARCHIVE_DIR = os.getenv("ATTENDANCE_ARCHIVE_DIR")
+DICTIONARY_FILE = "dictionary.json"
+# (column, dtype); files are <column>.<generation>.bin
+COLUMNS = (("session", np.uint32), ("student", np.uint32), ("present", np.bool_))
+MIN_CAPACITY = 4096
+ASSIGNMENT_FIELDS = ("courseCode", "courseName", "branch", "semester", "section", "academicYear")
+REPORT_GROUPS = ("branch", "course", "semester", "assignment")
+
+
+def locked(method):
+    """Archive methods run in worker threads, one at a time"""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def logged(method):
+    """Archive upkeep must never fail the bot operation that triggered it"""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            with self.lock:
+                return method(self, *args, **kwargs)
+        except (OSError, ValueError) as e:
+            logger.error(f"Attendance archive {method.__name__} failed: {e}")
+            return None
+    return wrapper
+
+
+def assignment_info(assignment: TeachingAssignment) -> Dict:
+    return {
+        "courseCode": assignment.course.get('code'),
+        "courseName": assignment.course.get('name'),
+        "branch": assignment.branch.get('name'),
+        "semester": assignment.semester,
+        "section": assignment.section,
+        "academicYear": assignment.academicYear
+    }
+
+
+class AttendanceArchive:
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, DICTIONARY_FILE)
+        if os.path.exists(path):
+            with open(path) as f:
+                meta = json.load(f)
+        else:
+            meta = {"generation": 0, "rows": 0, "deadRows": 0, "students": [], "sessions": [], "assignments": []}
+
+        self.generation = meta["generation"]
+        self.rows = meta["rows"]
+        self.dead_rows = meta["deadRows"]
+        # Dictionary-encoded ids; the position in each list is the index used in the columns
+        self.students: List[Dict] = meta["students"]        # {"id", "rollNumber", "name"}
+        self.sessions: List[Dict] = meta["sessions"]        # {"id", "assignment", "date", "start", "count"}
+        self.assignments: List[Dict] = meta["assignments"]  # {"id", **ASSIGNMENT_FIELDS, "history"}
+        self.student_index = {student["id"]: i for i, student in enumerate(self.students)}
+        self.session_index = {session["id"]: i for i, session in enumerate(self.sessions)}
+        self.assignment_index = {assignment["id"]: i for i, assignment in enumerate(self.assignments)}
+
+        self.columns: Dict[str, np.memmap] = {}
+        self.capacity = 0
+        self.map_columns(max(self.rows, MIN_CAPACITY))
+        self.lookups = None
+        # Set when the dictionary changed (new ids, moved blocks), not for in-place present updates
+        self.dirty = False
+        self.lock = threading.RLock()
+
+    def column_path(self, name: str, generation: int) -> str:
+        return os.path.join(self.directory, f"{name}.{generation}.bin")
+
+    def map_columns(self, capacity: int):
+        """(Re)map the current generation's column files, growing them to hold capacity rows"""
+        self.columns.clear()
+        for name, dtype in COLUMNS:
+            path = self.column_path(name, self.generation)
+            size = capacity * np.dtype(dtype).itemsize
+            with open(path, "ab") as f:
+                if f.tell() < size:
+                    f.truncate(size)
+            self.columns[name] = np.memmap(path, dtype=dtype, mode="r+", shape=(capacity,))
+        self.capacity = capacity
+
+    def reserve(self, count: int) -> int:
+        """Start row of count new rows at the end of the columns"""
+        start = self.rows
+        if start + count > self.capacity:
+            self.flush_columns()
+            self.map_columns(max(self.capacity * 2, start + count))
+        self.rows += count
+        return start
+
+    def flush_columns(self):
+        for column in self.columns.values():
+            column.flush()
+
+    def save(self):
+        """Flush the columns, then atomically replace the dictionary that points at them"""
+        self.flush_columns()
+        meta = {
+            "generation": self.generation,
+            "rows": self.rows,
+            "deadRows": self.dead_rows,
+            "students": self.students,
+            "sessions": self.sessions,
+            "assignments": self.assignments
+        }
+        path = os.path.join(self.directory, DICTIONARY_FILE)
+        with open(path + ".tmp", "w") as f:
+            # dumps rather than dump: dump streams through the pure-Python encoder
+            f.write(json.dumps(meta, separators=(",", ":")))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        self.lookups = None
+        self.dirty = False
+
+    def commit(self):
+        """Persist a change: the dictionary only if it changed, then compact if mostly garbage"""
+        if not self.dirty:
+            self.flush_columns()
+            return
+        self.save()
+        if self.dead_rows * 2 > self.rows:
+            self.compact()
+
+    def student(self, student_id: str, roll_number: Optional[str] = None, name: Optional[str] = None) -> int:
+        index = self.student_index.get(student_id)
+        if index is None:
+            index = self.student_index[student_id] = len(self.students)
+            self.students.append({"id": student_id, "rollNumber": roll_number, "name": name})
+            self.dirty = True
+        elif roll_number and not self.students[index]["rollNumber"]:
+            self.students[index].update(rollNumber=roll_number, name=name)
+            self.dirty = True
+        return index
+
+    def assignment(self, assignment_id: str) -> int:
+        index = self.assignment_index.get(assignment_id)
+        if index is None:
+            index = self.assignment_index[assignment_id] = len(self.assignments)
+            # history: when the assignment's full history was last loaded, None while only some sessions are known
+            self.assignments.append({"id": assignment_id, **dict.fromkeys(ASSIGNMENT_FIELDS), "history": None})
+            self.dirty = True
+        return index
+
+    def session(self, session_id: str, assignment_id: str, date: Optional[str]) -> int:
+        index = self.session_index.get(session_id)
+        if index is None:
+            index = self.session_index[session_id] = len(self.sessions)
+            self.sessions.append({"id": session_id, "assignment": self.assignment(assignment_id),
+                                  "date": date, "start": 0, "count": 0})
+            self.dirty = True
+        return index
+
+    def write_block(self, session: int, students: np.ndarray, present: np.ndarray):
+        """Store a session's marks (students sorted), in place if its roster is unchanged"""
+        block = self.sessions[session]
+        start, count = block["start"], block["count"]
+        if count == len(students) and np.array_equal(self.columns["student"][start:start + count], students):
+            self.columns["present"][start:start + count] = present
+            return
+
+        start = self.reserve(len(students))
+        end = start + len(students)
+        self.columns["session"][start:end] = session
+        self.columns["student"][start:end] = students
+        self.columns["present"][start:end] = present
+        self.dead_rows += block["count"]
+        block.update(start=start, count=len(students))
+        self.dirty = True
+
+    @logged
+    def describe_assignments(self, assignments: Iterable[TeachingAssignment]):
+        """Record course, branch and semester of assignments, for grouping reports"""
+        for assignment in assignments:
+            entry = self.assignments[self.assignment(assignment.id)]
+            info = assignment_info(assignment)
+            if any(entry[field] != info[field] for field in ASSIGNMENT_FIELDS):
+                entry.update(info)
+                self.dirty = True
+        if self.dirty:
+            self.save()
+
+    @logged
+    def ingest_session(self, assignment_id: str, session: Session, records: List[AttendanceRecord]):
+        """Store a session's full roster of marks (bot roster records)"""
+        if not records:
+            return
+        session_index = self.session(session.id, assignment_id, session.date)
+        marks = {}
+        for record in records:
+            student = record.student or {}
+            user = student.get('user') or {}
+            name = f"{user.get('firstName', '')} {user.get('lastName', '')}".strip()
+            marks[self.student(record.studentId, student.get('rollNumber'), name)] = record.present
+        self.store_marks(session_index, marks)
+        self.commit()
+
+    @logged
+    def ingest_history(self, assignment_id: str, history):
+        """Store every session of an assignment history (AssignmentAttendance)"""
+        for student in history.students:
+            self.student(student.id, student.rollNumber, student.name)
+        sessions = {s.id: self.session(s.id, assignment_id, s.date) for s in history.sessions}
+        marks: Dict[int, Dict[int, bool]] = {index: {} for index in sessions.values()}
+        for record in history.records:
+            session_index = sessions.get(record.sessionId)
+            if session_index is not None:
+                marks[session_index][self.student(record.studentId)] = bool(record.present)
+        for session_index, session_marks in marks.items():
+            if session_marks:
+                self.store_marks(session_index, session_marks)
+        self.assignments[self.assignment(assignment_id)]["history"] = time.time()
+        self.dirty = True
+        self.commit()
+
+    def store_marks(self, session: int, marks: Dict[int, bool]):
+        students = np.fromiter(marks, dtype=np.uint32, count=len(marks))
+        present = np.fromiter(marks.values(), dtype=np.bool_, count=len(marks))
+        order = np.argsort(students)
+        self.write_block(session, students[order], present[order])
+
+    @logged
+    def apply_marks(self, session_id: str, records: List[Dict]) -> bool:
+        """Apply {"studentId", "present"} marks to an archived session; False if it isn't archived"""
+        session = self.session_index.get(session_id)
+        if session is None or not records:
+            return False
+
+        block = self.sessions[session]
+        start, count = block["start"], block["count"]
+        students = self.columns["student"][start:start + count]
+        updates = {}
+        for record in records:
+            index = self.student_index.get(record['studentId'])
+            updates[-1 if index is None else index] = bool(record.get('present'))
+
+        indices = np.fromiter(updates, dtype=np.int64, count=len(updates))
+        positions = np.searchsorted(students, np.maximum(indices, 0))
+        found = (indices >= 0) & (positions < count)
+        found[found] = students[positions[found]] == indices[found]
+        if found.all():
+            values = np.fromiter(updates.values(), dtype=np.bool_, count=len(updates))
+            self.columns["present"][start + positions] = values
+            self.columns["present"].flush()
+            return True
+
+        # A student new to this session: rewrite the block with them added
+        marks = dict(zip(students.tolist(), self.columns["present"][start:start + count].tolist()))
+        for record in records:
+            marks[self.student(record['studentId'])] = bool(record.get('present'))
+        self.store_marks(session, marks)
+        self.commit()
+        return True
+
+    def compact(self):
+        """Copy the live blocks into a new generation of column files and drop the old one"""
+        old_generation, old_columns = self.generation, dict(self.columns)
+        live = self.rows - self.dead_rows
+        self.generation += 1
+        self.rows = self.dead_rows = 0
+        self.map_columns(max(live * 2, MIN_CAPACITY))
+        for block in self.sessions:
+            start, count = block["start"], block["count"]
+            new_start = self.reserve(count)
+            for name, _ in COLUMNS:
+                self.columns[name][new_start:new_start + count] = old_columns[name][start:start + count]
+            block["start"] = new_start
+        self.save()
+        old_columns.clear()
+        for name, _ in COLUMNS:
+            os.remove(self.column_path(name, old_generation))
+        logger.info(f"Compacted attendance archive to {self.rows} rows (generation {self.generation})")
+
+    def live_rows(self):
+        """(session, student, present) of the current blocks"""
+        if self.lookups is None:
+            self.lookups = {
+                "start": np.array([s["start"] for s in self.sessions], dtype=np.int64),
+                "end": np.array([s["start"] + s["count"] for s in self.sessions], dtype=np.int64),
+                "assignment": np.array([s["assignment"] for s in self.sessions], dtype=np.int64)
+            }
+        sessions = self.columns["session"][:self.rows].astype(np.int64)
+        students = self.columns["student"][:self.rows]
+        present = self.columns["present"][:self.rows]
+        if self.dead_rows:
+            positions = np.arange(self.rows)
+            live = (positions >= self.lookups["start"][sessions]) & (positions < self.lookups["end"][sessions])
+            return sessions[live], students[live], present[live]
+        return sessions, students, present
+
+    def assignment_mask(self, branch: Optional[str] = None, semester: Optional[int] = None) -> np.ndarray:
+        return np.array([
+            (branch is None or a["branch"] == branch) and (semester is None or a["semester"] == semester)
+            for a in self.assignments
+        ], dtype=bool)
+
+    def group_label(self, assignment: Dict, group: str):
+        if group == "course":
+            return assignment["courseCode"] or assignment["courseName"]
+        if group == "assignment":
+            return assignment["id"]
+        return assignment[group]
+
+    @locked
+    def partial_assignments(self, branch: Optional[str] = None, semester: Optional[int] = None) -> List[str]:
+        """Ids of selected assignments whose full history was never loaded"""
+        selected = self.assignment_mask(branch, semester)
+        return [assignment["id"] for assignment, chosen in zip(self.assignments, selected)
+                if chosen and not assignment.get("history")]
+
+    @locked
+    def report(self, group: str = "branch", branch: Optional[str] = None, semester: Optional[int] = None) -> List[Dict]:
+        """Marks, presents and attendance percentage per branch, course, semester or assignment"""
+        if group not in REPORT_GROUPS:
+            raise ValueError(f"group must be one of {', '.join(REPORT_GROUPS)}")
+        sessions, _, present = self.live_rows()
+        if not len(sessions):
+            return []
+        assignments = self.lookups["assignment"][sessions]
+        selected = self.assignment_mask(branch, semester)[assignments]
+        assignments, present = assignments[selected], present[selected]
+
+        totals = np.bincount(assignments, minlength=len(self.assignments))
+        presents = np.bincount(assignments, weights=present, minlength=len(self.assignments))
+        session_counts = np.bincount(self.lookups["assignment"], minlength=len(self.assignments))
+
+        groups: Dict = {}
+        for index in np.flatnonzero(totals):
+            label = self.group_label(self.assignments[index], group)
+            entry = groups.setdefault(label, {group: label, "assignments": 0, "partialAssignments": 0,
+                                              "sessions": 0, "marks": 0, "present": 0})
+            entry["assignments"] += 1
+            entry["partialAssignments"] += int(not self.assignments[index].get("history"))
+            entry["sessions"] += int(session_counts[index])
+            entry["marks"] += int(totals[index])
+            entry["present"] += int(presents[index])
+        for entry in groups.values():
+            entry["percentage"] = round(entry["present"] / entry["marks"] * 100, 2)
+        return sorted(groups.values(), key=lambda entry: str(entry[group]))
+
+    @locked
+    def defaulters(self, threshold: float, branch: Optional[str] = None, semester: Optional[int] = None,
+                   limit: int = 500) -> List[Dict]:
+        """Students below threshold percent in any archived course, lowest first"""
+        sessions, students, present = self.live_rows()
+        if not len(sessions):
+            return []
+        assignments = self.lookups["assignment"][sessions]
+        selected = self.assignment_mask(branch, semester)[assignments]
+
+        keys = assignments[selected] * len(self.students) + students[selected]
+        pairs, inverse = np.unique(keys, return_inverse=True)
+        totals = np.bincount(inverse)
+        presents = np.bincount(inverse, weights=present[selected])
+        percentages = presents / totals * 100
+        below = np.flatnonzero(percentages < threshold)
+        below = below[np.argsort(percentages[below], kind="stable")][:limit]
+
+        result = []
+        for i in below:
+            assignment = self.assignments[pairs[i] // len(self.students)]
+            student = self.students[pairs[i] % len(self.students)]
+            result.append({
+                "studentId": student["id"],
+                "rollNumber": student["rollNumber"],
+                "name": student["name"],
+                "assignmentId": assignment["id"],
+                "course": assignment["courseCode"] or assignment["courseName"],
+                "branch": assignment["branch"],
+                "semester": assignment["semester"],
+                "attended": int(presents[i]),
+                "total": int(totals[i]),
+                "percentage": round(float(percentages[i]), 2)
+            })
+        return result
+
+    @locked
+    def stats(self) -> Dict:
+        return {
+            "generation": self.generation,
+            "rows": self.rows,
+            "deadRows": self.dead_rows,
+            "capacity": self.capacity,
+            "students": len(self.students),
+            "sessions": len(self.sessions),
+            "assignments": len(self.assignments)
+        }
+
+
+def open_archive() -> Optional[AttendanceArchive]:
+    """The archive in ATTENDANCE_ARCHIVE_DIR, or None when archiving is not configured"""
+    if not ATTENDANCE_ARCHIVE_DIR:
+        return None
+    try:
+        return AttendanceArchive(ATTENDANCE_ARCHIVE_DIR)
+    except (OSError, ValueError, KeyError) as e:
+        logger.error(f"Could not open attendance archive in {ATTENDANCE_ARCHIVE_DIR}: {e}")
+        return None
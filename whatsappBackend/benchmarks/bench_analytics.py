@@ -0,0 +1,64 @@
+"""Benchmark the attendance analytics matrix.
+
+Usage: python benchmarks/bench_analytics.py [--students 200] [--sessions 80]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from attendanceAnalytics import AttendanceMatrix
+from models import AssignmentAttendance
+
+
+def make_history(students: int, sessions: int):
+    random.seed(42)
+    return {
+        "sessions": [{"id": f"ses-{j}", "date": f"2026-01-01T{j:04d}"} for j in range(sessions)],
+        "students": [
+            {"id": f"stu-{i}", "rollNumber": f"CS{1000 + i}", "user": {"firstName": f"F{i}", "lastName": f"L{i}"}}
+            for i in range(students)
+        ],
+        "records": [
+            {"sessionId": f"ses-{j}", "studentId": f"stu-{i}", "present": random.random() < 0.8}
+            for j in range(sessions) for i in range(students)
+        ]
+    }
+
+
+def timed(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--sessions", type=int, default=80)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    history = AssignmentAttendance.model_validate(make_history(args.students, args.sessions))
+    matrix = AttendanceMatrix.from_history("bench", history)
+    marks = [{"studentId": f"stu-{i}", "present": i % 3 != 0} for i in range(args.students)]
+    counter = iter(range(10 ** 9))
+
+    def add_session_and_mark():
+        session_id = f"new-{next(counter)}"
+        matrix.add_session(session_id)
+        matrix.apply_marks(session_id, marks)
+
+    print(f"{args.students} students x {args.sessions} sessions")
+    print(f"build from history:     {timed(lambda: AttendanceMatrix.from_history('bench', history), 20):.3f} ms")
+    print(f"summary (defaulters):   {timed(lambda: matrix.summary(75.0), args.iterations):.3f} ms")
+    print(f"per-student stats:      {timed(matrix.student_stats, args.iterations):.3f} ms")
+    print(f"add session + marks:    {timed(add_session_and_mark, args.iterations):.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
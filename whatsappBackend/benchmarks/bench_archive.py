@@ -0,0 +1,123 @@
+"""Benchmark: semester reports from the columnar archive.
+
+Builds a synthetic semester of assignment histories (sessions x students per
+assignment, spread over a few branches and semesters), ingests it into an
+archive in a temporary directory, and times opening it cold, the per-branch
+report, the defaulters list and single marks applied to archived sessions.
+For comparison, the same per-branch report is computed by walking the
+decoded histories in Python, as a report built from the backend's
+assignment attendance would have to.
+
+Usage: python benchmarks/bench_archive.py [--assignments 300] [--sessions 60] [--students 60] [--repeat 5]
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from attendanceArchive import AttendanceArchive
+from models import AssignmentAttendance, TeachingAssignment
+
+BRANCHES = ("Computer Science", "Electrical", "Mechanical", "Civil", "Electronics")
+
+
+def make_semester(assignments: int, sessions: int, students: int):
+    described, histories = [], []
+    for a in range(assignments):
+        branch, semester = BRANCHES[a % len(BRANCHES)], 1 + a // len(BRANCHES) % 8
+        described.append(TeachingAssignment(
+            id=f"assignment-{a}", teacherId=f"teacher-{a}", courseId=f"course-{a}", branchId=branch,
+            semester=semester, section="A", academicYear="2024-25", active=True,
+            course={"code": f"C{a:03d}", "name": f"Course {a}"}, branch={"name": branch}
+        ))
+        # Students belong to a branch and semester, so courses of the same cohort share them
+        cohort = f"{branch[:2]}{semester}"
+        rate = random.uniform(0.6, 0.95)
+        histories.append(AssignmentAttendance.model_validate({
+            "sessions": [{"id": f"a{a}-s{s}", "date": f"2024-09-{s % 28 + 1:02d}"} for s in range(sessions)],
+            "students": [{"id": f"{cohort}-{j}", "rollNumber": f"{cohort}{j:03d}",
+                          "user": {"firstName": "Student", "lastName": str(j)}} for j in range(students)],
+            "records": [{"sessionId": f"a{a}-s{s}", "studentId": f"{cohort}-{j}", "present": random.random() < rate}
+                        for s in range(sessions) for j in range(students)]
+        }))
+    return described, histories
+
+
+def python_report(described, histories):
+    """Per-branch totals straight from the decoded histories"""
+    branches = {}
+    for assignment, history in zip(described, histories):
+        entry = branches.setdefault(assignment.branch["name"], [0, 0])
+        for record in history.records:
+            entry[0] += 1
+            entry[1] += record.present
+    return {branch: round(present / marks * 100, 2) for branch, (marks, present) in branches.items()}
+
+
+def best_ms(fn, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--assignments", type=int, default=300)
+    parser.add_argument("--sessions", type=int, default=60)
+    parser.add_argument("--students", type=int, default=60)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    random.seed(1)
+    described, histories = make_semester(args.assignments, args.sessions, args.students)
+    marks = args.assignments * args.sessions * args.students
+
+    with tempfile.TemporaryDirectory() as directory:
+        archive = AttendanceArchive(directory)
+        start = time.perf_counter()
+        archive.describe_assignments(described)
+        for assignment, history in zip(described, histories):
+            archive.ingest_history(assignment.id, history)
+        ingest = time.perf_counter() - start
+        size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+        open_ms, archive = best_ms(lambda: AttendanceArchive(directory), args.repeat)
+        report_ms, report = best_ms(lambda: archive.report("branch"), args.repeat)
+        python_ms, expected = best_ms(lambda: python_report(described, histories), args.repeat)
+        assert {row["branch"]: row["percentage"] for row in report} == expected
+        defaulters_ms, defaulters = best_ms(lambda: archive.defaulters(75), args.repeat)
+
+        session_ids = [session.id for history in histories for session in history.sessions]
+        student_ids = {history.sessions[0].id: [s.id for s in history.students] for history in histories}
+        latencies = []
+        for _ in range(200):
+            history = random.choice(histories)
+            session_id = random.choice(history.sessions).id
+            record = {"studentId": random.choice(student_ids[history.sessions[0].id]), "present": True}
+            start = time.perf_counter()
+            archive.apply_marks(session_id, [record])
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+
+    print(f"{marks:,} marks: {args.assignments} assignments x {args.sessions} sessions x {args.students} students "
+          f"({len(session_ids):,} sessions)")
+    print(f"  ingest {ingest:.2f}s | on disk {size / 1024 / 1024:.1f} MiB ({size / marks:.1f} bytes/mark)")
+    print(f"  cold open {open_ms:.1f} ms")
+    print(f"  per-branch report {report_ms:.1f} ms (walking decoded histories: {python_ms:.1f} ms, "
+          f"{python_ms / report_ms:.0f}x slower)")
+    print(f"  defaulters below 75% {defaulters_ms:.1f} ms ({len(defaulters)} returned)")
+    print(f"  single mark applied p50 {latencies[len(latencies) // 2] * 1e6:.0f} us | "
+          f"p95 {latencies[int(len(latencies) * 0.95)] * 1e6:.0f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Benchmark: decoding a class roster response into dicts or typed models.
+
+The payload mirrors GET /api/teachers/sessions/:id/attendance for one class.
+Times are per decode; memory is what the decoded result keeps alive.
+
+Usage: python benchmarks/bench_decode.py [--records 300] [--iterations 500]
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydantic import TypeAdapter
+
+from decoding import decode, loads
+from models import AttendanceRecord
+
+
+def make_roster(records: int) -> bytes:
+    roster = [
+        {
+            "id": f"att-{i:05d}",
+            "sessionId": "ses-00001",
+            "studentId": f"stu-{i:05d}",
+            "enrollmentId": f"enr-{i:05d}",
+            "present": i % 4 != 0,
+            "student": {
+                "id": f"stu-{i:05d}",
+                "rollNumber": f"CS{1000 + i}",
+                "user": {"firstName": f"First{i}", "lastName": f"Last{i}"}
+            }
+        }
+        for i in range(records)
+    ]
+    return json.dumps(roster).encode()
+
+
+def measure(decoder, content: bytes, iterations: int):
+    decoder(content)  # warm up (builds cached validators)
+    gc.collect()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        decoder(content)
+    per_call = (time.perf_counter() - start) / iterations * 1000
+
+    gc.collect()
+    tracemalloc.start()
+    result = decoder(content)
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return per_call, retained
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=300)
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+
+    content = make_roster(args.records)
+    roster_type = List[AttendanceRecord]
+    decoders = [
+        ("json.loads -> dicts (response.json())", json.loads),
+        (f"{loads.__module__}.loads -> dicts", loads),
+        ("validate, cached validator -> models", lambda body: decode(body, roster_type, validate=True)),
+        ("validate, new TypeAdapter per call", lambda body: TypeAdapter(roster_type).validate_json(body)),
+        ("no validation -> structs", lambda body: decode(body, roster_type, validate=False)),
+        ("json.loads + model_validate per record",
+         lambda body: [AttendanceRecord.model_validate(item) for item in json.loads(body)]),
+    ]
+
+    print(f"{args.records} records, {len(content) / 1024:.1f} KiB payload")
+    print(f"{'decoder':<42} {'ms/decode':>10} {'retained KiB':>13}")
+    for name, decoder in decoders:
+        per_call, retained = measure(decoder, content, args.iterations)
+        print(f"{name:<42} {per_call:>10.3f} {retained / 1024:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""Benchmark: the bot's hot reads over HTTP vs the direct database path.
+
+Times AttendanceService.get_teaching_assignments, get_sessions (one page) and
+get_session_attendance both ways: through the HTTP API, and with the direct
+read path on a connection pool.
+
+By default both run against a SQLite stand-in seeded in a temporary
+directory. The HTTP side is a stand-in backend in its own process (uvicorn)
+serving the three routes from the same database and serialising them to
+JSON. It has no Prisma engine in between, so its latency is a lower bound
+for Express. With --backend and --database-url, both paths run against the
+real services with a teacher's --token instead.
+
+Usage: python benchmarks/bench_direct_reads.py [--students 120] [--sessions 40] [--iterations 300] [--concurrency 20]
+       python benchmarks/bench_direct_reads.py --backend http://localhost:3000 --database-url postgresql://... \\
+           --token <jwt> --secret <JWT_SECRET>
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import multiprocessing
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+import classImplementation
+from classImplementation import attendance_service
+from directReads import SQLITE_SCHEMA, create_direct_reader
+from responseCache import RevalidatingCache
+
+SECRET = "bench-secret"
+STANDIN_PORT = 3917
+
+
+def sign(claims, secret: str) -> str:
+    def b64(data: bytes) -> str:
+        return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+    signing_input = f"{b64(json.dumps({'alg': 'HS256', 'typ': 'JWT'}).encode())}.{b64(json.dumps(claims).encode())}"
+    signature = hmac.new(secret.encode(), signing_input.encode(), hashlib.sha256).digest()
+    return f"{signing_input}.{b64(signature)}"
+
+
+def seed(path: str, students: int, sessions: int):
+    """One teacher with four assignments, each with sessions x students marks"""
+    db = sqlite3.connect(path)
+    db.executescript(SQLITE_SCHEMA)
+    db.execute('INSERT INTO "User" VALUES (?, ?, ?, ?, ?, ?)',
+               ("user-t", "t@example.edu", "Ada", "Teacher", "TEACHER", "2024-09-01T00:00:00.000Z"))
+    db.execute('INSERT INTO "Teacher" VALUES (?, ?, ?)', ("teacher-1", "user-t", "E001"))
+    db.execute('INSERT INTO "Branch" VALUES (?, ?)', ("branch-1", "Computer Science"))
+    for j in range(students):
+        db.execute('INSERT INTO "User" VALUES (?, ?, ?, ?, ?, ?)',
+                   (f"user-{j}", f"s{j}@example.edu", f"First{j}", f"Last{j}", "STUDENT", "2024-09-01T00:00:00.000Z"))
+        db.execute('INSERT INTO "Student" VALUES (?, ?, ?, ?, ?, ?)',
+                   (f"student-{j}", f"user-{j}", f"CS{1000 + j}", 3, "branch-1", "A"))
+    for a in range(4):
+        db.execute('INSERT INTO "Course" VALUES (?, ?, ?, ?, ?)', (f"course-{a}", f"CS20{a}", f"Course {a}", 3, "branch-1"))
+        db.execute('INSERT INTO "TeachingAssignment" VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                   (f"assignment-{a}", "teacher-1", f"course-{a}", "branch-1", 3, "A", "2024-25", 1,
+                    "2024-09-01T00:00:00.000Z"))
+        for s in range(sessions):
+            session_id = f"session-{a}-{s}"
+            date = f"2024-{9 + s // 28:02d}-{s % 28 + 1:02d}T09:00:00.000Z"
+            db.execute('INSERT INTO "Session" VALUES (?, ?, ?, ?, ?)',
+                       (session_id, date, f"Lecture {s}", f"assignment-{a}", date))
+            db.executemany('INSERT INTO "Attendance" VALUES (?, ?, ?, ?, ?, ?, ?)', [
+                (f"att-{a}-{s}-{j}", session_id, f"student-{j}", f"enr-{a}-{j}", (j + s) % 5 != 0, date, "user-t")
+                for j in range(students)
+            ])
+    db.commit()
+    db.close()
+
+
+def serve_standin(path: str, port: int):
+    """The three teacher routes as a separate HTTP process reading the stand-in database"""
+    import uvicorn
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse
+
+    app = FastAPI()
+    reader = create_direct_reader(f"sqlite:///{path}", SECRET)
+
+    def token(request: Request) -> str:
+        return request.headers.get("Authorization", "").replace("Bearer ", "")
+
+    def respond(status, body):
+        if status != 200:
+            return JSONResponse({"message": "Not authorized"}, status_code=403 if status else 401)
+        return JSONResponse(body)
+
+    @app.get("/health")
+    async def health():
+        return {}
+
+    @app.get("/api/teachers/assignments")
+    async def assignments(request: Request):
+        return respond(*await reader.read("assignments", token(request)))
+
+    @app.get("/api/teachers/sessions/{session_id}/attendance")
+    async def roster(request: Request, session_id: str):
+        return respond(*await reader.read("roster", session_id, token(request)))
+
+    @app.get("/api/teachers/sessions/{assignment_id}")
+    async def sessions(request: Request, assignment_id: str, limit: int = None, cursor: str = None):
+        return respond(*await reader.read("sessions", assignment_id, token(request), limit, cursor))
+
+    logging.disable(logging.INFO)
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+async def wait_for(url: str):
+    async with httpx.AsyncClient() as client:
+        for _ in range(100):
+            try:
+                await client.get(f"{url}/health")
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    raise SystemExit(f"The stand-in backend at {url} did not start")
+
+
+async def navigate(token: str):
+    """A teacher opening their assignments, an assignment's sessions and the latest roster"""
+    timings = {}
+    start = time.perf_counter()
+    assignments = await attendance_service.get_teaching_assignments(token)
+    timings["assignments"] = time.perf_counter() - start
+    start = time.perf_counter()
+    sessions, _ = await attendance_service.get_sessions(assignments[0].id, token, limit=5)
+    timings["sessions"] = time.perf_counter() - start
+    start = time.perf_counter()
+    roster, _ = await attendance_service.get_session_attendance(sessions[0].id, token)
+    timings["roster"] = time.perf_counter() - start
+    assert roster, "empty roster"
+    return timings, len(roster)
+
+
+async def measure(reader, token: str, iterations: int, concurrency: int):
+    classImplementation.direct_reader = reader
+    attendance_service.http_client = httpx.AsyncClient(timeout=30.0)
+
+    await navigate(token)  # open connections and prepare statements
+    samples = {"assignments": [], "sessions": [], "roster": []}
+    for _ in range(iterations):
+        # A fresh cache each time, so every HTTP read sends a full body as on a teacher's first visit
+        classImplementation.response_cache = RevalidatingCache()
+        timings, roster_size = await navigate(token)
+        for name, elapsed in timings.items():
+            samples[name].append(elapsed)
+
+    classImplementation.response_cache = RevalidatingCache()
+    start = time.perf_counter()
+    await asyncio.gather(*(navigate(token) for _ in range(concurrency)))
+    burst = time.perf_counter() - start
+
+    await attendance_service.http_client.aclose()
+    if reader:
+        await reader.close()
+    return samples, burst, roster_size
+
+
+def percentile(values, share: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * share), len(values) - 1)] * 1000
+
+
+def report(label: str, samples, burst: float, concurrency: int):
+    cells = "".join(f"{statistics.median(samples[name]) * 1000:>9.2f}{percentile(samples[name], 0.95):>9.2f}"
+                    for name in ("assignments", "sessions", "roster"))
+    print(f"{label:<10}{cells}{burst * 1000:>14.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=120)
+    parser.add_argument("--sessions", type=int, default=40)
+    parser.add_argument("--iterations", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=20, help="teachers navigating at once for the burst")
+    parser.add_argument("--pool", type=int, default=5, help="direct read pool size")
+    parser.add_argument("--backend", help="base URL of a running backend")
+    parser.add_argument("--database-url", help="database of --backend, for the direct path")
+    parser.add_argument("--token", help="teacher JWT for --backend")
+    parser.add_argument("--secret", help="the backend's JWT_SECRET")
+    args = parser.parse_args()
+    if args.backend and not (args.database_url and args.token and args.secret):
+        parser.error("--backend needs --database-url, --token and --secret")
+
+    logging.disable(logging.INFO)
+    server = None
+    with tempfile.TemporaryDirectory() as directory:
+        if args.backend:
+            backend, database_url, token, secret = args.backend, args.database_url, args.token, args.secret
+            target = args.backend
+        else:
+            path = os.path.join(directory, "standin.db")
+            seed(path, args.students, args.sessions)
+            backend, database_url, secret = f"http://127.0.0.1:{STANDIN_PORT}", f"sqlite:///{path}", SECRET
+            token = sign({"id": "user-t", "role": "TEACHER", "exp": time.time() + 3600}, SECRET)
+            server = multiprocessing.get_context("spawn").Process(target=serve_standin, args=(path, STANDIN_PORT))
+            server.start()
+            target = "SQLite stand-in"
+        try:
+            classImplementation.EXISTING_BACKEND_URL = backend.rstrip('/')
+            if server:
+                asyncio.run(wait_for(backend))
+            results = {}
+            for label, url in (("HTTP", None), ("direct", database_url)):
+                reader = create_direct_reader(url, secret, args.pool) if url else None
+                results[label] = asyncio.run(measure(reader, token, args.iterations, args.concurrency))
+        finally:
+            if server:
+                server.terminate()
+                server.join()
+
+    roster_size = results["direct"][2]
+    print(f"{target}: {args.iterations} navigations (assignments, 5 sessions, {roster_size}-student roster), "
+          f"then {args.concurrency} at once")
+    print(f"{'path':<10}{'assignments ms':>18}{'sessions ms':>18}{'roster ms':>18}{'burst ms':>14}")
+    print(f"{'':<10}" + f"{'p50':>9}{'p95':>9}" * 3)
+    for label, (samples, burst, _) in results.items():
+        report(label, samples, burst, args.concurrency)
+    http, direct = results["HTTP"][0], results["direct"][0]
+    total = lambda samples: sum(statistics.median(values) for values in samples.values())
+    print(f"direct path: {total(http) / total(direct):.1f}x faster per navigation (p50)")
+
+
+if __name__ == "__main__":
+    main()
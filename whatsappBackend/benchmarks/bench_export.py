@@ -0,0 +1,82 @@
+"""Throughput and memory benchmark for the streaming register export.
+
+Pages are generated in-process in the shape returned by
+/api/teachers/assignments/:id/attendance?limit=N, so only the export path is measured.
+
+Usage: python benchmarks/bench_export.py [--students 5000] [--sessions 120] [--format csv]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import AssignmentAttendance
+from registerExport import EXPORT_PAGE_SIZE, write_register
+
+
+def make_fetcher(students: int, sessions: int, page_size: int):
+    session_list = [{"id": f"ses-{j}", "date": f"2026-01-{j % 28 + 1:02d}T09:00:00.000Z", "topic": f"Topic {j}"}
+                    for j in range(sessions)]
+
+    async def fetch_page(cursor):
+        start = int(cursor) if cursor else 0
+        end = min(start + page_size, students)
+        page_students = [
+            {"id": f"stu-{i}", "rollNumber": f"CS{10000 + i}", "user": {"firstName": f"F{i}", "lastName": f"L{i}"}}
+            for i in range(start, end)
+        ]
+        records = [
+            {"sessionId": f"ses-{j}", "studentId": f"stu-{i}", "present": (i + j) % 5 != 0}
+            for i in range(start, end) for j in range(sessions)
+        ]
+        page = {
+            "students": page_students,
+            "records": records,
+            "nextCursor": str(end) if end < students else None
+        }
+        if not cursor:
+            page["sessions"] = session_list
+        return AssignmentAttendance.model_validate(page)
+
+    return fetch_page
+
+
+async def run(students: int, sessions: int, fmt: str, page_size: int):
+    path = os.path.join(tempfile.gettempdir(), f"bench_register.{fmt}")
+
+    start = time.perf_counter()
+    rows = await write_register(make_fetcher(students, sessions, page_size), fmt, path)
+    elapsed = time.perf_counter() - start
+
+    # Second pass under tracemalloc, which slows execution too much to time the first
+    tracemalloc.start()
+    await write_register(make_fetcher(students, sessions, page_size), fmt, path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    cells = rows * sessions
+    print(f"{fmt}: {rows} students x {sessions} sessions = {cells} cells")
+    print(f"  time {elapsed:.2f} s | {rows / elapsed:,.0f} rows/s | {cells / elapsed:,.0f} cells/s")
+    print(f"  peak traced memory {peak / 1024 / 1024:.1f} MiB | file {os.path.getsize(path) / 1024 / 1024:.1f} MiB")
+    os.remove(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--students", type=int, default=5000)
+    parser.add_argument("--sessions", type=int, default=120)
+    parser.add_argument("--page-size", type=int, default=EXPORT_PAGE_SIZE)
+    parser.add_argument("--format", choices=["csv", "xlsx"], default="csv")
+    args = parser.parse_args()
+
+    # Peak memory should stay roughly constant as --students grows
+    asyncio.run(run(args.students, args.sessions, args.format, args.page_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Benchmark: bulk student import throughput at different concurrency levels.
+
+User creation and enrollment are replaced by an in-process stand-in with fixed
+latency, so the numbers show how much the bounded concurrency and batched
+enrollments hide per-request latency, not how fast the backend is.
+
+Usage: python benchmarks/bench_import.py [--rows 2000] [--latency 0.02] [--concurrency 1 4 8 16]
+"""
+import argparse
+import asyncio
+import csv
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bulkImport import BulkImporter, IMPORT_CHUNK_SIZE
+
+
+class StubBackend:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.create_calls = 0
+        self.enroll_calls = 0
+        self.emails = set()
+
+    async def create_user(self, user_data, token):
+        self.create_calls += 1
+        await asyncio.sleep(self.latency)
+        if user_data["email"] in self.emails:
+            return {"status": "exists", "user": None, "error": "User already exists"}
+        self.emails.add(user_data["email"])
+        return {"status": "created", "user": {"student": {"id": f"s-{self.create_calls}"}}, "error": None}
+
+    async def get_users(self, token, role=None):
+        return []
+
+    async def enroll_students_batch(self, student_ids, course_ids, semester, academic_year, token):
+        self.enroll_calls += 1
+        await asyncio.sleep(self.latency)
+        return True
+
+
+def write_csv(path: str, rows: int):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["email", "password", "firstName", "lastName", "rollNumber", "branchId",
+                         "currentSemester", "section", "courseIds", "semester", "academicYear"])
+        for i in range(rows):
+            writer.writerow([f"student{i}@college.edu", "changeme", "Student", str(i), f"R{i:05d}", "cse",
+                             3, "AB"[i % 2], "c1;c2", 3, "2024-25"])
+
+
+async def run(csv_path: str, workdir: str, latency: float, concurrency: int, chunk_size: int):
+    backend = StubBackend(latency)
+    importer = BulkImporter("bench-token", service=backend, concurrency=concurrency, chunk_size=chunk_size)
+
+    start = time.perf_counter()
+    summary = await importer.run(
+        csv_path,
+        os.path.join(workdir, f"checkpoint_{concurrency}.json"),
+        os.path.join(workdir, f"results_{concurrency}.csv")
+    )
+    return time.perf_counter() - start, summary, backend
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per stubbed backend call")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        csv_path = os.path.join(workdir, "students.csv")
+        write_csv(csv_path, args.rows)
+
+        print(f"{args.rows} rows, {args.latency * 1000:.0f} ms per backend call, chunks of {args.chunk_size}")
+        print(f"{'concurrency':>11} {'seconds':>8} {'rows/s':>8} {'creates':>8} {'enrolls':>8}  summary")
+        for concurrency in args.concurrency:
+            elapsed, summary, backend = asyncio.run(
+                run(csv_path, workdir, args.latency, concurrency, args.chunk_size)
+            )
+            print(f"{concurrency:>11} {elapsed:>8.2f} {args.rows / elapsed:>8.0f} "
+                  f"{backend.create_calls:>8} {backend.enroll_calls:>8}  {summary}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Benchmark: building the name index and resolving names against it.
+
+Generates a section of students from common first and last names (so many
+share a first name or a surname), then times NameIndex construction and
+resolve() for full names, full names with a typo, first names only and
+surnames only, and reports how each kind of query resolved: to the right
+student, to a short list to choose from, to a wrong student, or to nothing.
+
+Usage: python benchmarks/bench_name_index.py [--students 300] [--queries 2000]
+"""
+import argparse
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nameIndex import NameIndex
+
+FIRST_NAMES = ("Aarav", "Aditya", "Akash", "Amit", "Ananya", "Anil", "Anjali", "Arjun", "Deepak", "Divya",
+               "Gaurav", "Harsh", "Ishaan", "Karan", "Kavya", "Manish", "Meera", "Neha", "Nikhil", "Pooja",
+               "Priya", "Rahul", "Rajesh", "Riya", "Rohan", "Sachin", "Sneha", "Suresh", "Tanvi", "Vikram")
+LAST_NAMES = ("Agarwal", "Bhat", "Chopra", "Das", "Desai", "Gupta", "Iyer", "Jain", "Joshi", "Kapoor",
+              "Khan", "Kumar", "Mehta", "Menon", "Mishra", "Nair", "Patel", "Pillai", "Rao", "Reddy",
+              "Saxena", "Shah", "Sharma", "Singh", "Sinha", "Srinivasan", "Verma", "Yadav")
+
+
+def make_roster(students: int):
+    names = set()
+    while len(names) < students:
+        names.add((random.choice(FIRST_NAMES), random.choice(LAST_NAMES)))
+    return [
+        {"studentId": f"student-{i}", "present": False,
+         "student": {"rollNumber": f"22CS{1000 + i}", "user": {"firstName": first, "lastName": last}}}
+        for i, (first, last) in enumerate(sorted(names))
+    ]
+
+
+def typo(name: str) -> str:
+    """Swap two adjacent letters of the longer word"""
+    words = name.split()
+    i = max(range(len(words)), key=lambda w: len(words[w]))
+    word = words[i]
+    j = random.randrange(1, len(word) - 1)
+    words[i] = word[:j] + word[j + 1] + word[j] + word[j + 2:]
+    return " ".join(words)
+
+
+QUERY_KINDS = {
+    "full name": lambda first, last: f"{first} {last}",
+    "with typo": lambda first, last: typo(f"{first} {last}"),
+    "first name": lambda first, last: first,
+    "surname": lambda first, last: last
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=300)
+    parser.add_argument("--queries", type=int, default=2000, help="queries of each kind")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    random.seed(1)
+    roster = make_roster(args.students)
+
+    builds = []
+    for _ in range(200):
+        start = time.perf_counter()
+        index = NameIndex(roster)
+        builds.append(time.perf_counter() - start)
+    print(f"{args.students}-student section: index build p50 {statistics.median(builds) * 1000:.3f} ms, "
+          f"{len(index.codes)} trigrams")
+    print(f"{'query':<12}{'p50 us':>8}{'p99 us':>8}{'right':>8}{'choose':>8}{'wrong':>8}{'none':>8}")
+
+    for kind, make_query in QUERY_KINDS.items():
+        timings = []
+        outcomes = {"right": 0, "choose": 0, "wrong": 0, "none": 0}
+        for _ in range(args.queries):
+            record = random.choice(roster)
+            user = record["student"]["user"]
+            query = make_query(user["firstName"], user["lastName"])
+            start = time.perf_counter()
+            match, candidates = index.resolve(query)
+            timings.append(time.perf_counter() - start)
+            if match is record:
+                outcomes["right"] += 1
+            elif match is not None:
+                outcomes["wrong"] += 1
+            elif candidates:
+                outcomes["choose"] += 1
+            else:
+                outcomes["none"] += 1
+        timings.sort()
+        print(f"{kind:<12}{statistics.median(timings) * 1e6:>8.1f}{timings[int(len(timings) * 0.99)] * 1e6:>8.1f}"
+              + "".join(f"{outcomes[outcome] / args.queries:>8.0%}" for outcome in ("right", "choose", "wrong", "none")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Benchmark: conditional GETs on repeated navigation.
+
+A teacher repeatedly opens their assignments, a course's recent sessions and
+a session's roster, as when moving back and forth in the bot. A stub backend
+versions each resource and honours If-None-Match like the Express routes; a
+share of the rounds mark attendance first, which changes the roster's version.
+The same navigation runs with revalidation off (no ETags sent) and on.
+
+Usage: python benchmarks/bench_revalidation.py [--students 300] [--rounds 500] [--change-rate 0.2]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+import classImplementation
+from classImplementation import attendance_service
+from responseCache import RevalidatingCache
+
+TOKEN = "teacher-token"
+
+
+class StubBackend:
+    def __init__(self, students: int, etags: bool):
+        self.etags = etags
+        self.bytes_sent = 0
+        self.not_modified = 0
+        assignment = {
+            "id": "assignment-1", "teacherId": "teacher-1", "courseId": "course-1", "branchId": "branch-1",
+            "semester": 3, "section": "A", "academicYear": "2024-25", "active": True,
+            "course": {"id": "course-1", "code": "CS201", "name": "Data Structures", "semester": 3},
+            "branch": {"id": "branch-1", "name": "Computer Science"}
+        }
+        sessions = [
+            {"id": f"session-{i}", "date": f"2024-09-{i + 1:02d}T00:00:00.000Z", "topic": f"Lecture {i}",
+             "assignmentId": "assignment-1"}
+            for i in range(5)
+        ]
+        roster = [
+            {
+                "id": f"att-{i}", "sessionId": "session-0", "studentId": f"student-{i}",
+                "enrollmentId": f"enrollment-{i}", "present": i % 4 != 0,
+                "markedAt": "2024-09-01T09:00:00.000Z", "markedBy": "user-1",
+                "student": {
+                    "id": f"student-{i}", "userId": f"user-{i}", "rollNumber": f"CS{1000 + i}",
+                    "currentSemester": 3, "branchId": "branch-1", "section": "A",
+                    "user": {"firstName": f"First{i}", "lastName": f"Last{i}"}
+                }
+            }
+            for i in range(students)
+        ]
+        # path -> [version, body]; bodies are encoded once per version so the stub's own cost stays small
+        self.encoded = {}
+        self.resources = {
+            "/api/teachers/assignments": [0, [assignment]],
+            "/api/teachers/sessions/assignment-1": [0, {"sessions": sessions, "nextCursor": None}],
+            "/api/teachers/sessions/session-0/attendance": [0, roster]
+        }
+
+    def mark(self, path: str):
+        self.resources[path][0] += 1
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        version, body = self.resources[request.url.path]
+        headers = {}
+        if self.etags:
+            headers["ETag"] = f'W/"{request.url.path}:{version}"'
+            if request.headers.get("If-None-Match") == headers["ETag"]:
+                self.not_modified += 1
+                return httpx.Response(304, headers=headers)
+        content = self.encoded.get((request.url.path, version))
+        if content is None:
+            content = self.encoded[request.url.path, version] = json.dumps(body).encode()
+        self.bytes_sent += len(content)
+        return httpx.Response(200, content=content, headers=headers)
+
+
+async def navigate(backend: StubBackend, rounds: int, change_rate: float):
+    classImplementation.response_cache = RevalidatingCache()
+    attendance_service.http_client = httpx.AsyncClient(transport=httpx.MockTransport(backend.handle))
+    random.seed(1)
+
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    for _ in range(rounds):
+        if random.random() < change_rate:
+            backend.mark("/api/teachers/sessions/session-0/attendance")
+        assignments = await attendance_service.get_teaching_assignments(TOKEN)
+        sessions, _ = await attendance_service.get_sessions(assignments[0].id, TOKEN, limit=5)
+        roster, _ = await attendance_service.get_session_attendance(sessions[0].id, TOKEN)
+        roster[0].present = not roster[0].present  # marking mutates the fetched records
+    elapsed_wall = time.perf_counter() - start_wall
+    elapsed_cpu = time.process_time() - start_cpu
+
+    await attendance_service.http_client.aclose()
+    return elapsed_wall, elapsed_cpu, classImplementation.response_cache.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=300)
+    parser.add_argument("--rounds", type=int, default=500)
+    parser.add_argument("--change-rate", type=float, default=0.2, help="share of rounds that change the roster")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    fetches = args.rounds * 3
+    print(f"{args.rounds} rounds x 3 fetches, {args.students}-student roster, "
+          f"{args.change_rate:.0%} of rounds change the roster")
+    print(f"{'mode':<14}{'KiB sent':>12}{'304s':>8}{'CPU ms':>10}{'us/fetch':>10}")
+    results = {}
+    for label, etags in (("full bodies", False), ("revalidated", True)):
+        backend = StubBackend(args.students, etags)
+        wall, cpu, _ = asyncio.run(navigate(backend, args.rounds, args.change_rate))
+        results[label] = (backend.bytes_sent, cpu)
+        print(f"{label:<14}{backend.bytes_sent / 1024:>12.0f}{backend.not_modified:>8}"
+              f"{cpu * 1000:>10.0f}{wall / fetches * 1e6:>10.0f}")
+
+    (full_bytes, full_cpu), (cond_bytes, cond_cpu) = results["full bodies"], results["revalidated"]
+    print(f"saved: {1 - cond_bytes / full_bytes:.0%} of bytes, {1 - cond_cpu / full_cpu:.0%} of CPU")
+
+
+if __name__ == "__main__":
+    main()
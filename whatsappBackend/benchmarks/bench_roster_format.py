@@ -0,0 +1,94 @@
+"""Benchmark: full session attendance records vs the compact format=roster body.
+
+Compares payload size, serialisation time (json.dumps standing in for the
+backend's JSON.stringify) and the bot's time to turn the body into roster
+records, for the same roster in both shapes.
+
+Usage: python benchmarks/bench_roster_format.py [--students 300] [--iterations 500]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from classImplementation import roster_from_body
+from decoding import decode
+
+SESSION_ID = "2b7d9c1e-session-000000000001"
+
+
+def make_full(students: int):
+    """What the route returns without a format: attendance rows with the full student and user names"""
+    return [
+        {
+            "id": f"8f0c2a4e-attendance-{i:012d}", "sessionId": SESSION_ID,
+            "studentId": f"5a1e3f7b-student-{i:014d}", "enrollmentId": f"9c4b2d6a-enrollment-{i:011d}",
+            "present": i % 4 != 0, "markedAt": "2024-09-02T09:14:07.312Z",
+            "markedBy": "0d3e5f7a-user-0000000000000001",
+            "student": {
+                "id": f"5a1e3f7b-student-{i:014d}", "userId": f"7e2c4a6b-user-{i:017d}",
+                "rollNumber": f"22CS{1000 + i}", "currentSemester": 3,
+                "branchId": "3c5e7a9b-branch-000000000001", "section": "A",
+                "user": {"firstName": f"First{i}", "lastName": f"Last{i}"}
+            }
+        }
+        for i in range(students)
+    ]
+
+
+def make_roster(full):
+    return {
+        "cursor": max(record["markedAt"] for record in full),
+        "studentIds": [record["studentId"] for record in full],
+        "present": [1 if record["present"] else 0 for record in full],
+        "rollNumbers": [record["student"]["rollNumber"] for record in full],
+        "firstNames": [record["student"]["user"]["firstName"] for record in full],
+        "lastNames": [record["student"]["user"]["lastName"] for record in full]
+    }
+
+
+def per_call(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=300)
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+
+    full = make_full(args.students)
+    roster = make_roster(full)
+    results = {}
+    for label, body in (("full records", full), ("format=roster", roster)):
+        content = json.dumps(body, separators=(",", ":")).encode()
+        serialise = per_call(lambda: json.dumps(body, separators=(",", ":")), args.iterations)
+        to_roster = per_call(lambda: roster_from_body(decode(content), SESSION_ID), args.iterations)
+        records, cursor = roster_from_body(decode(content), SESSION_ID)
+        results[label] = (len(content), serialise, to_roster, records, cursor)
+
+    full_records, full_cursor = results["full records"][3:]
+    roster_records, roster_cursor = results["format=roster"][3:]
+    assert full_cursor == roster_cursor
+    assert [(r.studentId, r.present, r.student["rollNumber"], r.student["user"]) for r in full_records] == \
+        [(r.studentId, r.present, r.student["rollNumber"], r.student["user"]) for r in roster_records]
+
+    print(f"{args.students}-student roster")
+    print(f"{'body':<16}{'KiB':>8}{'serialise ms':>14}{'decode to roster ms':>21}")
+    for label, (size, serialise, to_roster, _, _) in results.items():
+        print(f"{label:<16}{size / 1024:>8.1f}{serialise:>14.3f}{to_roster:>21.3f}")
+    (full_size, full_ser, full_dec), (roster_size, roster_ser, roster_dec) = (
+        results["full records"][:3], results["format=roster"][:3]
+    )
+    print(f"format=roster: {1 - roster_size / full_size:.0%} smaller, serialises {full_ser / roster_ser:.1f}x "
+          f"and decodes {full_dec / roster_dec:.1f}x faster")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Benchmark: memory held by open rosters, with and without the shared roster cache.
+
+Several teachers (theory, lab, tutorial) keep a session of the same class
+section open at once. Each conversation's roster is built the way the bot
+builds it, with roster_from_body over a format=roster body, and then either
+kept as is or passed through WhatsAppBot.share_roster. The benchmark reports
+the memory held by all conversations (tracemalloc) and the per-roster cost
+of sharing.
+
+Usage: python benchmarks/bench_roster_sharing.py [--sections 50] [--teachers 3] [--students 120]
+"""
+import argparse
+import gc
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import classImplementation
+from classImplementation import WhatsAppBot, new_user_session, roster_from_body
+from models import TeachingAssignment
+from rosterCache import RosterCache
+
+
+def make_body(section: int, students: int):
+    return {
+        "cursor": "2024-09-02T09:14:07.312Z",
+        "studentIds": [f"5a1e3f7b-student-{section:04d}-{i:09d}" for i in range(students)],
+        "present": [i % 4 != 0 for i in range(students)],
+        "rollNumbers": [f"22CS{section:02d}{i:03d}" for i in range(students)],
+        "firstNames": [f"First{i}" for i in range(students)],
+        "lastNames": [f"Last{section}-{i}" for i in range(students)]
+    }
+
+
+def open_rosters(bodies, teachers: int, share: bool):
+    """One conversation per (section, teacher), each holding its own roster records"""
+    bot = WhatsAppBot()
+    sessions = []
+    elapsed = 0.0
+    for section, body in enumerate(bodies):
+        for teacher in range(teachers):
+            session = new_user_session()
+            session["current_assignment"] = TeachingAssignment(
+                id=f"assignment-{section}-{teacher}", teacherId=f"teacher-{teacher}", courseId=f"course-{section}",
+                branchId="branch-1", semester=3, section="A", academicYear="2024-25", active=True, course={}, branch={}
+            )
+            records, _ = roster_from_body(body, f"session-{section}-{teacher}")
+            start = time.perf_counter()
+            if share:
+                session.update(bot.share_roster(session, records))
+            else:
+                session["roster_lines"] = bot.get_roster_lines({"attendance_records": records})
+            elapsed += time.perf_counter() - start
+            session["attendance_records"] = records
+            sessions.append(session)
+    return sessions, elapsed
+
+
+def held_bytes(bodies, teachers: int, share: bool):
+    # Timed on its own run, as tracemalloc slows allocation-heavy code down
+    classImplementation.roster_cache = RosterCache()
+    _, elapsed = open_rosters(bodies, teachers, share)
+
+    classImplementation.roster_cache = RosterCache()
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    sessions, _ = open_rosters(bodies, teachers, share)
+    gc.collect()
+    held = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    return held, elapsed / len(sessions), classImplementation.roster_cache.stats(), sessions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sections", type=int, default=50)
+    parser.add_argument("--teachers", type=int, default=3, help="conversations open per class section")
+    parser.add_argument("--students", type=int, default=120)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    bodies = [make_body(section, args.students) for section in range(args.sections)]
+    conversations = args.sections * args.teachers
+    print(f"{conversations} conversations: {args.sections} class sections x {args.teachers} teachers, "
+          f"{args.students}-student rosters")
+    print(f"{'rosters':<10}{'MiB held':>10}{'KiB/conversation':>18}{'us/roster':>11}")
+    results = {}
+    for label, share in (("own copy", False), ("shared", True)):
+        held, per_roster, stats, sessions = held_bytes(bodies, args.teachers, share)
+        results[label] = held
+        print(f"{label:<10}{held / 1024 / 1024:>10.2f}{held / conversations / 1024:>18.1f}{per_roster * 1e6:>11.0f}")
+        if share:
+            print(f"  cache: {stats['rosters']} rosters, {stats['inUse']} in use, "
+                  f"{stats['bytes'] / 1024 / 1024:.2f} MiB accounted, student hit ratio {stats['hitRatio']}")
+            del sessions
+            gc.collect()
+            after = classImplementation.roster_cache.stats()
+            print(f"  after every conversation closed: {after['rosters']} rosters alive, {after['inUse']} in use "
+                  f"({after['retainedBytes'] / 1024 / 1024:.2f} MiB retained, budget "
+                  f"{after['maxBytes'] / 1024 / 1024:.0f} MiB)")
+    print(f"sharing saves {1 - results['shared'] / results['own copy']:.0%} of roster memory")
+
+
+if __name__ == "__main__":
+    main()
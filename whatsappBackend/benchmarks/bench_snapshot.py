@@ -0,0 +1,116 @@
+"""Benchmark: save and restore of the warm-restart session snapshot.
+
+Builds a synthetic population of sessions: mostly idle logged-in teachers and
+students, plus a share of teachers mid roll-call holding a class roster (which
+the snapshot leaves out).
+
+Usage: python benchmarks/bench_snapshot.py [--sessions 50000] [--marking 0.05] [--class-size 60]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cryptography.fernet import Fernet
+
+from classImplementation import SESSION_TIMEOUT, UserState, new_user_session
+from models import AttendanceRecord, Session, TeachingAssignment
+from sessionSnapshot import load_snapshot, save_snapshot
+
+
+def make_roster(session_id: str, class_size: int):
+    return [
+        AttendanceRecord(
+            sessionId=session_id,
+            studentId=f"student-{i}",
+            present=random.random() < 0.8,
+            student={"rollNumber": f"CS{i:03d}", "user": {"firstName": f"First{i}", "lastName": f"Last{i}"}}
+        )
+        for i in range(class_size)
+    ]
+
+
+def make_population(count: int, marking_share: float, class_size: int):
+    sessions = {}
+    bindings = {}
+    now = datetime.now()
+    assignment = TeachingAssignment(
+        id="assignment-1", teacherId="teacher-1", courseId="course-1", branchId="branch-1", semester=3, section="A",
+        academicYear="2024-25", active=True, course={"name": "Data Structures", "code": "CS201"}, branch={"name": "CSE"}
+    )
+
+    for i in range(count):
+        phone = f"whatsapp:+91{i:010d}"
+        token = f"eyJhbGciOiJIUzI1NiJ9.{os.urandom(48).hex()}.{os.urandom(24).hex()}"
+        user_info = {"id": f"user-{i}", "firstName": "Test", "lastName": str(i), "role": "TEACHER"}
+        marking = random.random() < marking_share
+
+        session = new_user_session()
+        session.update({
+            "state": UserState.MARKING_ATTENDANCE if marking else UserState.AUTHENTICATED,
+            "user_token": token,
+            "user_info": user_info,
+            "last_activity": now - timedelta(seconds=random.randint(0, 600))
+        })
+        if marking:
+            session.update({
+                "current_assignment": assignment,
+                "current_session": Session(id=f"session-{i}", date="2024-09-02T00:00:00.000Z", topic="Trees"),
+                "assignments": [assignment],
+                "attendance_records": make_roster(f"session-{i}", class_size)
+            })
+        sessions[phone] = session
+        bindings[phone] = {
+            "token": token,
+            "user_info": user_info,
+            "expires_at": now + timedelta(hours=8),
+            "verified_at": now
+        }
+    return sessions, bindings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=50000)
+    parser.add_argument("--marking", type=float, default=0.05, help="share of sessions mid roll-call")
+    parser.add_argument("--class-size", type=int, default=60)
+    args = parser.parse_args()
+
+    random.seed(1)
+    sessions, bindings = make_population(args.sessions, args.marking, args.class_size)
+    key = Fernet.generate_key().decode()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "sessions.snapshot")
+
+        start = time.perf_counter()
+        size = save_snapshot(path, key, sessions, bindings, new_user_session)
+        save_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        restored_sessions, restored_bindings = load_snapshot(path, key, SESSION_TIMEOUT, UserState, new_user_session)
+        load_time = time.perf_counter() - start
+
+    assert len(restored_sessions) == len(sessions) and len(restored_bindings) == len(bindings)
+    phone = next(iter(sessions))
+    assert restored_sessions[phone]["user_token"] == sessions[phone]["user_token"]
+    marking_phone = next((p for p, s in sessions.items() if s["attendance_records"]), None)
+    if marking_phone:
+        # Rosters are fetched again on the teacher's next message
+        restored = restored_sessions[marking_phone]
+        assert restored["current_session"] == sessions[marking_phone]["current_session"]
+        assert restored["attendance_records"] == []
+
+    print(f"{args.sessions} sessions ({args.marking:.0%} mid roll-call with {args.class_size} students)")
+    print(f"snapshot size: {size / 1024 / 1024:.1f} MiB")
+    print(f"save:    {save_time:.3f}s")
+    print(f"restore: {load_time:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Benchmark the 'status' reply on large rosters.
+
+Usage: python benchmarks/bench_status.py [--students 300] [--iterations 2000]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from classImplementation import WhatsAppBot
+from models import AttendanceRecord
+
+
+def make_roster(students: int):
+    return [
+        AttendanceRecord(
+            id=f"att-{i}",
+            sessionId="session-1",
+            studentId=f"stu-{i}",
+            present=i % 4 != 0,
+            student={
+                "rollNumber": f"CS{1000 + i}",
+                "user": {"firstName": f"First{i}", "lastName": f"Last{i}"}
+            }
+        )
+        for i in range(students)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--students", type=int, default=300)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    bot = WhatsAppBot()
+    roster = make_roster(args.students)
+
+    # Cold: display lines are rebuilt because the roster was just loaded
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+        session = {"attendance_records": roster, "roster_lines": {}}
+        bot.get_attendance_status(session)
+    cold = (time.perf_counter() - start) / args.iterations
+
+    # Warm: display lines come from the per-roster cache
+    session = {"attendance_records": roster, "roster_lines": {}}
+    reply = bot.get_attendance_status(session)
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+        bot.get_attendance_status(session)
+    warm = (time.perf_counter() - start) / args.iterations
+
+    parts = [reply] if isinstance(reply, str) else reply
+    print(f"students={args.students} iterations={args.iterations}")
+    print(f"parts={len(parts)} max_part_len={max(len(p) for p in parts)} total_chars={sum(len(p) for p in parts)}")
+    print(f"cold status: {cold * 1e6:.1f} us/call")
+    print(f"warm status: {warm * 1e6:.1f} us/call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""Load test: many teachers sending absentee-mode marks at once.
+
+Each teacher's bot session holds a roster of unmarked students and sends
+'absent <a few roll numbers>', so every reply waits on one large
+PUT /api/teachers/attendance/batch/:sessionId. The writes go through the bot's
+real AttendanceService.
+
+By default the batch route is served in-process by a stand-in that models the
+Prisma connection pool: a fixed number of connections, a fixed latency per
+query, and a pool timeout. It runs the query pattern of either the old route
+(an enrollment lookup and an upsert per record, all at once) or the set-based
+one (one enrollment query and one upsert in a transaction). With --backend,
+the same load is sent to a running backend instead, using --token and the
+rosters of the --session ids.
+
+Usage: python benchmarks/load_batch_marking.py [--teachers 20] [--students 120] [--route set|fanout]
+       python benchmarks/load_batch_marking.py --backend http://localhost:3000 --token <jwt> --session <id> [--session <id> ...]
+"""
+from typing import List
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+import classImplementation
+from classImplementation import UserState, WhatsAppBot, attendance_service, new_user_session
+from decoding import convert
+from models import AttendanceRecord, Session
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class StubBackend:
+    """The batch route's database work against a bounded connection pool"""
+
+    def __init__(self, route: str, pool_size: int, query_ms: float, pool_timeout: float):
+        self.route = route
+        self.pool = asyncio.Semaphore(pool_size)
+        self.query_latency = query_ms / 1000
+        self.pool_timeout = pool_timeout
+        self.queries = 0
+        self.pool_timeouts = 0
+
+    async def connection(self):
+        try:
+            await asyncio.wait_for(self.pool.acquire(), self.pool_timeout)
+        except asyncio.TimeoutError:
+            self.pool_timeouts += 1
+            raise PoolTimeout()
+
+    async def query(self, count: int = 1):
+        """Run count queries on one connection"""
+        await self.connection()
+        try:
+            for _ in range(count):
+                self.queries += 1
+                await asyncio.sleep(self.query_latency)
+        finally:
+            self.pool.release()
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        records = json.loads(request.content)["attendanceRecords"]
+        try:
+            await self.query()  # session + assignment lookup
+            if self.route == "fanout":
+                async def one(record):
+                    await self.query()  # enrollment.findFirst
+                    await self.query()  # attendance.upsert
+                await asyncio.gather(*(one(record) for record in records))
+            else:
+                await self.query(2)  # enrollment.findMany + INSERT .. ON CONFLICT, one transaction
+        except PoolTimeout:
+            return httpx.Response(500, text="Server Error")
+        return httpx.Response(200, json=[{"studentId": record["studentId"], "status": "success"} for record in records])
+
+
+def make_roster(session_id: str, students: int):
+    return [
+        AttendanceRecord(sessionId=session_id, studentId=f"stu-{i}", present=False,
+                         student={"rollNumber": f"{1000 + i}", "user": {"firstName": "Student", "lastName": str(i)}})
+        for i in range(students)
+    ]
+
+
+async def load_rosters(token: str, session_ids):
+    rosters = {}
+    for session_id in session_ids:
+        roster, _ = await attendance_service.get_session_attendance(session_id, token)
+        if not roster:
+            raise SystemExit(f"Could not load the roster of session {session_id}")
+        rosters[session_id] = roster
+    return rosters
+
+
+async def run(args):
+    backend = None
+    if args.backend:
+        classImplementation.EXISTING_BACKEND_URL = args.backend.rstrip('/')
+        rosters = await load_rosters(args.token, args.session)
+        token = args.token
+    else:
+        backend = StubBackend(args.route, args.pool, args.query_ms, args.pool_timeout)
+        attendance_service.http_client = httpx.AsyncClient(transport=httpx.MockTransport(backend.handle))
+        rosters = {f"session-{i}": make_roster(f"session-{i}", args.students) for i in range(args.teachers)}
+        token = "teacher-token"
+
+    bot = WhatsAppBot()
+    session_ids = list(rosters)
+    teachers = []
+    for i in range(args.teachers):
+        session_id = session_ids[i % len(session_ids)]
+        roster = convert([{**record.model_dump(), "present": False} for record in rosters[session_id]],
+                         List[AttendanceRecord])
+        phone = f"whatsapp:+1000000{i:04d}"
+        session = classImplementation.user_sessions[phone] = new_user_session()
+        session.update({
+            "state": UserState.MARKING_ATTENDANCE,
+            "user_token": token,
+            "current_session": Session(id=session_id, date="2024-09-02T00:00:00.000Z"),
+            "attendance_records": roster
+        })
+        absent = random.sample([record.student["rollNumber"] for record in roster], min(5, len(roster)))
+        teachers.append((phone, f"absent {' '.join(absent)}"))
+
+    latencies = []
+
+    async def teacher(phone: str, message: str):
+        await asyncio.sleep(random.uniform(0, args.spread))
+        start = time.perf_counter()
+        reply = await bot.process_message(phone, message)
+        latencies.append(time.perf_counter() - start)
+        return isinstance(reply, list) or reply.startswith("✅")
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(teacher(phone, message) for phone, message in teachers))
+    elapsed = time.perf_counter() - start
+    await attendance_service.http_client.aclose()
+
+    latencies.sort()
+    target = args.backend or f"stand-in, {args.route} route, pool {args.pool}, {args.query_ms:g} ms/query"
+    print(f"{args.teachers} absentee batches ({len(rosters[session_ids[0]])} students each) against {target}")
+    print(f"  succeeded {sum(results)}/{args.teachers}")
+    if backend:
+        print(f"  queries {backend.queries} ({backend.queries / args.teachers:.0f} per batch), "
+              f"pool timeouts {backend.pool_timeouts}")
+    print(f"  reply latency p50 {statistics.median(latencies) * 1000:.0f} ms | "
+          f"p95 {latencies[max(int(len(latencies) * 0.95) - 1, 0)] * 1000:.0f} ms | total {elapsed:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--teachers", type=int, default=20)
+    parser.add_argument("--students", type=int, default=120, help="roster size for the stand-in")
+    parser.add_argument("--spread", type=float, default=1.0, help="seconds over which teachers send")
+    parser.add_argument("--route", choices=("set", "fanout"), default="set")
+    parser.add_argument("--pool", type=int, default=9, help="Prisma's default: 2 x CPUs + 1")
+    parser.add_argument("--query-ms", type=float, default=2.0)
+    parser.add_argument("--pool-timeout", type=float, default=10.0)
+    parser.add_argument("--backend", help="base URL of a running backend")
+    parser.add_argument("--token", help="teacher JWT for --backend")
+    parser.add_argument("--session", action="append", default=[], help="session id for --backend (repeatable)")
+    args = parser.parse_args()
+    if args.backend and not (args.token and args.session):
+        parser.error("--backend needs --token and at least one --session")
+
+    logging.disable(logging.INFO)
+    random.seed(1)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Load test: a class of students checking in with the same code in a short burst.
+
+The backend write is replaced by an in-process stand-in with fixed latency so the
+test measures how check-ins are coalesced, not the network.
+
+Usage: python benchmarks/load_checkin.py [--students 180] [--window 60] [--speedup 20]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import classImplementation
+from classImplementation import UserState, WhatsAppBot, attendance_service
+from models import AttendanceRecord, Session
+
+
+class StubBackend:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = []
+
+    async def mark_attendance_batch(self, session_id, attendance_records, user_token):
+        self.calls.append(len(attendance_records))
+        await asyncio.sleep(self.latency)
+        return True
+
+
+async def run(students: int, window: float, speedup: float, latency: float):
+    backend = StubBackend(latency)
+    attendance_service.mark_attendance_batch = backend.mark_attendance_batch
+
+    bot = WhatsAppBot()
+    teacher = "whatsapp:+10000000000"
+    session = bot.get_user_session(teacher)
+    session.update({
+        "state": UserState.MARKING_ATTENDANCE,
+        "user_token": "teacher-token",
+        "current_session": Session(id="session-1", date="2024-09-02T00:00:00.000Z"),
+        "attendance_records": [
+            AttendanceRecord(sessionId="session-1", studentId=f"stu-{i}", present=False,
+                             student={"rollNumber": f"{1000 + i}", "user": {"firstName": "Student", "lastName": str(i)}})
+            for i in range(students)
+        ]
+    })
+    await bot.process_message(teacher, "code")
+    code = classImplementation.checkin_registry.session_codes["session-1"]
+
+    latencies = []
+
+    async def student(i: int):
+        # Arrival times spread uniformly over the (compressed) burst window
+        await asyncio.sleep(random.uniform(0, window / speedup))
+        start = time.perf_counter()
+        reply = await bot.process_message(f"whatsapp:+2000000{i:04d}", f"checkin {code} {1000 + i}")
+        latencies.append(time.perf_counter() - start)
+        return reply.startswith("✅")
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(student(i) for i in range(students)))
+    elapsed = time.perf_counter() - start
+
+    present = sum(1 for record in session["attendance_records"] if record.present)
+    latencies.sort()
+    print(f"{students} check-ins over {window / speedup:.1f}s (window {window:.0f}s / speedup {speedup:g})")
+    print(f"  succeeded {sum(results)}/{students}, teacher roster shows {present} present")
+    print(f"  backend batch calls: {len(backend.calls)} (largest batch {max(backend.calls)}) vs {students} without coalescing")
+    print(f"  reply latency p50 {statistics.median(latencies) * 1000:.0f} ms | "
+          f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.0f} ms | total {elapsed:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--students", type=int, default=180)
+    parser.add_argument("--window", type=float, default=60.0, help="real-world burst window in seconds")
+    parser.add_argument("--speedup", type=float, default=20.0, help="compress the window by this factor")
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated backend latency in seconds")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    random.seed(1)
+    asyncio.run(run(args.students, args.window, args.speedup, args.latency))
+
+
+if __name__ == "__main__":
+    main()
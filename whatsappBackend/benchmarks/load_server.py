@@ -0,0 +1,131 @@
+"""Load test: webhook requests/second of the launcher in different configurations.
+
+Starts server.py once per configuration (event loop, HTTP parser, workers) and
+drives POST /webhook/whatsapp with 'help' from many phones, so every request
+goes through form parsing, the rate limiter, admission, a session and TwiML,
+but never the backend. Clients are separate processes on keep-alive
+connections with a minimal HTTP/1.1 client, so they cost the box as little
+as possible; they still share its CPUs with the server, so compare
+configurations against each other rather than reading absolute numbers.
+
+Usage: python benchmarks/load_server.py [--duration 10] [--connections 64] [--clients 2]
+                                        [--config asyncio/h11/1 --config uvloop/httptools/2 ...]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from urllib.parse import urlencode
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PORT = 18091
+DEFAULT_CONFIGS = ("asyncio/h11/1", "uvloop/httptools/1", "uvloop/httptools/2", "uvloop/httptools/4")
+
+
+def webhook_request(phone: str) -> bytes:
+    body = urlencode({"From": phone, "Body": "help", "MessageSid": "SM0"}).encode()
+    return (f"POST /webhook/whatsapp HTTP/1.1\r\nHost: localhost\r\n"
+            f"Content-Type: application/x-www-form-urlencoded\r\nContent-Length: {len(body)}\r\n\r\n").encode() + body
+
+
+async def connection(port: int, requests, until: float, latencies, counts):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        while time.perf_counter() < until:
+            start = time.perf_counter()
+            writer.write(random.choice(requests))
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = int(next(line.split(b":")[1] for line in head.split(b"\r\n")
+                              if line.lower().startswith(b"content-length")))
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+            counts["ok" if head.startswith(b"HTTP/1.1 200") else "errors"] += 1
+    except (OSError, asyncio.IncompleteReadError):
+        counts["errors"] += 1
+    finally:
+        writer.close()
+
+
+def client(port: int, connections: int, duration: float, phones: range, results):
+    """One load process: connections keep-alive connections sending webhooks for duration seconds"""
+    async def run():
+        requests = [webhook_request(f"whatsapp:+9199{i:08d}") for i in phones]
+        latencies, counts = [], {"ok": 0, "errors": 0}
+        until = time.perf_counter() + duration
+        await asyncio.gather(*(connection(port, requests, until, latencies, counts) for _ in range(connections)))
+        results.put((latencies, counts))
+    asyncio.run(run())
+
+
+def start_server(loop: str, http: str, workers: int) -> subprocess.Popen:
+    command = [sys.executable, "server.py", "--port", str(PORT), "--loop", loop, "--http", http,
+               "--workers", str(workers), "--internal-port", str(PORT + 1000)]
+    env = {**os.environ, "SHARD_SECRET": "load-test-secret", "TRACING_ENABLED": "false"}
+    server = subprocess.Popen(command, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(200):
+        try:
+            httpx.get(f"http://127.0.0.1:{PORT}/health")
+            # Each worker is ready once it answers forwarded webhooks too
+            time.sleep(2 if workers > 1 else 0.5)
+            return server
+        except httpx.TransportError:
+            time.sleep(0.1)
+    server.kill()
+    raise SystemExit(f"server.py did not start with {loop}/{http}/{workers}")
+
+
+def measure(label: str, args):
+    loop, http, workers = label.split("/")
+    server = start_server(loop, http, int(workers))
+    try:
+        context = multiprocessing.get_context("spawn")
+        results = context.Queue()
+        # Distinct phones per client process, enough that no phone reaches its rate limit
+        phones = args.phones // args.clients
+        clients = [context.Process(target=client, args=(PORT, args.connections // args.clients, args.duration,
+                                                         range(i * phones, (i + 1) * phones), results))
+                   for i in range(args.clients)]
+        for process in clients:
+            process.start()
+        collected = [results.get() for _ in clients]
+        for process in clients:
+            process.join()
+    finally:
+        server.terminate()
+        server.wait(timeout=60)
+
+    latencies = sorted(latency for part, _ in collected for latency in part)
+    counts = {name: sum(part[name] for _, part in collected) for name in ("ok", "errors")}
+    p99 = latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)] if latencies else 0
+    print(f"{label:<22}{counts['ok'] / args.duration:>10.0f}{statistics.median(latencies) * 1000:>10.1f}"
+          f"{p99 * 1000:>10.1f}{counts['errors']:>8}")
+    return counts["ok"] / args.duration
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load per configuration")
+    parser.add_argument("--connections", type=int, default=64, help="keep-alive connections in total")
+    parser.add_argument("--clients", type=int, default=2, help="load generator processes")
+    parser.add_argument("--phones", type=int, default=200000)
+    parser.add_argument("--config", action="append", help="loop/http/workers, repeatable")
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs, {args.connections} connections from {args.clients} processes, "
+          f"{args.duration:g}s per configuration")
+    print(f"{'loop/http/workers':<22}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    rates = {label: measure(label, args) for label in args.config or DEFAULT_CONFIGS}
+    baseline = next(iter(rates.values()))
+    for label, rate in list(rates.items())[1:]:
+        print(f"{label}: {rate / baseline:.2f}x {next(iter(rates))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Simulation: several in-process bot instances sharing phones on a hash ring.
+
+Each instance is a ShardNode with its own session dict. Instances talk to each
+other through an in-process transport that dispatches on the URL host, so the
+forwarding and handoff paths run exactly as they would over HTTP. Webhooks
+arrive at random instances, like behind a round-robin load balancer.
+
+Usage: python benchmarks/sim_sharding.py [--instances 4] [--phones 20000] [--messages 50000]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime
+from urllib.parse import parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from classImplementation import UserState, new_user_session
+from sharding import ShardNode, routing_key
+
+SECRET = "simulation-secret"
+
+
+class Cluster:
+    def __init__(self, urls):
+        self.nodes = {}
+        transport = httpx.MockTransport(self.dispatch)
+        for url in urls:
+            self.add(url, urls, transport)
+
+    def add(self, url, peers, transport=None):
+        transport = transport or httpx.MockTransport(self.dispatch)
+        self.nodes[url] = ShardNode(url, peers, {}, {}, new_user_session, UserState, SECRET, transport=transport)
+
+    async def dispatch(self, request: httpx.Request) -> httpx.Response:
+        node = self.nodes[f"http://{request.url.host}"]
+        if request.url.path == "/internal/shard/sessions":
+            if not node.is_internal(request.headers):
+                return httpx.Response(403)
+            return httpx.Response(200, json={"accepted": node.accept_handoff(json.loads(request.content))})
+        return await self.webhook(node, request.content, request.headers)
+
+    async def webhook(self, node: ShardNode, body: bytes, headers) -> httpx.Response:
+        """The sharding part of main.process_webhook, with a stand-in for process_message"""
+        form = {key: values[0] for key, values in parse_qs(body.decode()).items()}
+        phone, message = form["From"], form["Body"]
+
+        if not node.is_internal(headers):
+            key = routing_key(phone, message)
+            owner = node.owner(key)
+            if owner != node.self_url and not node.holds(key):
+                response = await node.forward(owner, "/webhook/whatsapp", body, {})
+                return httpx.Response(response.status_code, content=response.content)
+
+        session = node.sessions.get(phone)
+        if session is None:
+            session = node.sessions[phone] = new_user_session()
+            session["state"] = UserState.AUTHENTICATED
+        session["last_activity"] = datetime.now()
+        session["sessions_offset"] += 1  # stands in for conversation progress
+        return httpx.Response(200, content=node.self_url.encode())
+
+
+async def send_messages(cluster: Cluster, phones, count: int):
+    urls = list(cluster.nodes)
+    forwarded_before = sum(node.forwarded for node in cluster.nodes.values())
+    start = time.perf_counter()
+    for _ in range(count):
+        phone = random.choice(phones)
+        body = f"From={phone}&Body=status".encode()
+        await cluster.webhook(cluster.nodes[random.choice(urls)], body, {})
+    elapsed = time.perf_counter() - start
+    forwarded = sum(node.forwarded for node in cluster.nodes.values()) - forwarded_before
+    return elapsed, forwarded
+
+
+def report_balance(cluster: Cluster, label: str):
+    counts = [len(node.sessions) for node in cluster.nodes.values()]
+    spread = (max(counts) - min(counts)) / statistics.mean(counts) * 100
+    print(f"{label}: sessions per instance {counts} (max-min spread {spread:.1f}% of mean)")
+
+
+async def run(instances: int, phone_count: int, messages: int):
+    urls = [f"http://bot-{i}" for i in range(instances)]
+    cluster = Cluster(urls)
+    phones = [f"whatsapp:+91{i:010d}" for i in range(phone_count)]
+
+    elapsed, forwarded = await send_messages(cluster, phones, messages)
+    print(f"{messages} webhooks across {instances} instances in {elapsed:.2f}s; "
+          f"{forwarded / messages:.0%} forwarded (expected ~{1 - 1 / instances:.0%})")
+    report_balance(cluster, "before join")
+
+    # Every phone lives on exactly one instance
+    owners = {}
+    for url, node in cluster.nodes.items():
+        for phone in node.sessions:
+            assert phone not in owners, f"{phone} on {owners[phone]} and {url}"
+            owners[phone] = url
+    progress = {phone: node.sessions[phone]["sessions_offset"] for phone, url in owners.items()
+                for node in [cluster.nodes[url]]}
+
+    # A new instance joins; every instance gets the new peer list and hands off
+    new_url = f"http://bot-{instances}"
+    peers = urls + [new_url]
+    cluster.add(new_url, peers)
+    start = time.perf_counter()
+    moved = 0
+    for url in urls:
+        result = await cluster.nodes[url].set_peers(peers)
+        moved += sum(result.values())
+    print(f"join: {moved} sessions moved in {time.perf_counter() - start:.2f}s "
+          f"({moved / len(owners):.0%} of sessions, expected ~{1 / (instances + 1):.0%})")
+    report_balance(cluster, "after join")
+
+    # Conversation state survived the move
+    for url, node in cluster.nodes.items():
+        for phone, session in node.sessions.items():
+            assert node.owns(phone), f"{phone} not owned by {url}"
+            assert session["sessions_offset"] == progress[phone]
+
+    for node in cluster.nodes.values():
+        await node.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--instances", type=int, default=4)
+    parser.add_argument("--phones", type=int, default=20000)
+    parser.add_argument("--messages", type=int, default=50000)
+    args = parser.parse_args()
+
+    random.seed(1)
+    asyncio.run(run(args.instances, args.phones, args.messages))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""Bulk student import: create users and enrollments from a CSV.
+
+CSV columns (header row required):
+    email, password, firstName, lastName, rollNumber, branchId      required
+    currentSemester, section                                        optional
+    courseIds, semester, academicYear                               optional, enrolls the
+                                                                    student (courseIds is
+                                                                    ';'-separated)
+
+Usage:
+    python bulkImport.py students.csv --token <admin token> [--checkpoint import.json]
+                         [--results results.csv] [--concurrency 8] [--chunk-size 100]
+
+Re-running with the same --checkpoint resumes after the last completed chunk.
+"""
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import re
+
+from classImplementation import AttendanceService, attendance_service
+
+logger = logging.getLogger(__name__)
+
+IMPORT_CHUNK_SIZE = 100
+IMPORT_CONCURRENCY = 8
+REQUIRED_COLUMNS = ("email", "password", "firstName", "lastName", "rollNumber", "branchId")
+SECTIONS = ("A", "B", "NONE")
+RESULT_COLUMNS = ("row", "email", "rollNumber", "status", "studentId", "enrolled", "error")
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
+
+class ImportAborted(Exception):
+    """Raised when a whole chunk fails to reach the backend; the checkpoint is left at the previous chunk"""
+
+
+def iter_import_rows(path: str, start_after: int = 0) -> Iterator[Tuple[int, Dict]]:
+    """Lazily yield (row number, raw row) from the CSV, skipping already imported rows"""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        missing = [column for column in REQUIRED_COLUMNS if column not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"CSV is missing required columns: {', '.join(missing)}")
+
+        for row_number, raw in enumerate(reader, 1):
+            if row_number > start_after:
+                yield row_number, raw
+
+
+def validate_row(raw: Dict) -> Tuple[Optional[Dict], Optional[str]]:
+    """Turn a raw CSV row into user and enrollment payloads, or an error message"""
+    row = {key: (value or "").strip() for key, value in raw.items() if key}
+
+    for column in REQUIRED_COLUMNS:
+        if not row.get(column):
+            return None, f"Missing {column}"
+
+    if not EMAIL_PATTERN.match(row["email"]):
+        return None, "Invalid email"
+
+    try:
+        current_semester = int(row.get("currentSemester") or 1)
+    except ValueError:
+        return None, "currentSemester must be a number"
+
+    section = (row.get("section") or "NONE").upper()
+    if section not in SECTIONS:
+        return None, f"section must be one of {', '.join(SECTIONS)}"
+
+    user = {
+        "email": row["email"].lower(),
+        "password": row["password"],
+        "firstName": row["firstName"],
+        "lastName": row["lastName"],
+        "role": "STUDENT",
+        "rollNumber": row["rollNumber"],
+        "branchId": row["branchId"],
+        "currentSemester": current_semester,
+        "section": section
+    }
+
+    enrollment = None
+    course_ids = [course_id.strip() for course_id in (row.get("courseIds") or "").split(";") if course_id.strip()]
+    if course_ids:
+        if not row.get("academicYear"):
+            return None, "academicYear is required when courseIds are given"
+        try:
+            semester = int(row.get("semester") or current_semester)
+        except ValueError:
+            return None, "semester must be a number"
+        enrollment = {
+            "courseIds": tuple(sorted(course_ids)),
+            "semester": semester,
+            "academicYear": row["academicYear"]
+        }
+
+    return {"user": user, "enrollment": enrollment}, None
+
+
+def chunked(rows: Iterable, size: int) -> Iterator[List]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def load_checkpoint(path: Optional[str]) -> Dict:
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    return {"last_row": 0, "summary": {}}
+
+
+def record_chunk(writer: Optional[csv.DictWriter], results_file, results: List[Dict],
+                 checkpoint_path: Optional[str], checkpoint: Dict):
+    """Write a chunk's result lines, then the checkpoint that skips past them"""
+    if writer:
+        writer.writerows(results)
+        results_file.flush()
+    save_checkpoint(checkpoint_path, checkpoint)
+
+
+def save_checkpoint(path: Optional[str], checkpoint: Dict):
+    if not path:
+        return
+    # Write then rename so a crash never leaves a half-written checkpoint
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+class BulkImporter:
+    """Creates users and enrollments chunk by chunk with bounded concurrency"""
+
+    def __init__(self, user_token: str, service: AttendanceService = attendance_service,
+                 concurrency: int = IMPORT_CONCURRENCY, chunk_size: int = IMPORT_CHUNK_SIZE):
+        self.user_token = user_token
+        self.service = service
+        self.chunk_size = chunk_size
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.existing_students: Optional[Dict[str, str]] = None
+        # Accounts this job created, so a later row with the same email resolves without a lookup
+        self.created_students: Dict[str, str] = {}
+        self.existing_refreshed = False
+        self.progress: Dict = {"last_row": 0, "summary": {}}
+
+    async def _bounded(self, coro):
+        async with self.semaphore:
+            return await coro
+
+    async def resolve_existing(self, email: str) -> Optional[str]:
+        """Student id for an email that already has an account.
+
+        The student list is loaded on first need and reloaded at most once per
+        chunk when an email is missing from it; a failed load is not kept.
+        """
+        student_id = self.created_students.get(email) or (self.existing_students or {}).get(email)
+        if student_id or self.existing_refreshed:
+            return student_id
+
+        self.existing_refreshed = True
+        users = await self.service.get_users(self.user_token, role="STUDENT")
+        if users is None:
+            return None
+        self.existing_students = {
+            user["email"].lower(): user["student"]["id"]
+            for user in users if user.get("student")
+        }
+        return self.existing_students.get(email)
+
+    async def import_chunk(self, chunk: List[Tuple[int, Dict]]) -> List[Dict]:
+        self.existing_refreshed = False
+        results = []
+        valid = []
+        for row_number, raw in chunk:
+            payload, error = validate_row(raw)
+            result = {
+                "row": row_number,
+                "email": (raw.get("email") or "").strip(),
+                "rollNumber": (raw.get("rollNumber") or "").strip(),
+                "status": "invalid" if error else None,
+                "studentId": None,
+                "enrolled": False,
+                "error": error
+            }
+            results.append(result)
+            if payload:
+                valid.append((result, payload))
+
+        created = await asyncio.gather(*(
+            self._bounded(self.service.create_user(payload["user"], self.user_token))
+            for _, payload in valid
+        ))
+
+        if valid and all(outcome["status"] == "unreachable" for outcome in created):
+            raise ImportAborted(f"No user in rows {chunk[0][0]}-{chunk[-1][0]} could be created: {created[0]['error']}")
+
+        # Students needing the same enrollment go to the backend in one batch call
+        enrollment_groups: Dict[Tuple, List[Dict]] = {}
+        for (result, payload), outcome in zip(valid, created):
+            result["status"] = outcome["status"]
+            if outcome["status"] == "created":
+                result["studentId"] = (outcome["user"].get("student") or {}).get("id")
+                if result["studentId"]:
+                    self.created_students[payload["user"]["email"]] = result["studentId"]
+            elif outcome["status"] == "exists":
+                result["studentId"] = await self.resolve_existing(payload["user"]["email"])
+                if not result["studentId"]:
+                    result["error"] = "Account exists but its student record could not be looked up"
+            else:
+                result["error"] = outcome["error"]
+
+            enrollment = payload["enrollment"]
+            if enrollment and result["studentId"]:
+                key = (enrollment["courseIds"], enrollment["semester"], enrollment["academicYear"])
+                enrollment_groups.setdefault(key, []).append(result)
+
+        groups = list(enrollment_groups.items())
+        enrolled = await asyncio.gather(*(
+            self._bounded(self.service.enroll_students_batch(
+                [result["studentId"] for result in group], list(course_ids), semester, academic_year, self.user_token
+            ))
+            for (course_ids, semester, academic_year), group in groups
+        ))
+        for (_, group), success in zip(groups, enrolled):
+            for result in group:
+                result["enrolled"] = success
+                if not success:
+                    result["error"] = "Enrollment failed"
+
+        return results
+
+    async def run(self, csv_path: str, checkpoint_path: Optional[str] = None,
+                  results_path: Optional[str] = None) -> Dict:
+        """Import the CSV, resuming from the checkpoint if there is one; returns status counts"""
+        checkpoint = load_checkpoint(checkpoint_path)
+        self.progress = checkpoint
+        summary = checkpoint.setdefault("summary", {})
+        if checkpoint["last_row"]:
+            logger.info(f"Resuming import of {csv_path} after row {checkpoint['last_row']}")
+
+        results_file = None
+        writer = None
+        if results_path:
+            append = bool(checkpoint["last_row"]) and os.path.exists(results_path)
+            results_file = open(results_path, "a" if append else "w", newline="", encoding="utf-8")
+            writer = csv.DictWriter(results_file, fieldnames=RESULT_COLUMNS)
+            if not append:
+                writer.writeheader()
+
+        chunks = chunked(iter_import_rows(csv_path, checkpoint["last_row"]), self.chunk_size)
+        try:
+            # Reading the CSV and writing results and checkpoints happen in a worker thread, off the event loop
+            while (chunk := await asyncio.to_thread(next, chunks, None)) is not None:
+                results = await self.import_chunk(chunk)
+
+                for result in results:
+                    summary[result["status"]] = summary.get(result["status"], 0) + 1
+                checkpoint["last_row"] = chunk[-1][0]
+                await asyncio.to_thread(record_chunk, writer, results_file, results, checkpoint_path, checkpoint)
+                logger.info(f"Imported rows up to {checkpoint['last_row']}: {summary}")
+        finally:
+            if results_file:
+                results_file.close()
+
+        return summary
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("csv_path")
+    parser.add_argument("--token", default=os.getenv("ADMIN_TOKEN"), help="admin JWT (default: $ADMIN_TOKEN)")
+    parser.add_argument("--checkpoint", help="checkpoint file used to resume an interrupted import")
+    parser.add_argument("--results", help="CSV file receiving one result line per row")
+    parser.add_argument("--concurrency", type=int, default=IMPORT_CONCURRENCY)
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    if not args.token:
+        parser.error("an admin token is required (--token or $ADMIN_TOKEN)")
+
+    importer = BulkImporter(args.token, concurrency=args.concurrency, chunk_size=args.chunk_size)
+    try:
+        summary = await importer.run(args.csv_path, args.checkpoint, args.results)
+        print(f"Import finished: {summary}")
+    except ImportAborted as e:
+        print(f"Import aborted: {e}\nRe-run with the same --checkpoint to resume.")
+    finally:
+        await attendance_service.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
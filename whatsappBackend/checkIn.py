@@ -0,0 +1,134 @@
+from typing import Any, Callable, Dict, Optional
+from datetime import datetime, timedelta
+import asyncio
+import logging
+import secrets
+
+logger = logging.getLogger(__name__)
+
+# How long a self check-in code stays valid after the teacher generates it
+CHECKIN_CODE_TTL = timedelta(minutes=5)
+# Check-ins arriving within this window are written in one batch per session
+CHECKIN_FLUSH_INTERVAL = 0.3
+# No 0/O or 1/I so codes survive being read off a projector
+CODE_ALPHABET = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"
+CODE_LENGTH = 6
+
+
+class CheckInRegistry:
+    """In-memory index of active check-in codes.
+
+    Each entry names the teacher's phone. Check-ins look students up in the
+    roster that conversation holds when they arrive, so they show up in the
+    teacher's 'status' without a reload, including students added since the
+    code was issued.
+    """
+
+    def __init__(self, ttl: timedelta = CHECKIN_CODE_TTL, code_filter: Optional[Callable[[str], bool]] = None):
+        self.ttl = ttl
+        # Restricts which codes may be issued, e.g. to codes a sharded instance owns
+        self.code_filter = code_filter
+        self.codes: Dict[str, Dict] = {}
+        self.session_codes: Dict[str, str] = {}
+
+    def create(self, session_id: str, user_token: str, teacher_phone: str) -> Dict:
+        """Generate a fresh code for a session, replacing any previous one"""
+        self.purge_expired()
+        self.revoke(session_id)
+
+        code = "".join(secrets.choice(CODE_ALPHABET) for _ in range(CODE_LENGTH))
+        while code in self.codes or (self.code_filter and not self.code_filter(code)):
+            code = "".join(secrets.choice(CODE_ALPHABET) for _ in range(CODE_LENGTH))
+
+        entry = {
+            "code": code,
+            "session_id": session_id,
+            "user_token": user_token,
+            "teacher_phone": teacher_phone,
+            "expires_at": datetime.now() + self.ttl,
+            "checked_in": set(),
+            "phones": {}
+        }
+        self.codes[code] = entry
+        self.session_codes[session_id] = code
+        return entry
+
+    def lookup(self, code: str) -> Optional[Dict]:
+        entry = self.codes.get(code.upper())
+        if entry is None:
+            return None
+        if datetime.now() > entry["expires_at"]:
+            self.revoke(entry["session_id"])
+            return None
+        return entry
+
+    def for_session(self, session_id: str) -> Optional[Dict]:
+        code = self.session_codes.get(session_id)
+        return self.lookup(code) if code else None
+
+    def revoke(self, session_id: str):
+        code = self.session_codes.pop(session_id, None)
+        if code:
+            self.codes.pop(code, None)
+
+    def purge_expired(self):
+        current_time = datetime.now()
+        expired = [entry["session_id"] for entry in self.codes.values() if current_time > entry["expires_at"]]
+        for session_id in expired:
+            self.revoke(session_id)
+
+
+class CheckInCoalescer:
+    """Merges concurrent check-ins into one mark_attendance_batch call per session.
+
+    The first check-in for a session opens a batch and schedules its flush
+    after the flush interval; later check-ins join the open batch. Every
+    submitter waits for, and gets, the result of the shared write.
+    """
+
+    def __init__(self, service: Any, interval: float = CHECKIN_FLUSH_INTERVAL):
+        self.service = service
+        self.interval = interval
+        self.pending: Dict[str, Dict] = {}
+
+    async def submit(self, session_id: str, user_token: str, student_id: str) -> bool:
+        batch = self.pending.get(session_id)
+        if batch is None:
+            batch = self.pending[session_id] = {"user_token": user_token, "futures": {}}
+            batch["task"] = asyncio.create_task(self._flush_later(session_id))
+
+        future = batch["futures"].get(student_id)
+        if future is None:
+            future = batch["futures"][student_id] = asyncio.get_running_loop().create_future()
+
+        # Shield so one cancelled webhook doesn't cancel the shared result
+        return await asyncio.shield(future)
+
+    async def _flush_later(self, session_id: str):
+        await asyncio.sleep(self.interval)
+        await self._flush(session_id)
+
+    async def drain(self):
+        """Write every open batch now instead of after its interval (on shutdown)"""
+        batches = list(self.pending)
+        for session_id in batches:
+            self.pending[session_id]["task"].cancel()
+        await asyncio.gather(*(self._flush(session_id) for session_id in batches))
+
+    async def _flush(self, session_id: str):
+        batch = self.pending.pop(session_id, None)
+        if not batch:
+            return
+
+        futures = batch["futures"]
+        records = [{"studentId": student_id, "present": True} for student_id in futures]
+        try:
+            success = await self.service.mark_attendance_batch(session_id, records, batch["user_token"])
+        except Exception as e:
+            logger.error(f"Error flushing {len(records)} check-ins for session {session_id}: {e}")
+            success = False
+
+        logger.info(f"Flushed {len(records)} check-ins for session {session_id}: {'ok' if success else 'failed'}")
+        for future in futures.values():
+            if not future.done():
+                future.set_result(success)
@@ -2,7 +2,7 @@ from fastapi import FastAPI, HTTPException, Request, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.responses import Response
 from pydantic import BaseModel, Field
-from typing import Dict, List, Optional, Any, Union
+from typing import Callable, Dict, List, Optional, Any, Tuple, Union
 import httpx
 import json
 import logging
@@ -13,6 +13,22 @@ import asyncio
 from urllib.parse import quote
 import traceback
 import re
+from messageBuilder import WHATSAPP_MESSAGE_LIMIT, MessageBuilder, build_roster_lines, format_student_line
+from attendanceAnalytics import DEFAULT_THRESHOLD, THRESHOLD_ERROR, AttendanceAnalytics, AttendanceMatrix
+from registerExport import EXPORT_FORMATS, EXPORT_PAGE_SIZE, FetchPage, RegisterExports
+from checkIn import CheckInCoalescer, CheckInRegistry
+from studentCache import StudentAttendanceCache
+from tracing import TRACE_HEADER, tracer
+from rateLimit import create_rate_limiter
+from loginBinding import LoginBindings
+from admission import PRIORITY_BROWSING, PRIORITY_INTERACTIVE, PRIORITY_ROLL_CALL
+from models import AssignmentAttendance, AttendanceChanges, AttendanceRecord, Session, SessionPage, TeachingAssignment
+from decoding import convert, decode
+from responseCache import RevalidatingCache
+from attendanceArchive import open_archive
+from directReads import create_direct_reader
+from rosterCache import RosterCache, class_section_key
+from nameIndex import NameIndex, split_names
 
 # Configure comprehensive logging
 logging.basicConfig(
@@ -27,12 +43,75 @@ EXISTING_BACKEND_URL = os.getenv("EXISTING_BACKEND_URL", "http://localhost:3000"
 TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
 TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
 TWILIO_WHATSAPP_NUMBER = os.getenv("TWILIO_WHATSAPP_NUMBER", "whatsapp:+14155238886")
+# Public address of this service, used to build download links sent to teachers
+BOT_PUBLIC_URL = os.getenv("BOT_PUBLIC_URL", "http://localhost:8001").rstrip('/')
 # Session timeout (30 minutes)
 SESSION_TIMEOUT = timedelta(minutes=30)
+# Roles that may sign in to the bot
+ALLOWED_ROLES = ("TEACHER", "STUDENT")
+# Sessions listed per page ('all' / 'more'); keeps replies under the 1600 char limit
+SESSIONS_PAGE_SIZE = 5
 
 # In-memory session storage with cleanup (use Redis in production)
 user_sessions: Dict[str, Dict] = {}
 
+# Per-assignment attendance matrices for analytics
+attendance_analytics = AttendanceAnalytics()
+
+# Finished attendance register exports awaiting download
+register_exports = RegisterExports()
+
+# Per-student attendance overviews for student mode
+student_attendance_cache = StudentAttendanceCache()
+
+# Decoded rosters, session lists and assignments, revalidated with If-None-Match
+response_cache = RevalidatingCache()
+
+# On-disk columnar copy of the marks the bot sees, for semester reports (None unless configured)
+attendance_archive = open_archive()
+
+# Student details of rosters, shared by the conversations showing the same class section
+roster_cache = RosterCache()
+
+# Hot reads straight from the database, bypassing Express (None unless DIRECT_DATABASE_URL is set)
+direct_reader = create_direct_reader()
+
+
+def latest_marked_at(records: List[AttendanceRecord]) -> Optional[str]:
+    """Delta sync cursor for a freshly fetched roster (ISO timestamps sort as strings)"""
+    return max((record.markedAt for record in records if record.markedAt), default=None)
+
+
+def roster_from_body(body: Any, session_id: str) -> Tuple[List[AttendanceRecord], Optional[str]]:
+    """Fresh roster records and the delta sync cursor from a session attendance body.
+
+    Reads the compact format=roster columns, or full records from a backend
+    without it. Marking flips present on the records, so each call builds
+    new ones; the nested student objects are only read.
+    """
+    if isinstance(body, dict):
+        records = [
+            {
+                "sessionId": session_id,
+                "studentId": student_id,
+                "present": bool(present),
+                "student": {"rollNumber": roll_number, "user": {"firstName": first_name, "lastName": last_name}}
+            }
+            for student_id, present, roll_number, first_name, last_name in zip(
+                body["studentIds"], body["present"], body["rollNumbers"], body["firstNames"], body["lastNames"]
+            )
+        ]
+        return convert(records, List[AttendanceRecord]), body.get("cursor")
+    if isinstance(body, list):
+        records = convert(body, List[AttendanceRecord])
+        return records, latest_marked_at(records)
+    return [], None
+
+
+def marks_of(records: List[AttendanceRecord]) -> List[Dict]:
+    """{"studentId", "present"} marks of records, as the batch endpoint and mark listeners take them"""
+    return [{"studentId": record.studentId, "present": record.present} for record in records]
+
 
 class UserState(Enum):
     UNAUTHENTICATED = "unauthenticated"
@@ -41,6 +120,7 @@ class UserState(Enum):
     SELECTING_SESSION = "selecting_session"
     MARKING_ATTENDANCE = "marking_attendance"
     WAITING_FOR_TOPIC = "waiting_for_topic"
+    STUDENT = "student"
 
 class WhatsAppMessage(BaseModel):
     From: str
@@ -48,32 +128,6 @@ class WhatsAppMessage(BaseModel):
     Body: str
     MessageSid: str
 
-class TeachingAssignment(BaseModel):
-    id: str
-    teacherId: str
-    courseId: str
-    branchId: str
-    semester: int
-    section: str
-    academicYear: str
-    active: bool
-    course: Dict[str, Any]
-    branch: Dict[str, Any]
-
-class Session(BaseModel):
-    id: str
-    date: str
-    topic: Optional[str] = None
-    assignmentId: str
-
-class AttendanceRecord(BaseModel):
-    id: str
-    sessionId: str
-    studentId: str
-    enrollmentId: str
-    present: bool
-    student: Dict[str, Any]
-
 class AttendanceService:
     def __init__(self):
         self.http_client = httpx.AsyncClient(timeout=30.0)
@@ -82,24 +136,63 @@ class AttendanceService:
     
     async def _make_request_with_retry(self, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
         """Make HTTP request with retry mechanism"""
-        for attempt in range(self.max_retries):
-            try:
-                response = await self.http_client.request(method, url, **kwargs)
-                return response
-            except httpx.TimeoutException:
-                logger.warning(f"Request timeout on attempt {attempt + 1} for {url}")
-                if attempt < self.max_retries - 1:
-                    await asyncio.sleep(self.retry_delay * (attempt + 1))
-                else:
-                    logger.error(f"Request failed after {self.max_retries} attempts: {url}")
-                    return None
-            except Exception as e:
-                logger.error(f"Request error on attempt {attempt + 1} for {url}: {e}")
-                if attempt < self.max_retries - 1:
-                    await asyncio.sleep(self.retry_delay * (attempt + 1))
-                else:
-                    return None
-        return None
+        with tracer.span("upstream", method=method, path=url.replace(EXISTING_BACKEND_URL, "", 1)) as span:
+            trace_id = tracer.current_trace_id()
+            if trace_id:
+                kwargs["headers"] = {**(kwargs.get("headers") or {}), TRACE_HEADER: trace_id}
+            
+            for attempt in range(self.max_retries):
+                if span:
+                    span.set("attempts", attempt + 1)
+                try:
+                    response = await self.http_client.request(method, url, **kwargs)
+                    if span:
+                        span.set("status", response.status_code)
+                    return response
+                except httpx.TimeoutException:
+                    logger.warning(f"Request timeout on attempt {attempt + 1} for {url}")
+                    if attempt < self.max_retries - 1:
+                        await asyncio.sleep(self.retry_delay * (attempt + 1))
+                    else:
+                        logger.error(f"Request failed after {self.max_retries} attempts: {url}")
+                        if span:
+                            span.error = "timeout"
+                        return None
+                except Exception as e:
+                    logger.error(f"Request error on attempt {attempt + 1} for {url}: {e}")
+                    if attempt < self.max_retries - 1:
+                        await asyncio.sleep(self.retry_delay * (attempt + 1))
+                    else:
+                        if span:
+                            span.error = str(e)
+                        return None
+            return None
+    
+    async def _conditional_get(self, url: str, headers: Dict, params: Optional[Dict] = None,
+                               copy_value: Optional[Callable[[Any], Any]] = None,
+                               target: Any = None) -> Tuple[Optional[int], Any]:
+        """GET a JSON body, revalidating a cached copy with its ETag.
+
+        Returns (status, decoded body), decoded into target's models when
+        given; a 304 comes back as 200 with the cached value. Status is None
+        if the backend couldn't be reached.
+        """
+        key = (headers.get("Authorization"), url, tuple(sorted((params or {}).items())))
+        cached = response_cache.lookup(key)
+        if cached:
+            headers = {**headers, "If-None-Match": cached.etag}
+
+        response = await self._make_request_with_retry("GET", url, headers=headers, params=params)
+        if response is None:
+            return None, None
+        if response.status_code == 304 and cached:
+            return 200, response_cache.revalidated(key, cached, copy_value)
+        if response.status_code != 200:
+            response_cache.discard(key)
+            return response.status_code, None
+        return 200, response_cache.store(
+            key, response.headers.get("ETag"), decode(response.content, target), len(response.content), copy_value
+        )
     
     async def authenticate_user(self, email: str, password: str) -> Optional[Dict]:
         """Authenticate user with existing backend using email and password"""
@@ -129,7 +222,7 @@ class AttendanceService:
             
             if response.status_code == 200:
                 try:
-                    auth_data = response.json()
+                    auth_data = decode(response.content)
                     logger.info(f"Authentication successful for {email}")
                     logger.debug(f"Auth response keys: {list(auth_data.keys())}")
                     
@@ -150,8 +243,8 @@ class AttendanceService:
                     user_role = user_data.get("role", "").upper()
                     logger.info(f"User role: {user_role}")
                     
-                    if user_role != "TEACHER":
-                        logger.warning(f"User {email} does not have TEACHER role: {user_role}")
+                    if user_role not in ALLOWED_ROLES:
+                        logger.warning(f"User {email} has a role that cannot use the bot: {user_role}")
                         return None
                     
                     return {
@@ -166,7 +259,7 @@ class AttendanceService:
             else:
                 logger.warning(f"Authentication failed with status {response.status_code}")
                 try:
-                    error_data = response.json()
+                    error_data = decode(response.content)
                     logger.warning(f"Error details: {error_data}")
                 except:
                     logger.warning(f"Error response: {response.text}")
@@ -177,7 +270,35 @@ class AttendanceService:
             logger.error(f"Traceback: {traceback.format_exc()}")
             return None
     
-    async def get_teaching_assignments(self, user_token: str) -> List[Dict]:
+    async def verify_token(self, user_token: str) -> Dict:
+        """Check a stored token against /api/auth/me.
+
+        Returns {"status": "valid" | "invalid" | "unreachable", "user": ...}; only
+        "invalid" means the user has to log in again.
+        """
+        try:
+            response = await self._make_request_with_retry(
+                "GET",
+                f"{EXISTING_BACKEND_URL}/api/auth/me",
+                headers={"Authorization": f"Bearer {user_token}"}
+            )
+            
+            if response is None:
+                return {"status": "unreachable", "user": None}
+            user = decode(response.content) if response.status_code == 200 else None
+            if user:
+                return {"status": "valid", "user": user}
+            if response.status_code in (401, 403):
+                return {"status": "invalid", "user": None}
+            
+            logger.warning(f"Unexpected token verification status: {response.status_code}")
+            return {"status": "unreachable", "user": None}
+            
+        except Exception as e:
+            logger.error(f"Error verifying token: {e}")
+            return {"status": "unreachable", "user": None}
+    
+    async def get_teaching_assignments(self, user_token: str) -> List[TeachingAssignment]:
         """Get user's teaching assignments"""
         try:
             logger.info("Fetching teaching assignments")
@@ -186,60 +307,85 @@ class AttendanceService:
                 "Content-Type": "application/json"
             }
             
-            response = await self._make_request_with_retry(
-                "GET",
-                f"{EXISTING_BACKEND_URL}/api/teachers/assignments",
-                headers=headers
-            )
+            status, assignments = await direct_reader.read("assignments", user_token) if direct_reader else (None, None)
+            if status == 200:
+                assignments = convert(assignments, List[TeachingAssignment])
+            elif status is None:
+                status, assignments = await self._conditional_get(
+                    f"{EXISTING_BACKEND_URL}/api/teachers/assignments",
+                    headers,
+                    target=List[TeachingAssignment]
+                )
             
-            if response is None:
+            if status is None:
                 logger.error("Failed to get assignments response")
                 return []
                 
-            if response.status_code == 200:
-                assignments = response.json()
+            if status == 200:
                 logger.info(f"Retrieved {len(assignments)} assignments")
-                return assignments if isinstance(assignments, list) else []
+                if attendance_archive:
+                    await asyncio.to_thread(attendance_archive.describe_assignments, assignments)
+                return assignments
             else:
-                logger.warning(f"Failed to fetch assignments: {response.status_code}")
+                logger.warning(f"Failed to fetch assignments: {status}")
                 return []
                 
         except Exception as e:
             logger.error(f"Error fetching assignments: {e}")
             return []
     
-    async def get_sessions(self, assignment_id: str, user_token: str) -> List[Dict]:
-        """Get sessions for an assignment"""
+    async def get_sessions(self, assignment_id: str, user_token: str,
+                           limit: Optional[int] = None, cursor: Optional[str] = None) -> Tuple[List[Session], Optional[str]]:
+        """Get sessions for an assignment, newest first.
+
+        With a limit only one page is fetched; the returned cursor is passed
+        back to fetch the next page and is None once the history is exhausted.
+        """
         try:
-            logger.info(f"Fetching sessions for assignment: {assignment_id}")
+            logger.info(f"Fetching sessions for assignment: {assignment_id} (limit={limit}, cursor={cursor})")
             headers = {
                 "Authorization": f"Bearer {user_token}",
                 "Content-Type": "application/json"
             }
             
-            response = await self._make_request_with_retry(
-                "GET",
-                f"{EXISTING_BACKEND_URL}/api/teachers/sessions/{assignment_id}",
-                headers=headers
-            )
+            params = {}
+            if limit is not None:
+                params["limit"] = limit
+                if cursor:
+                    params["cursor"] = cursor
             
-            if response is None:
+            # A limit gets a page ({sessions, nextCursor}), no limit the whole list
+            target = List[Session] if limit is None else SessionPage
+            status, data = await direct_reader.read(
+                "sessions", assignment_id, user_token, limit, cursor
+            ) if direct_reader else (None, None)
+            if status == 200:
+                data = convert(data, target)
+            elif status is None:
+                status, data = await self._conditional_get(
+                    f"{EXISTING_BACKEND_URL}/api/teachers/sessions/{assignment_id}",
+                    headers,
+                    params,
+                    target=target
+                )
+            
+            if status is None:
                 logger.error("Failed to get sessions response")
-                return []
+                return [], None
                 
-            if response.status_code == 200:
-                sessions = response.json()
+            if status == 200:
+                sessions, next_cursor = (data, None) if limit is None else (data.sessions, data.nextCursor)
                 logger.info(f"Retrieved {len(sessions)} sessions")
-                return sessions if isinstance(sessions, list) else []
+                return sessions, next_cursor
             else:
-                logger.warning(f"Failed to fetch sessions: {response.status_code}")
-                return []
+                logger.warning(f"Failed to fetch sessions: {status}")
+                return [], None
                 
         except Exception as e:
             logger.error(f"Error fetching sessions: {e}")
-            return []
+            return [], None
     
-    async def create_session(self, assignment_id: str, user_token: str, topic: str) -> Optional[Dict]:
+    async def create_session(self, assignment_id: str, user_token: str, topic: str) -> Optional[Session]:
         """Create a new session"""
         try:
             logger.info(f"Creating new session for assignment: {assignment_id}")
@@ -266,8 +412,9 @@ class AttendanceService:
                 return None
                 
             if response.status_code in [200, 201]:
-                session = response.json()
-                logger.info(f"Created session with ID: {session.get('id')}")
+                session = decode(response.content, Session)
+                logger.info(f"Created session with ID: {session.id}")
+                attendance_analytics.on_session_created(assignment_id, session.id)
                 return session
             else:
                 logger.warning(f"Failed to create session: {response.status_code}")
@@ -277,8 +424,8 @@ class AttendanceService:
             logger.error(f"Error creating session: {e}")
             return None
     
-    async def get_session_attendance(self, session_id: str, user_token: str) -> List[Dict]:
-        """Get attendance records for a session"""
+    async def get_session_attendance(self, session_id: str, user_token: str) -> Tuple[List[AttendanceRecord], Optional[str]]:
+        """Get a session's roster as attendance records, and the cursor for delta syncs"""
         try:
             logger.info(f"Fetching attendance for session: {session_id}")
             headers = {
@@ -286,27 +433,64 @@ class AttendanceService:
                 "Content-Type": "application/json"
             }
             
+            status, roster = await direct_reader.read("roster", session_id, user_token) if direct_reader else (None, None)
+            if status == 200:
+                roster = roster_from_body(roster, session_id)
+            elif status is None:
+                # The cache keeps the body; each caller gets records of its own built from it
+                status, roster = await self._conditional_get(
+                    f"{EXISTING_BACKEND_URL}/api/teachers/sessions/{session_id}/attendance",
+                    headers,
+                    {"format": "roster"},
+                    copy_value=lambda body: roster_from_body(body, session_id)
+                )
+            
+            if status is None:
+                logger.error("Failed to get attendance response")
+                return [], None
+                
+            if status == 200:
+                logger.info(f"Retrieved {len(roster[0])} attendance records")
+                return roster
+            else:
+                logger.warning(f"Failed to fetch attendance: {status}")
+                return [], None
+                
+        except Exception as e:
+            logger.error(f"Error fetching attendance: {e}")
+            return [], None
+    
+    async def get_attendance_changes(self, session_id: str, user_token: str, since: str) -> Optional[AttendanceChanges]:
+        """Get the session's attendance records marked since a markedAt cursor, with the latest markedAt as cursor.
+
+        Returns None on failure.
+        """
+        try:
+            headers = {
+                "Authorization": f"Bearer {user_token}",
+                "Content-Type": "application/json"
+            }
+            
             response = await self._make_request_with_retry(
                 "GET",
                 f"{EXISTING_BACKEND_URL}/api/teachers/sessions/{session_id}/attendance",
-                headers=headers
+                headers=headers,
+                params={"since": since}
             )
             
             if response is None:
-                logger.error("Failed to get attendance response")
-                return []
+                logger.error("Failed to get attendance changes response")
+                return None
                 
             if response.status_code == 200:
-                attendance = response.json()
-                logger.info(f"Retrieved {len(attendance)} attendance records")
-                return attendance if isinstance(attendance, list) else []
+                return decode(response.content, AttendanceChanges)
             else:
-                logger.warning(f"Failed to fetch attendance: {response.status_code}")
-                return []
+                logger.warning(f"Failed to fetch attendance changes: {response.status_code}")
+                return None
                 
         except Exception as e:
-            logger.error(f"Error fetching attendance: {e}")
-            return []
+            logger.error(f"Error fetching attendance changes: {e}")
+            return None
     
     async def mark_attendance_batch(self, session_id: str, attendance_records: List[Dict], user_token: str) -> bool:
         """Mark attendance for multiple students using batch update"""
@@ -333,6 +517,10 @@ class AttendanceService:
             success = response.status_code == 200
             if success:
                 logger.info("Attendance marked successfully")
+                attendance_analytics.on_attendance_marked(session_id, attendance_records)
+                student_attendance_cache.invalidate(record['studentId'] for record in attendance_records)
+                if attendance_archive:
+                    await asyncio.to_thread(attendance_archive.apply_marks, session_id, attendance_records)
             else:
                 logger.warning(f"Failed to mark attendance: {response.status_code}")
             
@@ -342,15 +530,248 @@ class AttendanceService:
             logger.error(f"Error marking attendance: {e}")
             return False
     
+    async def get_student_attendance_overview(self, user_token: str) -> Optional[List[Dict]]:
+        """Get the logged in student's attendance overview across active enrollments"""
+        try:
+            logger.info("Fetching student attendance overview")
+            headers = {
+                "Authorization": f"Bearer {user_token}",
+                "Content-Type": "application/json"
+            }
+            
+            response = await self._make_request_with_retry(
+                "GET",
+                f"{EXISTING_BACKEND_URL}/api/students/attendance-overview",
+                headers=headers
+            )
+            
+            if response is None:
+                logger.error("Failed to get attendance overview response")
+                return None
+                
+            if response.status_code == 200:
+                overview = decode(response.content)
+                return overview if isinstance(overview, list) else None
+            else:
+                logger.warning(f"Failed to fetch attendance overview: {response.status_code}")
+                return None
+                
+        except Exception as e:
+            logger.error(f"Error fetching attendance overview: {e}")
+            return None
+    
+    async def get_assignment_attendance(self, assignment_id: str, user_token: str,
+                                        limit: Optional[int] = None, cursor: Optional[str] = None) -> Optional[AssignmentAttendance]:
+        """Get the attendance history (sessions, students, records) for an assignment.
+
+        With a limit only one page of students (and their records) is fetched;
+        pass the returned nextCursor back to fetch the next page.
+        """
+        try:
+            logger.info(f"Fetching attendance history for assignment: {assignment_id} (limit={limit}, cursor={cursor})")
+            headers = {
+                "Authorization": f"Bearer {user_token}",
+                "Content-Type": "application/json"
+            }
+            
+            params = {}
+            if limit is not None:
+                params["limit"] = limit
+                if cursor:
+                    params["cursor"] = cursor
+            
+            response = await self._make_request_with_retry(
+                "GET",
+                f"{EXISTING_BACKEND_URL}/api/teachers/assignments/{assignment_id}/attendance",
+                headers=headers,
+                params=params
+            )
+            
+            if response is None:
+                logger.error("Failed to get attendance history response")
+                return None
+                
+            if response.status_code == 200:
+                return decode(response.content, AssignmentAttendance)
+            else:
+                logger.warning(f"Failed to fetch attendance history: {response.status_code}")
+                return None
+                
+        except Exception as e:
+            logger.error(f"Error fetching attendance history: {e}")
+            return None
+    
+    async def get_attendance_matrix(self, assignment_id: str, user_token: str) -> Optional[AttendanceMatrix]:
+        """Get the analytics matrix for an assignment, loading it on first use"""
+        matrix = attendance_analytics.get(assignment_id, user_token)
+        if matrix is not None:
+            return matrix
+        
+        history = await self.get_assignment_attendance(assignment_id, user_token)
+        if history is None:
+            return None
+        if attendance_archive:
+            await asyncio.to_thread(attendance_archive.ingest_history, assignment_id, history)
+        return attendance_analytics.load(assignment_id, history, user_token)
+    
+    async def create_user(self, user_data: Dict, user_token: str) -> Dict:
+        """Create a user through the admin API.
+
+        Returns {"status": "created" | "exists" | "failed" | "unreachable", "user": ..., "error": ...}
+        so bulk callers can tell duplicates and outages apart from real failures.
+        """
+        try:
+            headers = {
+                "Authorization": f"Bearer {user_token}",
+                "Content-Type": "application/json"
+            }
+            
+            response = await self._make_request_with_retry(
+                "POST",
+                f"{EXISTING_BACKEND_URL}/api/admin/users",
+                headers=headers,
+                json=user_data
+            )
+            
+            if response is None:
+                return {"status": "unreachable", "user": None, "error": "No response from backend"}
+            
+            if response.status_code == 201:
+                return {"status": "created", "user": decode(response.content), "error": None}
+            
+            try:
+                message = decode(response.content).get("message", "")
+            except Exception:
+                message = response.text
+            
+            if response.status_code == 400 and "already exists" in message:
+                return {"status": "exists", "user": None, "error": message}
+            
+            logger.warning(f"Failed to create user {user_data.get('email')}: {response.status_code}")
+            return {"status": "failed", "user": None, "error": f"{response.status_code}: {message}"}
+            
+        except Exception as e:
+            logger.error(f"Error creating user: {e}")
+            return {"status": "failed", "user": None, "error": str(e)}
+    
+    async def get_users(self, user_token: str, role: Optional[str] = None) -> Optional[List[Dict]]:
+        """List users through the admin API, optionally filtered by role"""
+        try:
+            headers = {
+                "Authorization": f"Bearer {user_token}",
+                "Content-Type": "application/json"
+            }
+            
+            response = await self._make_request_with_retry(
+                "GET",
+                f"{EXISTING_BACKEND_URL}/api/admin/users",
+                headers=headers,
+                params={"role": role} if role else {}
+            )
+            
+            if response is None:
+                logger.error("Failed to get users response")
+                return None
+            
+            if response.status_code == 200:
+                users = decode(response.content)
+                return users if isinstance(users, list) else None
+            else:
+                logger.warning(f"Failed to fetch users: {response.status_code}")
+                return None
+            
+        except Exception as e:
+            logger.error(f"Error fetching users: {e}")
+            return None
+    
+    async def enroll_students_batch(self, student_ids: List[str], course_ids: List[str], semester: int,
+                                    academic_year: str, user_token: str) -> bool:
+        """Enroll students in courses for a semester through the admin API"""
+        try:
+            headers = {
+                "Authorization": f"Bearer {user_token}",
+                "Content-Type": "application/json"
+            }
+            
+            payload = {
+                "studentIds": student_ids,
+                "courseIds": course_ids,
+                "semester": semester,
+                "academicYear": academic_year
+            }
+            
+            response = await self._make_request_with_retry(
+                "POST",
+                f"{EXISTING_BACKEND_URL}/api/admin/enrollments/batch",
+                headers=headers,
+                json=payload
+            )
+            
+            if response is None:
+                logger.error("Failed to enroll students")
+                return False
+            
+            success = response.status_code == 201
+            if not success:
+                logger.warning(f"Failed to enroll students: {response.status_code}")
+            return success
+            
+        except Exception as e:
+            logger.error(f"Error enrolling students: {e}")
+            return False
+    
+    def register_page_fetcher(self, assignment_id: str, user_token: str,
+                              page_size: int = EXPORT_PAGE_SIZE) -> FetchPage:
+        """Page fetcher over an assignment's attendance history, for register exports"""
+        async def fetch_page(cursor: Optional[str]) -> Optional[AssignmentAttendance]:
+            return await self.get_assignment_attendance(assignment_id, user_token, limit=page_size, cursor=cursor)
+        return fetch_page
+    
     async def close(self):
         """Close HTTP client"""
         await self.http_client.aclose()
 
 attendance_service = AttendanceService()
 
+# Active student self check-in codes, and the batcher that writes their check-ins
+checkin_registry = CheckInRegistry()
+checkin_coalescer = CheckInCoalescer(attendance_service)
+
+# Per-phone token buckets, checked before a message reaches process_message
+rate_limiter = create_rate_limiter()
+
+# Phone -> token bindings that survive SESSION_TIMEOUT
+login_bindings = LoginBindings()
+
+def new_user_session() -> Dict:
+    """A fresh, logged-out conversation session"""
+    return {
+        "state": UserState.UNAUTHENTICATED,
+        "user_token": None,
+        "user_info": None,
+        "current_assignment": None,
+        "current_session": None,
+        "assignments": [],
+        "sessions": [],
+        "sessions_offset": 0,
+        "sessions_cursor": None,
+        "pending_topic": None,
+        "attendance_records": [],
+        "roster_index": None,
+        "roster_lines": {},
+        "roster": None,
+        "roster_hold": None,
+        "name_index": None,
+        "attendance_synced_at": None,
+        # When this process opened the session (see ShardNode.accept_handoff)
+        "created_at": datetime.now().timestamp(),
+        "last_activity": datetime.now()
+    }
+
 class WhatsAppBot:
     def __init__(self):
         self.twilio_client = None
+        self.background_tasks = set()
         if TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN:
             try:
                 from twilio.rest import Client
@@ -359,23 +780,26 @@ class WhatsAppBot:
             except Exception as e:
                 logger.error(f"Failed to initialize Twilio client: {e}")
     
-    async def send_message(self, to: str, message: str):
-        """Send WhatsApp message via Twilio"""
+    async def send_message(self, to: str, message: Union[str, List[str]]):
+        """Send WhatsApp message via Twilio, one message per part"""
         if not self.twilio_client:
             logger.warning("Twilio client not configured")
             return
         
+        parts = [message] if isinstance(message, str) else message
+        
         try:
-            # Truncate long messages
-            if len(message) > 1600:
-                message = message[:1597] + "..."
-            
-            twilio_message = self.twilio_client.messages.create(
-                body=message,
-                from_=TWILIO_WHATSAPP_NUMBER,
-                to=to
-            )
-            logger.info(f"Message sent: {twilio_message.sid}")
+            for part in parts:
+                # Truncate long messages
+                if len(part) > WHATSAPP_MESSAGE_LIMIT:
+                    part = part[:WHATSAPP_MESSAGE_LIMIT - 3] + "..."
+                
+                twilio_message = self.twilio_client.messages.create(
+                    body=part,
+                    from_=TWILIO_WHATSAPP_NUMBER,
+                    to=to
+                )
+                logger.info(f"Message sent: {twilio_message.sid}")
         except Exception as e:
             logger.error(f"Error sending message: {e}")
     
@@ -399,20 +823,7 @@ class WhatsAppBot:
         self.cleanup_expired_sessions()
         
         if phone_number not in user_sessions:
-            user_sessions[phone_number] = {
-                "state": UserState.UNAUTHENTICATED,
-                "user_token": None,
-                "user_info": None,
-                "current_assignment": None,
-                "current_session": None,
-                "assignments": [],
-                "sessions": [],
-                "pending_topic": None,
-                "attendance_records": [],
-                "last_activity": datetime.now(),
-                "login_attempts": 0,
-                "last_login_attempt": None
-            }
+            user_sessions[phone_number] = new_user_session()
         else:
             # Update last activity
             user_sessions[phone_number]["last_activity"] = datetime.now()
@@ -443,24 +854,9 @@ class WhatsAppBot:
         except Exception:
             return None
     
+    @tracer.traced()
     async def handle_authentication(self, phone_number: str, message: str) -> str:
-        """Handle user authentication with rate limiting"""
-        session = self.get_user_session(phone_number)
-        
-        # Rate limiting
-        current_time = datetime.now()
-        last_attempt = session.get("last_login_attempt")
-        
-        if last_attempt and current_time - last_attempt < timedelta(seconds=5):
-            return "⏰ Please wait a moment before trying again."
-        
-        if session.get("login_attempts", 0) >= 5:
-            if last_attempt and current_time - last_attempt < timedelta(minutes=15):
-                return "🔒 Too many failed attempts. Please wait 15 minutes before trying again."
-            else:
-                # Reset attempts after 15 minutes
-                session["login_attempts"] = 0
-        
+        """Handle user authentication (login attempts are rate limited per phone by rate_limiter)"""
         if message.lower().startswith('login'):
             credentials = self.parse_login_credentials(message)
             
@@ -469,36 +865,35 @@ class WhatsAppBot:
             
             email, password = credentials
             
-            # Update attempt tracking
-            session["login_attempts"] = session.get("login_attempts", 0) + 1
-            session["last_login_attempt"] = current_time
-            
-            logger.info(f"Login attempt {session['login_attempts']} for {email} from {phone_number}")
+            logger.info(f"Login attempt for {email} from {phone_number}")
             
             auth_result = await attendance_service.authenticate_user(email, password)
             
-            if auth_result and auth_result.get("user", {}).get("role", "").upper() == "TEACHER":
-                # Reset failed attempts on success
-                session["login_attempts"] = 0
-                
+            role = (auth_result or {}).get("user", {}).get("role", "").upper()
+            
+            if auth_result and role in ALLOWED_ROLES:
                 self.update_user_session(phone_number, {
-                    "state": UserState.AUTHENTICATED,
+                    "state": UserState.STUDENT if role == "STUDENT" else UserState.AUTHENTICATED,
                     "user_token": auth_result.get("token"),
                     "user_info": auth_result.get("user")
                 })
+                login_bindings.bind(phone_number, auth_result.get("token"), auth_result.get("user"))
                 
                 user = auth_result.get("user", {})
                 first_name = user.get('firstName', '')
                 last_name = user.get('lastName', '')
-                name = f"{first_name} {last_name}".strip() or "Teacher"
+                name = f"{first_name} {last_name}".strip() or role.title()
+                
+                if role == "STUDENT":
+                    return f"✅ Welcome {name}!\n🎉 Authentication successful!\n\n📊 Type 'attendance' to view your attendance.\n💡 Type 'help' for available commands."
                 
                 return f"✅ Welcome {name}!\n🎉 Authentication successful!\n\n📚 Type 'assignments' to view your teaching assignments.\n💡 Type 'help' for available commands."
             else:
-                attempts_left = 5 - session.get("login_attempts", 0)
+                attempts_left = await rate_limiter.remaining(phone_number, "login")
                 if attempts_left > 0:
-                    return f"❌ Authentication failed or you don't have teacher privileges.\n🔍 Please check your credentials and try again.\n⚠️ {attempts_left} attempts remaining.\n\n📝 Format: login <email> <password>"
+                    return f"❌ Authentication failed or your account can't use this bot.\n🔍 Please check your credentials and try again.\n⚠️ {attempts_left} attempts remaining.\n\n📝 Format: login <email> <password>"
                 else:
-                    return "🔒 Too many failed attempts. Please wait 15 minutes before trying again."
+                    return "🔒 Too many failed attempts. Please wait a few minutes before trying again."
         else:
             return """👋 Welcome to the Attendance Bot!
 
@@ -509,7 +904,8 @@ login <email> <password>
 
 ❓ Type 'help' for more information."""
     
-    async def handle_assignments(self, phone_number: str) -> str:
+    @tracer.traced()
+    async def handle_assignments(self, phone_number: str) -> Union[str, List[str]]:
         """Handle teaching assignments display"""
         session = self.get_user_session(phone_number)
         
@@ -524,23 +920,24 @@ login <email> <password>
                 "state": UserState.SELECTING_ASSIGNMENT
             })
             
-            message = "📚 Your Teaching Assignments:\n\n"
+            builder = MessageBuilder()
+            builder.add("📚 Your Teaching Assignments:")
+            builder.add()
             for i, assignment in enumerate(assignments, 1):
-                course_name = assignment.get('course', {}).get('name', 'Unknown Course')
-                branch_name = assignment.get('branch', {}).get('name', 'Unknown Branch')
-                semester = assignment.get('semester', 'N/A')
-                section = assignment.get('section', 'N/A')
+                course_name = assignment.course.get('name', 'Unknown Course')
+                branch_name = assignment.branch.get('name', 'Unknown Branch')
                 
-                message += f"{i}. 📖 {course_name}\n"
-                message += f"   📍 {branch_name} | Sem {semester} | Sec {section}\n\n"
+                builder.add(f"{i}. 📖 {course_name}\n   📍 {branch_name} | Sem {assignment.semester} | Sec {assignment.section}")
+                builder.add()
             
-            message += f"📝 Reply with assignment number (1-{len(assignments)}) to select:"
-            return message
+            builder.add(f"📝 Reply with assignment number (1-{len(assignments)}) to select:")
+            return builder.build()
             
         except Exception as e:
             logger.error(f"Error handling assignments: {e}")
             return "❌ Error retrieving assignments. Please try again later."
     
+    @tracer.traced()
     async def handle_assignment_selection(self, phone_number: str, message: str) -> str:
         """Handle assignment selection"""
         session = self.get_user_session(phone_number)
@@ -559,27 +956,24 @@ login <email> <password>
                     "state": UserState.SELECTING_SESSION
                 })
                 
-                sessions = await attendance_service.get_sessions(selected_assignment['id'], session["user_token"])
-                self.update_user_session(phone_number, {"sessions": sessions})
+                sessions = await self.load_sessions_page(phone_number, session)
                 
-                course_name = selected_assignment.get('course', {}).get('name', 'Unknown Course')
-                branch_name = selected_assignment.get('branch', {}).get('name', 'Unknown Branch')
-                semester = selected_assignment.get('semester', 'N/A')
-                section = selected_assignment.get('section', 'N/A')
+                course_name = selected_assignment.course.get('name', 'Unknown Course')
+                branch_name = selected_assignment.branch.get('name', 'Unknown Branch')
                 
-                response = f"✅ Selected Assignment:\n📖 {course_name}\n📍 {branch_name} | Sem {semester} | Sec {section}\n\n"
+                response = (f"✅ Selected Assignment:\n📖 {course_name}\n"
+                            f"📍 {branch_name} | Sem {selected_assignment.semester} | Sec {selected_assignment.section}\n\n")
                 
                 if sessions:
                     response += "📅 Recent Sessions:\n"
-                    for i, sess in enumerate(sessions[:5], 1):  # Show only last 5 sessions
-                        date_str = sess.get('date', '').split('T')[0]
-                        topic = sess.get('topic', 'No topic')
-                        response += f"{i}. {date_str} - {topic}\n"
+                    response += self.format_sessions_page(sessions, 0)
                     
                     response += f"\n🎯 Options:\n"
                     response += f"• 'new' - Create new session\n"
-                    response += f"• 1-{min(len(sessions), 5)} - Select existing session\n"
-                    response += f"• 'all' - View all sessions"
+                    response += f"• 1-{len(sessions)} - Select existing session\n"
+                    if session.get("sessions_cursor"):
+                        response += f"• 'more' - View older sessions\n"
+                    response += f"• 'all' - Browse all sessions"
                 else:
                     response += "📭 No previous sessions found.\n\n💡 Reply 'new' to create a new session."
                 
@@ -593,6 +987,32 @@ login <email> <password>
             logger.error(f"Error handling assignment selection: {e}")
             return "❌ Error processing selection. Please try again."
     
+    async def load_sessions_page(self, phone_number: str, session: Dict,
+                                 cursor: Optional[str] = None, offset: int = 0) -> List[Session]:
+        """Fetch one page of sessions for the current assignment into the user session"""
+        sessions, next_cursor = await attendance_service.get_sessions(
+            session["current_assignment"].id,
+            session["user_token"],
+            limit=SESSIONS_PAGE_SIZE,
+            cursor=cursor
+        )
+        
+        # Only the current page is kept; older pages are re-fetched on demand
+        self.update_user_session(phone_number, {
+            "sessions": sessions,
+            "sessions_offset": offset,
+            "sessions_cursor": next_cursor
+        })
+        return sessions
+    
+    def format_sessions_page(self, sessions: List[Session], offset: int) -> str:
+        """Format a page of sessions as numbered lines"""
+        lines = []
+        for i, sess in enumerate(sessions, offset + 1):
+            lines.append(f"{i}. {sess.date.split('T')[0]} - {sess.topic or 'No topic'}\n")
+        return "".join(lines)
+    
+    @tracer.traced()
     async def handle_session_selection(self, phone_number: str, message: str) -> str:
         """Handle session selection or creation"""
         session = self.get_user_session(phone_number)
@@ -606,20 +1026,33 @@ login <email> <password>
                 })
                 return "📝 Enter topic for the new session:\n\n💡 Example: Introduction to Data Structures"
             
-            if message_lower == 'all':
+            if message_lower in ('all', 'more'):
+                if message_lower == 'all':
+                    # Restart browsing from the most recent page
+                    sessions = await self.load_sessions_page(phone_number, session)
+                elif session.get("sessions_cursor"):
+                    sessions = await self.load_sessions_page(
+                        phone_number, session,
+                        cursor=session["sessions_cursor"],
+                        offset=session.get("sessions_offset", 0) + len(sessions)
+                    )
+                else:
+                    return "📭 No older sessions.\n\n💡 Reply 'all' to start from the most recent, or 'new' to create new session."
+                
                 if sessions:
-                    response = "📅 All Sessions:\n\n"
-                    for i, sess in enumerate(sessions, 1):
-                        date_str = sess.get('date', '').split('T')[0]
-                        topic = sess.get('topic', 'No topic')
-                        response += f"{i}. {date_str} - {topic}\n"
-                    response += f"\n📝 Reply with session number (1-{len(sessions)}) to select or 'new' to create new:"
+                    offset = session.get("sessions_offset", 0)
+                    response = f"📅 Sessions {offset + 1}-{offset + len(sessions)}:\n\n"
+                    response += self.format_sessions_page(sessions, offset)
+                    response += f"\n📝 Reply with session number ({offset + 1}-{offset + len(sessions)}) to select or 'new' to create new"
+                    if session.get("sessions_cursor"):
+                        response += "\n➡️ Reply 'more' for older sessions"
                     return response
                 else:
                     return "📭 No sessions found.\n\n💡 Reply 'new' to create new session."
             
-            # Try to parse as session number
-            selection = int(message_lower) - 1
+            # Try to parse as session number (numbering continues across pages)
+            offset = session.get("sessions_offset", 0)
+            selection = int(message_lower) - 1 - offset
             if 0 <= selection < len(sessions):
                 selected_session = sessions[selection]
                 self.update_user_session(phone_number, {
@@ -628,36 +1061,40 @@ login <email> <password>
                 })
                 
                 # Get current attendance for this session
-                attendance_records = await attendance_service.get_session_attendance(
-                    selected_session['id'], session["user_token"]
+                attendance_records, synced_at = await attendance_service.get_session_attendance(
+                    selected_session.id, session["user_token"]
                 )
                 self.update_user_session(phone_number, {
-                    "attendance_records": attendance_records
+                    "attendance_records": attendance_records,
+                    "attendance_synced_at": synced_at,
+                    **self.share_roster(session, attendance_records)
                 })
-                
-                date_str = selected_session.get('date', '').split('T')[0]
-                topic = selected_session.get('topic', 'No topic')
+                if attendance_archive:
+                    await asyncio.to_thread(attendance_archive.ingest_session, session["current_assignment"].id, selected_session, attendance_records)
                 
                 # Show current attendance status
-                present_count = sum(1 for record in attendance_records if record.get('present'))
+                present_count = sum(1 for record in attendance_records if record.present)
                 total_count = len(attendance_records)
                 
-                response = f"📅 Selected Session:\n🗓️ {date_str}\n📚 {topic}\n\n"
+                response = f"📅 Selected Session:\n🗓️ {selected_session.date.split('T')[0]}\n📚 {selected_session.topic or 'No topic'}\n\n"
                 response += f"👥 Current Status: {present_count}/{total_count} present\n\n"
                 response += "📝 Mark attendance by sending roll numbers:\n"
-                response += "💡 Examples:\n• 101, 102, 103\n• 101 102 103\n\n"
+                response += "💡 Examples:\n• 101, 102, 103\n• 101 102 103\n• absent 104 117 (everyone else present)\n\n"
                 response += "🎯 Commands:\n• 'status' - Check current attendance\n• 'done' - Finish session"
                 
                 return response
+            elif sessions:
+                return f"❌ Invalid selection. Please choose {offset + 1}-{offset + len(sessions)}, 'new', 'more', or 'all'"
             else:
-                return f"❌ Invalid selection. Please choose 1-{len(sessions)}, 'new', or 'all'"
+                return "❌ No sessions to select. Reply 'new' to create a session or 'all' to list sessions."
                 
         except ValueError:
-            return "❌ Please enter a valid number, 'new', or 'all'."
+            return "❌ Please enter a valid number, 'new', 'more', or 'all'."
         except Exception as e:
             logger.error(f"Error handling session selection: {e}")
             return "❌ Error processing selection. Please try again."
     
+    @tracer.traced()
     async def handle_topic_input(self, phone_number: str, message: str) -> str:
         """Handle topic input for new session"""
         session = self.get_user_session(phone_number)
@@ -672,21 +1109,28 @@ login <email> <password>
         try:
             # Create new session with topic
             new_session = await attendance_service.create_session(
-                session["current_assignment"]['id'], 
+                session["current_assignment"].id, 
                 session["user_token"],
                 topic
             )
             
             if new_session:
                 # Get attendance records for the new session
-                attendance_records = await attendance_service.get_session_attendance(
-                    new_session['id'], session["user_token"]
+                attendance_records, synced_at = await attendance_service.get_session_attendance(
+                    new_session.id, session["user_token"]
                 )
                 
+                # A new session changes every enrolled student's totals
+                student_attendance_cache.invalidate(record.studentId for record in attendance_records)
+                if attendance_archive:
+                    await asyncio.to_thread(attendance_archive.ingest_session, session["current_assignment"].id, new_session, attendance_records)
+                
                 self.update_user_session(phone_number, {
                     "current_session": new_session,
                     "state": UserState.MARKING_ATTENDANCE,
-                    "attendance_records": attendance_records
+                    "attendance_records": attendance_records,
+                    "attendance_synced_at": synced_at,
+                    **self.share_roster(session, attendance_records)
                 })
                 
                 total_students = len(attendance_records)
@@ -694,7 +1138,8 @@ login <email> <password>
                 response += f"📚 Topic: {topic}\n"
                 response += f"👥 {total_students} students enrolled\n\n"
                 response += f"📝 Ready to mark attendance!\n"
-                response += f"💡 Send roll numbers: 101, 102, 103\n\n"
+                response += f"💡 Send roll numbers: 101, 102, 103\n"
+                response += f"💡 Or mark absentees only: absent 104 117\n\n"
                 response += f"🎯 Commands:\n• 'status' - Check attendance\n• 'done' - Finish session"
                 
                 return response
@@ -722,29 +1167,351 @@ login <email> <password>
                 roll_numbers.append(part.upper())
         
         return roll_numbers
-    
-    async def handle_attendance_marking(self, phone_number: str, message: str) -> str:
+
+    def share_roster(self, session: Dict, attendance_records: List[AttendanceRecord]) -> Dict:
+        """Session updates for a freshly fetched roster, its student details shared with other conversations"""
+        key = class_section_key(session.get("current_assignment"))
+        if key is None:
+            return {"roster": None, "roster_hold": None, "roster_index": None, "roster_lines": {}, "name_index": None}
+        roster = roster_cache.share(key, attendance_records)
+        return {"roster": roster, "roster_hold": roster_cache.hold(roster), "roster_index": None,
+                "roster_lines": roster.lines, "name_index": None}
+
+    def get_roster_index(self, session: Dict) -> Dict[str, AttendanceRecord]:
+        """Get roll number -> attendance record index for the cached roster.
+
+        Built on first use; whatever replaces or extends attendance_records
+        resets roster_index to None.
+        """
+        attendance_records = session.get("attendance_records", [])
+        roster_index = session.get("roster_index")
+
+        if roster_index is None:
+            roster_index = {}
+            for record in attendance_records:
+                roll_number = (record.student or {}).get('rollNumber')
+                if roll_number:
+                    roster_index[roll_number.upper()] = record
+            session["roster_index"] = roster_index
+
+        return roster_index
+
+    def get_roster_lines(self, session: Dict) -> Dict[str, str]:
+        """Get studentId -> display line cache for the cached roster"""
+        attendance_records = session.get("attendance_records", [])
+        roster_lines = session.get("roster_lines")
+
+        # A shared roster's lines may also hold students of other sessions of the class section
+        if not roster_lines or len(roster_lines) < len(attendance_records):
+            roster_lines = build_roster_lines(attendance_records)
+            session["roster_lines"] = roster_lines
+
+        return roster_lines
+
+    def get_name_index(self, session: Dict) -> NameIndex:
+        """Get the student name index for the cached roster.
+
+        Built once per shared class section roster; a roster restored from a
+        snapshot without one gets an index of its own.
+        """
+        roster = session.get("roster")
+        if roster is not None:
+            if roster.name_index is None:
+                roster.name_index = NameIndex({"studentId": student_id, "student": student}
+                                              for student_id, student in roster.students.items())
+            return roster.name_index
+
+        attendance_records = session.get("attendance_records", [])
+        name_index = session.get("name_index")
+        if name_index is None:
+            name_index = NameIndex({"studentId": record.studentId, "student": record.student}
+                                   for record in attendance_records)
+            session["name_index"] = name_index
+        return name_index
+
+    async def reload_attendance(self, session: Dict):
+        """Fetch the roster of a session restored from a snapshot, which leaves rosters out.
+
+        A roster that was never fetched has no delta cursor either; the fetch
+        revalidates through the ETag cache, so an unchanged roster costs a 304.
+        """
+        current_session = session.get("current_session")
+        if not current_session or session.get("attendance_records") or session.get("attendance_synced_at"):
+            return
+
+        attendance_records, synced_at = await attendance_service.get_session_attendance(
+            current_session.id, session["user_token"]
+        )
+        session.update({
+            "attendance_records": attendance_records,
+            "attendance_synced_at": synced_at,
+            **self.share_roster(session, attendance_records)
+        })
+
+    async def sync_attendance(self, session: Dict) -> int:
+        """Apply records changed elsewhere (co-teachers, the dashboard) to the cached roster.
+
+        Only the records marked since the last sync are fetched. Returns how
+        many cached records changed; on failure the cached roster is kept.
+        """
+        since = session.get("attendance_synced_at")
+        current_session = session.get("current_session")
+        if not since or not current_session:
+            return 0
+
+        changes = await attendance_service.get_attendance_changes(current_session.id, session["user_token"], since)
+        if changes is None:
+            return 0
+
+        attendance_records = session["attendance_records"]
+        by_student = {record.studentId: record for record in attendance_records}
+        changed = []
+        added = []
+        for change in changes.records:
+            record = by_student.get(change.studentId)
+            if record is None:
+                # Enrolled after the roster was fetched; the roster lines rebuild on length change
+                attendance_records.append(change)
+                changed.append(change)
+                added.append(change)
+                continue
+            record.markedAt = change.markedAt
+            if record.present != change.present:
+                record.present = change.present
+                changed.append(record)
+
+        session["attendance_synced_at"] = changes.cursor or since
+        if added:
+            session["roster_index"] = None
+            session["name_index"] = None
+            if session.get("roster") is not None:
+                roster_cache.share(session["roster"].key, added)
+        if changed:
+            marks = marks_of(changed)
+            attendance_analytics.on_attendance_marked(current_session.id, marks)
+            student_attendance_cache.invalidate(record.studentId for record in changed)
+            if attendance_archive:
+                await asyncio.to_thread(attendance_archive.apply_marks, current_session.id, marks)
+        return len(changed)
+
+    async def handle_absentee_marking(self, session: Dict, message: str) -> Union[str, List[str]]:
+        """Mark the whole roster present except the listed roll numbers"""
+        # Drop the leading 'absent' keyword before parsing roll numbers
+        roll_numbers = self.parse_roll_numbers(message.strip()[len('absent'):])
+
+        if not roll_numbers:
+            return "❌ No absentee roll numbers found.\n\n📝 Send the roll numbers of absent students:\n💡 Example: absent 104, 117\n\n✅ Everyone else will be marked present."
+
+        attendance_records = session.get("attendance_records", [])
+        if not attendance_records:
+            return "❌ No attendance records found."
+
+        roster_index = self.get_roster_index(session)
+        requested = set(roll_numbers)
+        absent_rolls = requested & roster_index.keys()
+        not_found = sorted(requested - absent_rolls)
+
+        if not absent_rolls:
+            return f"❌ Roll numbers not found: {', '.join(not_found)}\n\n⚠️ No attendance was changed."
+
+        # Only send records whose state actually changes
+        updates = []
+        changed_records = []
+        for roll_number, record in roster_index.items():
+            present = roll_number not in absent_rolls
+            if record.present != present:
+                updates.append({
+                    "studentId": record.studentId,
+                    "present": present
+                })
+                changed_records.append((record, present))
+
+        if updates:
+            success = await attendance_service.mark_attendance_batch(
+                session["current_session"].id,
+                updates,
+                session["user_token"]
+            )
+
+            if not success:
+                return "❌ Failed to mark attendance. Please try again."
+
+            # Update local records only after the backend accepted the batch
+            for record, present in changed_records:
+                record.present = present
+
+        roster_lines = self.get_roster_lines(session)
+        absent_students = [
+            roster_lines.get(roster_index[roll_number].studentId, roll_number)
+            for roll_number in sorted(absent_rolls)
+        ]
+
+        present_count = len(roster_index) - len(absent_rolls)
+        total_count = len(roster_index)
+
+        builder = MessageBuilder()
+        builder.add(f"✅ Marked {present_count} present, {len(absent_rolls)} absent ({len(updates)} changed)")
+        builder.add()
+        builder.add(f"❌ Absent ({len(absent_students)}):")
+        builder.extend(absent_students[:10], prefix="• ")  # Limit to 10 to avoid long messages
+        if len(absent_students) > 10:
+            builder.add(f"... and {len(absent_students) - 10} more")
+
+        if not_found:
+            builder.add()
+            builder.add(f"⚠️ Roll numbers not found: {', '.join(not_found)}")
+
+        builder.add()
+        builder.add(f"📊 Total present: {present_count}/{total_count} ({(present_count/total_count*100):.1f}%)")
+        builder.add()
+        builder.add("💡 Send more roll numbers to adjust or type 'done' when finished.")
+
+        return builder.build()
+
+    async def handle_name_marking(self, session: Dict, message: str) -> Union[str, List[str]]:
+        """Mark the named students present, asking for roll numbers when a name fits several"""
+        # Drop the leading 'mark' keyword before splitting names
+        names = split_names(message.strip()[len('mark'):])
+
+        if not names:
+            return "❌ No student names found.\n\n📝 Send the names of present students:\n💡 Example: mark Rahul Sharma, Priya"
+
+        attendance_records = session.get("attendance_records", [])
+        if not attendance_records:
+            return "❌ No attendance records found."
+
+        name_index = self.get_name_index(session)
+        roster_index = self.get_roster_index(session)
+        roster_lines = self.get_roster_lines(session)
+        # A shared index spans every student seen in the class section (earlier years, dropped
+        # students); only this session's students may match
+        allowed = None
+        if session.get("roster") is not None:
+            allowed = name_index.mask({record.studentId for record in attendance_records})
+
+        def session_record(student_record: Dict) -> Optional[AttendanceRecord]:
+            roll_number = (student_record.get('student') or {}).get('rollNumber') or ''
+            return roster_index.get(roll_number.upper())
+
+        updates = []
+        marked_records = []
+        found_students = []
+        already_present = []
+        ambiguous = []
+        not_found = []
+
+        for name in dict.fromkeys(names):  # De-duplicate, keep order
+            match, candidates = name_index.resolve(name, allowed)
+            record = session_record(match) if match else None
+            if match is None and candidates:
+                records = [record for record in map(session_record, (c for _, c in candidates)) if record]
+                if len(records) > 1:
+                    ambiguous.append((name, records))
+                    continue
+                record = records[0] if records else None
+
+            if record is None:
+                not_found.append(name)
+            elif record.present or record in marked_records:
+                already_present.append(roster_lines.get(record.studentId, name))
+            else:
+                updates.append({
+                    "studentId": record.studentId,
+                    "present": True
+                })
+                marked_records.append(record)
+                found_students.append(roster_lines.get(record.studentId, name))
+
+        builder = MessageBuilder()
+
+        if updates:
+            success = await attendance_service.mark_attendance_batch(
+                session["current_session"].id,
+                updates,
+                session["user_token"]
+            )
+
+            if not success:
+                return "❌ Failed to mark attendance. Please try again."
+
+            # Update local records only after the backend accepted the batch
+            for record in marked_records:
+                record.present = True
+
+            builder.add(f"✅ Attendance marked for {len(updates)} students:")
+            builder.extend(found_students[:10], prefix="• ")  # Limit to 10 to avoid long messages
+            if len(found_students) > 10:
+                builder.add(f"... and {len(found_students) - 10} more")
+
+        if already_present:
+            builder.add()
+            builder.add(f"⚠️ Already present ({len(already_present)}):")
+            builder.extend(already_present[:5], prefix="• ")  # Limit to 5
+            if len(already_present) > 5:
+                builder.add(f"... and {len(already_present) - 5} more")
+
+        for name, records in ambiguous:
+            builder.add()
+            builder.add(f"❓ '{name}' matches several students, send the roll number:")
+            builder.extend((roster_lines.get(record.studentId) or format_student_line(record)
+                            for record in records), prefix="• ")
+
+        if not_found:
+            builder.add()
+            builder.add(f"❌ Names not found: {', '.join(not_found)}")
+
+        present_count = sum(1 for record in attendance_records if record.present)
+        total_count = len(attendance_records)
+        attendance_rate = (present_count / total_count * 100) if total_count else 0
+        builder.add()
+        builder.add(f"📊 Total present: {present_count}/{total_count} ({attendance_rate:.1f}%)")
+        builder.add()
+        builder.add("💡 Continue marking or type 'done' when finished.")
+
+        return builder.build()
+
+    @tracer.traced()
+    async def handle_attendance_marking(self, phone_number: str, message: str) -> Union[str, List[str]]:
         """Handle attendance marking"""
         session = self.get_user_session(phone_number)
         message_lower = message.lower().strip()
         
         try:
+            await self.reload_attendance(session)
+            
             if message_lower == 'status':
+                await self.sync_attendance(session)
                 return self.get_attendance_status(session)
-            
+
+            if message_lower.split(maxsplit=1)[0] == 'absent':
+                return await self.handle_absentee_marking(session, message)
+
+            if message_lower.split(maxsplit=1)[0] == 'mark':
+                return await self.handle_name_marking(session, message)
+
+            if message_lower in ('code', 'code off'):
+                return self.handle_checkin_code(phone_number, session, message_lower == 'code off')
+
             if message_lower == 'done':
-                present_count = sum(1 for record in session.get("attendance_records", []) if record.get('present'))
-                total_count = len(session.get("attendance_records", []))
+                checkin_registry.revoke(session["current_session"].id)
+                await self.sync_attendance(session)
+                attendance_records = session.get("attendance_records", [])
+                present_count = sum(1 for record in attendance_records if record.present)
+                total_count = len(attendance_records)
+                attendance_rate = (present_count / total_count * 100) if total_count else 0
                 
-                response = f"✅ Attendance session completed!\n\n"
-                response += f"📊 Final Summary:\n"
-                response += f"✅ Present: {present_count}/{total_count} students\n"
-                response += f"📈 Attendance Rate: {(present_count/total_count*100):.1f}%\n\n"
-                response += f"🎯 What's next?\n"
-                response += f"• 'assignments' - Start new session\n"
-                response += f"• 'help' - View commands"
+                builder = MessageBuilder()
+                builder.add("✅ Attendance session completed!")
+                builder.add()
+                builder.add("📊 Final Summary:")
+                builder.add(f"✅ Present: {present_count}/{total_count} students")
+                builder.add(f"📈 Attendance Rate: {attendance_rate:.1f}%")
+                builder.add()
+                builder.add("🎯 What's next?")
+                builder.add("• 'assignments' - Start new session")
+                builder.add("• 'help' - View commands")
                 
-                return response
+                return builder.build()
             
             # Parse roll numbers from message
             roll_numbers = self.parse_roll_numbers(message)
@@ -754,123 +1521,383 @@ login <email> <password>
             
             # Find students by roll numbers and mark them present
             attendance_records = session.get("attendance_records", [])
+            roster_index = self.get_roster_index(session)
+            roster_lines = self.get_roster_lines(session)
             updates = []
+            marked_records = []
             found_students = []
             not_found = []
             already_present = []
             
-            for roll_number in roll_numbers:
-                student_found = False
-                for record in attendance_records:
-                    student = record.get('student', {})
-                    if student.get('rollNumber', '').upper() == roll_number.upper():
-                        if record.get('present'):
-                            # Student already marked present
-                            user = student.get('user', {})
-                            name = f"{user.get('firstName', '')} {user.get('lastName', '')}".strip()
-                            already_present.append(f"{roll_number} ({name})")
-                        else:
-                            # Mark student present
-                            updates.append({
-                                "studentId": record['studentId'],
-                                "present": True
-                            })
-                            # Update local record
-                            record['present'] = True
-                            user = student.get('user', {})
-                            name = f"{user.get('firstName', '')} {user.get('lastName', '')}".strip()
-                            found_students.append(f"{roll_number} ({name})")
-                        student_found = True
-                        break
-                
-                if not student_found:
+            for roll_number in dict.fromkeys(roll_numbers):  # De-duplicate, keep order
+                record = roster_index.get(roll_number)
+                if record is None:
                     not_found.append(roll_number)
+                elif record.present:
+                    # Student already marked present
+                    already_present.append(roster_lines.get(record.studentId, roll_number))
+                else:
+                    # Mark student present
+                    updates.append({
+                        "studentId": record.studentId,
+                        "present": True
+                    })
+                    marked_records.append(record)
+                    found_students.append(roster_lines.get(record.studentId, roll_number))
             
             # Build response message
-            response_parts = []
+            builder = MessageBuilder()
             
             if updates:
                 success = await attendance_service.mark_attendance_batch(
-                    session["current_session"]['id'],
+                    session["current_session"].id,
                     updates,
                     session["user_token"]
                 )
                 
-                if success:
-                    response_parts.append(f"✅ Attendance marked for {len(updates)} students:")
-                    for student in found_students[:10]:  # Limit to 10 to avoid long messages
-                        response_parts.append(f"• {student}")
-                    if len(found_students) > 10:
-                        response_parts.append(f"... and {len(found_students) - 10} more")
-                else:
+                if not success:
                     return "❌ Failed to mark attendance. Please try again."
+                
+                # Update local records only after the backend accepted the batch
+                for record in marked_records:
+                    record.present = True
+                
+                builder.add(f"✅ Attendance marked for {len(updates)} students:")
+                builder.extend(found_students[:10], prefix="• ")  # Limit to 10 to avoid long messages
+                if len(found_students) > 10:
+                    builder.add(f"... and {len(found_students) - 10} more")
             
             if already_present:
-                response_parts.append(f"\n⚠️ Already present ({len(already_present)}):")
-                for student in already_present[:5]:  # Limit to 5
-                    response_parts.append(f"• {student}")
+                builder.add()
+                builder.add(f"⚠️ Already present ({len(already_present)}):")
+                builder.extend(already_present[:5], prefix="• ")  # Limit to 5
                 if len(already_present) > 5:
-                    response_parts.append(f"... and {len(already_present) - 5} more")
+                    builder.add(f"... and {len(already_present) - 5} more")
             
             if not_found:
-                response_parts.append(f"\n❌ Roll numbers not found: {', '.join(not_found)}")
-            
-            if not response_parts:
-                return "❌ No valid actions performed. Please check roll numbers and try again."
+                builder.add()
+                builder.add(f"❌ Roll numbers not found: {', '.join(not_found)}")
             
             # Add current status
-            present_count = sum(1 for record in attendance_records if record.get('present'))
+            present_count = sum(1 for record in attendance_records if record.present)
             total_count = len(attendance_records)
-            response_parts.append(f"\n📊 Total present: {present_count}/{total_count} ({(present_count/total_count*100):.1f}%)")
-            response_parts.append(f"\n💡 Continue marking or type 'done' when finished.")
+            attendance_rate = (present_count / total_count * 100) if total_count else 0
+            builder.add()
+            builder.add(f"📊 Total present: {present_count}/{total_count} ({attendance_rate:.1f}%)")
+            builder.add()
+            builder.add("💡 Continue marking or type 'done' when finished.")
             
-            return "\n".join(response_parts)
+            return builder.build()
             
         except Exception as e:
             logger.error(f"Error handling attendance marking: {e}")
             return "❌ Error processing attendance. Please try again."
     
-    def get_attendance_status(self, session: Dict) -> str:
-        """Get current attendance status"""
+    def handle_checkin_code(self, phone_number: str, session: Dict, revoke: bool = False) -> str:
+        """Generate (or revoke) a short-lived self check-in code for the current session"""
+        session_id = session["current_session"].id
+        
+        if revoke:
+            checkin_registry.revoke(session_id)
+            return "🔒 Self check-in closed for this session."
+        
+        entry = checkin_registry.create(session_id, session["user_token"], phone_number)
+        minutes = int(checkin_registry.ttl.total_seconds() // 60)
+        
+        response = f"🔑 Check-in code: {entry['code']}\n"
+        response += f"⏰ Valid for {minutes} minutes\n\n"
+        response += f"📲 Students send to this number:\ncheckin {entry['code']} <roll number>\n\n"
+        response += "🎯 Commands:\n• 'status' - See who has checked in\n• 'code off' - Close check-in\n• 'code' - New code"
+        return response
+    
+    async def checkin_roster_index(self, entry: Dict) -> Dict[str, AttendanceRecord]:
+        """Roll number index of the roster a check-in code marks, as the teacher's conversation holds it now.
+
+        Once the teacher has moved to another session (or theirs expired) the
+        records are looked up in a fresh fetch of the roster instead.
+        """
+        teacher = user_sessions.get(entry["teacher_phone"])
+        current_session = teacher.get("current_session") if teacher else None
+        if current_session is not None and current_session.id == entry["session_id"]:
+            await self.reload_attendance(teacher)
+            return self.get_roster_index(teacher)
+
+        attendance_records, _ = await attendance_service.get_session_attendance(
+            entry["session_id"], entry["user_token"]
+        )
+        return self.get_roster_index({"attendance_records": attendance_records or []})
+
+    @tracer.traced()
+    async def handle_checkin(self, phone_number: str, message: str) -> str:
+        """Handle a student's self check-in: checkin <code> <roll number>"""
+        parts = message.split()
+        if len(parts) != 3:
+            return "❌ Invalid format. Use: checkin <code> <roll number>\n💡 Example: checkin K7P2QX 104"
+        
+        entry = checkin_registry.lookup(parts[1])
+        if entry is None:
+            return "❌ Invalid or expired check-in code. Please ask your teacher for the current code."
+        
+        roll_number = parts[2].upper()
+        record = (await self.checkin_roster_index(entry)).get(roll_number)
+        if record is None:
+            return f"❌ Roll number {roll_number} is not enrolled in this class."
+        
+        student_id = record.studentId
+        phone_student = entry["phones"].get(phone_number)
+        if phone_student and phone_student != student_id:
+            return "❌ This phone has already been used to check in another student."
+        
+        if record.present or student_id in entry["checked_in"]:
+            return f"✅ {roll_number} is already marked present."
+        
+        # Claim before awaiting so duplicates arriving mid-flush are rejected
+        entry["checked_in"].add(student_id)
+        entry["phones"][phone_number] = student_id
+        
+        success = await checkin_coalescer.submit(entry["session_id"], entry["user_token"], student_id)
+        
+        if not success:
+            entry["checked_in"].discard(student_id)
+            entry["phones"].pop(phone_number, None)
+            return "❌ Check-in failed. Please try again."
+        
+        record.present = True
+        user = (record.student or {}).get('user') or {}
+        name = f"{user.get('firstName', '')} {user.get('lastName', '')}".strip()
+        return f"✅ Checked in: {roll_number} {name}".strip()
+    
+    def get_attendance_status(self, session: Dict) -> Union[str, List[str]]:
+        """Get current attendance status, split into parts for large rosters"""
         attendance_records = session.get("attendance_records", [])
         
         if not attendance_records:
             return "❌ No attendance records found."
         
+        roster_lines = self.get_roster_lines(session)
         present_students = []
         absent_students = []
         
         for record in attendance_records:
-            student = record.get('student', {})
-            user = student.get('user', {})
-            name = f"{user.get('firstName', '')} {user.get('lastName', '')}".strip()
-            roll_number = student.get('rollNumber', 'N/A')
+            line = roster_lines.get(record.studentId) or format_student_line(record)
+            if record.present:
+                present_students.append(line)
+            else:
+                absent_students.append(line)
+        
+        builder = MessageBuilder()
+        builder.add("📊 Attendance Status")
+        builder.add()
+        builder.add(f"✅ Present ({len(present_students)}):")
+        builder.extend(present_students, prefix="• ")
+        builder.add()
+        builder.add(f"❌ Absent ({len(absent_students)}):")
+        builder.extend(absent_students, prefix="• ")
+        
+        attendance_rate = len(present_students) / len(attendance_records) * 100
+        builder.add()
+        builder.add(f"📈 Total: {len(present_students)}/{len(attendance_records)} present ({attendance_rate:.1f}%)")
+        
+        return builder.build()
+    
+    @tracer.traced()
+    async def handle_defaulters(self, phone_number: str, message: str) -> Union[str, List[str]]:
+        """List students below an attendance threshold for the current assignment"""
+        session = self.get_user_session(phone_number)
+        parts = message.split()
+        
+        try:
+            threshold = float(parts[1].rstrip('%')) if len(parts) > 1 else DEFAULT_THRESHOLD
+        except ValueError:
+            return "❌ Invalid threshold.\n💡 Example: defaulters 75"
+        
+        if not 0 < threshold <= 100:
+            return f"❌ {THRESHOLD_ERROR}."
+        
+        try:
+            assignment = session["current_assignment"]
+            matrix = await attendance_service.get_attendance_matrix(assignment.id, session["user_token"])
+            
+            if matrix is None:
+                return "❌ Error retrieving attendance history. Please try again later."
             
-            if record.get('present'):
-                present_students.append(f"• {roll_number} - {name}")
+            if not matrix.session_count:
+                return "📭 No sessions recorded for this assignment yet."
+            
+            report = matrix.summary(threshold)
+            course_name = assignment.course.get('name', 'Unknown Course')
+            defaulters = report["defaulters"]
+            
+            builder = MessageBuilder()
+            builder.add(f"📉 Below {threshold:g}% - {course_name}")
+            builder.add(f"📅 {report['totalSessions']} sessions | 👥 {report['totalStudents']} students | 📈 Avg {report['averagePercentage']}%")
+            builder.add()
+            
+            if not defaulters:
+                builder.add(f"✅ All students are at or above {threshold:g}%.")
             else:
-                absent_students.append(f"• {roll_number} - {name}")
-        
-        response = f"📊 Attendance Status\n\n"
-        response += f"✅ Present ({len(present_students)}):\n"
-        for student in present_students[:10]:  # Show first 10
-            response += f"{student}\n"
-        if len(present_students) > 10:
-            response += f"... and {len(present_students) - 10} more\n"
-        
-        response += f"\n❌ Absent ({len(absent_students)}):\n"
-        for student in absent_students[:10]:  # Show first 10
-            response += f"{student}\n"
-        if len(absent_students) > 10:
-            response += f"... and {len(absent_students) - 10} more\n"
+                builder.add(f"⚠️ {len(defaulters)} students:")
+                for student in defaulters:
+                    line = f"• {student['rollNumber'] or 'N/A'} - {student['name']}: {student['percentage']}% ({student['attended']}/{report['totalSessions']})"
+                    if student['absenceStreak'] >= 3:
+                        line += f" 🔻{student['absenceStreak']} absent in a row"
+                    builder.add(line)
+            
+            return builder.build()
+            
+        except Exception as e:
+            logger.error(f"Error handling defaulters: {e}")
+            return "❌ Error computing attendance report. Please try again."
+    
+    @tracer.traced()
+    async def handle_export(self, phone_number: str, message: str) -> str:
+        """Export the attendance register of the current assignment and reply with a download link"""
+        session = self.get_user_session(phone_number)
+        parts = message.lower().split()
+        fmt = parts[1] if len(parts) > 1 else "csv"
+        
+        if fmt not in EXPORT_FORMATS:
+            return f"❌ Unsupported format. Use: export {' | export '.join(EXPORT_FORMATS)}"
+        
+        assignment = session["current_assignment"]
+        
+        if not self.twilio_client:
+            # No outbound messaging, so build the file while the teacher waits
+            return await self.run_register_export(phone_number, assignment, session["user_token"], fmt)
+        
+        # Large registers can outlast the webhook timeout; send the link when ready
+        task = asyncio.create_task(
+            self.run_register_export(phone_number, assignment, session["user_token"], fmt, notify=True)
+        )
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
         
-        attendance_rate = (len(present_students) / len(attendance_records) * 100) if attendance_records else 0
-        response += f"\n📈 Total: {len(present_students)}/{len(attendance_records)} present ({attendance_rate:.1f}%)"
+        return f"⏳ Preparing the {fmt.upper()} attendance register...\n📥 You'll receive a download link shortly."
+    
+    @tracer.traced()
+    async def run_register_export(self, phone_number: str, assignment: TeachingAssignment, user_token: str,
+                                  fmt: str, notify: bool = False) -> str:
+        """Write the register export file and build the reply carrying its link"""
+        try:
+            course = assignment.course
+            download_name = re.sub(r'[^A-Za-z0-9_-]+', '_', f"{course.get('code') or course.get('name', 'course')}_attendance")
+            export = await register_exports.create(
+                attendance_service.register_page_fetcher(assignment.id, user_token),
+                fmt,
+                download_name
+            )
+            response = (f"📥 Attendance register ready ({export['rows']} students)\n"
+                        f"{BOT_PUBLIC_URL}/exports/{export['id']}\n\n"
+                        f"⏰ Link expires in {int(register_exports.ttl.total_seconds() // 60)} minutes.")
+        except Exception as e:
+            logger.error(f"Error exporting register for assignment {assignment.id}: {e}")
+            response = "❌ Error exporting attendance register. Please try again later."
         
+        if notify:
+            await self.send_message(phone_number, response)
         return response
     
-    async def process_message(self, phone_number: str, message: str) -> str:
-        """Process incoming WhatsApp message"""
+    async def backfill_archive(self, assignment_ids: List[str]) -> int:
+        """Load the full history of archived assignments that only have some sessions there.
+
+        Histories are only readable by the assignment's teacher, so each one is
+        fetched with the token of a conversation listing it; assignments with
+        no such conversation stay partial. Returns how many were loaded.
+        """
+        wanted = set(assignment_ids)
+        tokens: Dict[str, List[str]] = {}
+        for session in list(user_sessions.values()):
+            if not session.get("user_token"):
+                continue
+            for assignment in session["assignments"]:
+                if assignment.id in wanted:
+                    tokens.setdefault(assignment.id, []).append(session["user_token"])
+
+        loaded = 0
+        for assignment_id, candidates in tokens.items():
+            for user_token in candidates:
+                history = await attendance_service.get_assignment_attendance(assignment_id, user_token)
+                if history is not None:
+                    await asyncio.to_thread(attendance_archive.ingest_history, assignment_id, history)
+                    loaded += 1
+                    break
+        logger.info(f"Backfilled {loaded} of {len(wanted)} partial assignments in the attendance archive")
+        return loaded
+    
+    @tracer.traced()
+    async def handle_student_message(self, phone_number: str, message: str) -> Union[str, List[str]]:
+        """Handle messages from a logged in student"""
+        if message.lower() not in ('attendance', 'my attendance'):
+            return "📊 Type 'attendance' to view your attendance.\n💡 Type 'help' for more commands."
+        
+        session = self.get_user_session(phone_number)
+        student_id = ((session.get("user_info") or {}).get("student") or {}).get("id")
+        if not student_id:
+            return "❌ No student profile found for your account. Please contact your administrator."
+        
+        user_token = session["user_token"]
+        overview = await student_attendance_cache.get(
+            student_id,
+            lambda: attendance_service.get_student_attendance_overview(user_token)
+        )
+        
+        if overview is None:
+            return "❌ Error retrieving your attendance. Please try again later."
+        if not overview:
+            return "📭 You are not enrolled in any active courses."
+        
+        builder = MessageBuilder()
+        builder.add("📊 Your Attendance")
+        builder.add()
+        for course in overview:
+            percentage = course.get('attendancePercentage', 0)
+            marker = "⚠️" if percentage < DEFAULT_THRESHOLD else "✅"
+            builder.add(f"{marker} {course.get('courseCode', '')} {course.get('courseName', '')}".strip())
+            builder.add(f"   {course.get('attendedSessions', 0)}/{course.get('totalSessions', 0)} sessions ({percentage}%)")
+        builder.add()
+        builder.add(f"⚠️ = below {DEFAULT_THRESHOLD:g}%")
+        return builder.build()
+    
+    @tracer.traced()
+    async def restore_login(self, phone_number: str, session: Dict) -> bool:
+        """Log the session back in from the phone's login binding, if it is still valid"""
+        binding = await login_bindings.restore(phone_number, attendance_service.verify_token)
+        if binding is None:
+            return False
+        
+        role = (binding["user_info"].get("role") or "").upper()
+        if role not in ALLOWED_ROLES:
+            login_bindings.unbind(phone_number)
+            return False
+        
+        session["state"] = UserState.STUDENT if role == "STUDENT" else UserState.AUTHENTICATED
+        session["user_token"] = binding["token"]
+        session["user_info"] = binding["user_info"]
+        logger.info(f"Restored {role.lower()} login for {phone_number} without a password")
+        return True
+    
+    def message_priority(self, phone_number: str, message: str) -> int:
+        """Admission priority of an incoming message, from the sender's state and the command"""
+        words = message.lower().split()
+        command = words[0] if words else ""
+        if command == 'checkin':
+            return PRIORITY_ROLL_CALL
+        if command in ('help', 'assignments', 'defaulters', 'export'):
+            return PRIORITY_BROWSING
+        
+        session = user_sessions.get(phone_number)
+        state = session["state"] if session else UserState.UNAUTHENTICATED
+        if state == UserState.MARKING_ATTENDANCE:
+            return PRIORITY_ROLL_CALL
+        if state in (UserState.AUTHENTICATED, UserState.SELECTING_ASSIGNMENT):
+            return PRIORITY_BROWSING
+        return PRIORITY_INTERACTIVE
+    
+    async def process_message(self, phone_number: str, message: str) -> Union[str, List[str]]:
+        """Process incoming WhatsApp message.
+
+        Long replies come back as a list of numbered parts, one WhatsApp message each.
+        """
         try:
             # Clean phone number format
             phone_number = phone_number.strip()
@@ -879,28 +1906,54 @@ login <email> <password>
             if not message:
                 return "❌ Empty message received. Please send a valid command."
             
-            session = self.get_user_session(phone_number)
+            # Student self check-in works from any phone, logged in or not, and needs no session of its own
+            if message.lower().split()[0] == 'checkin':
+                logger.info(f"Processing check-in from {phone_number}: {message}")
+                return await self.handle_checkin(phone_number, message)
+            
+            with tracer.span("session_lookup"):
+                session = self.get_user_session(phone_number)
             state = session["state"]
             
+            # A timed-out session keeps its login: pick the stored token back up
+            if (state == UserState.UNAUTHENTICATED and not message.lower().startswith('login')
+                    and await self.restore_login(phone_number, session)):
+                state = session["state"]
+            
             logger.info(f"Processing message from {phone_number} in state {state}: {message}")
             
             # Handle special commands that work in any authenticated state
-            if message.lower() == 'assignments' and state != UserState.UNAUTHENTICATED:
+            if message.lower() == 'assignments' and state not in (UserState.UNAUTHENTICATED, UserState.STUDENT):
                 return await self.handle_assignments(phone_number)
             elif message.lower() == 'help':
                 return self.get_help_message(state)
             elif message.lower() == 'logout':
                 user_sessions.pop(phone_number, None)
+                login_bindings.unbind(phone_number)
                 return "👋 Logged out successfully. Send any message to start again."
-            elif message.lower() == 'restart' and state != UserState.UNAUTHENTICATED:
+            elif message.lower() == 'restart' and state not in (UserState.UNAUTHENTICATED, UserState.STUDENT):
                 # Reset to authenticated state but keep login info
                 session["state"] = UserState.AUTHENTICATED
                 session["current_assignment"] = None
                 session["current_session"] = None
                 session["assignments"] = []
                 session["sessions"] = []
+                session["sessions_offset"] = 0
+                session["sessions_cursor"] = None
                 session["attendance_records"] = []
+                session["attendance_synced_at"] = None
+                session["roster_index"] = None
+                session["roster_lines"] = {}
+                session["roster"] = None
+                session["roster_hold"] = None
+                session["name_index"] = None
                 return "🔄 Session restarted. Type 'assignments' to view your teaching assignments."
+            elif (message.lower().split()[0] == 'defaulters' and session.get("current_assignment")
+                    and state != UserState.WAITING_FOR_TOPIC):
+                return await self.handle_defaulters(phone_number, message)
+            elif (message.lower().split()[0] == 'export' and session.get("current_assignment")
+                    and state != UserState.WAITING_FOR_TOPIC):
+                return await self.handle_export(phone_number, message)
             
             # Handle state-based processing
             if state == UserState.UNAUTHENTICATED:
@@ -918,6 +1971,8 @@ login <email> <password>
                 return await self.handle_topic_input(phone_number, message)
             elif state == UserState.MARKING_ATTENDANCE:
                 return await self.handle_attendance_marking(phone_number, message)
+            elif state == UserState.STUDENT:
+                return await self.handle_student_message(phone_number, message)
             
             return "❌ Something went wrong. Type 'help' for assistance or 'restart' to reset."
             
@@ -932,11 +1987,22 @@ login <email> <password>
             return """📱 Attendance Bot Help
 
 🔐 Login Commands:
-• login <email> <password> - Sign in as teacher
+• login <email> <password> - Sign in as teacher or student
 
 💡 Example: login teacher@school.edu mypassword
 
-⚠️ Note: Only teachers can use this bot"""
+📲 Students:
+• checkin <code> <roll number> - Mark yourself present
+
+⚠️ Note: Only teachers and students can sign in to this bot"""
+        elif state == UserState.STUDENT:
+            return """📱 Attendance Bot Help
+
+🎯 Student Commands:
+• attendance - View your attendance in each course
+• checkin <code> <roll number> - Mark yourself present
+• help - Show this help message
+• logout - Sign out from system"""
         else:
             return """📱 Attendance Bot Help
 
@@ -948,7 +2014,15 @@ login <email> <password>
 
 📝 During Attendance:
 • Send roll numbers: 101, 102, 103
+• absent 104, 117 - Mark everyone else present
+• mark Rahul Sharma, Priya - Mark by name
 • status - Check current attendance
+• code - Open student self check-in (code off to close)
 • done - Finish attendance session
 
+📉 Reports (after selecting an assignment):
+• defaulters - Students below 75%
+• defaulters 60 - Students below a custom threshold
+• export / export xlsx - Download the attendance register
+
 🔄 You can type 'assignments' anytime to start over."""
\ No newline at end of file
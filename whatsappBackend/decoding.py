@@ -0,0 +1,124 @@
+from typing import Any, Dict, Optional, Tuple, Type, Union, get_args, get_origin
+from copy import copy
+from functools import lru_cache
+import json
+import os
+
+from pydantic import BaseModel, TypeAdapter
+
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+# With validation off, typed responses are decoded into unchecked structs (see struct_type)
+BACKEND_VALIDATION = os.getenv("BACKEND_VALIDATION", "true").lower() != "false"
+
+
+@lru_cache(maxsize=None)
+def validator(target: Any) -> TypeAdapter:
+    """Compiled pydantic validator for a type, built once per type"""
+    return TypeAdapter(target)
+
+
+def _model_of(annotation: Any) -> Tuple[Optional[Type[BaseModel]], bool]:
+    """(model class, is list) for a field annotated with a model, a list of models or Optional of either"""
+    if get_origin(annotation) is Union:
+        annotation = next((arg for arg in get_args(annotation) if arg is not type(None)), None)
+    if get_origin(annotation) is list:
+        (item,) = get_args(annotation) or (None,)
+        if isinstance(item, type) and issubclass(item, BaseModel):
+            return item, True
+    elif isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation, False
+    return None, False
+
+
+@lru_cache(maxsize=None)
+def _nested_fields(model: Type[BaseModel]) -> Dict[str, Tuple[Type[BaseModel], bool]]:
+    nested = {}
+    for name, field in model.model_fields.items():
+        submodel, is_list = _model_of(field.annotation)
+        if submodel is not None:
+            nested[name] = (submodel, is_list)
+    return nested
+
+
+@lru_cache(maxsize=None)
+def struct_type(model: Type[BaseModel]) -> type:
+    """A __slots__ class with the model's fields (and properties), for unvalidated decoding.
+
+    Missing fields get the model's defaults; unknown fields are dropped.
+    """
+    fields = tuple(
+        (name, None if field.is_required() else field.default)
+        for name, field in model.model_fields.items()
+    )
+    nested = _nested_fields(model)
+
+    def __init__(self, data: Dict):
+        for name, default in fields:
+            value = data.get(name, default)
+            if name in nested and value is not None:
+                field_model, is_list = nested[name]
+                value = ([struct_type(field_model)(item) for item in value] if is_list
+                         else struct_type(field_model)(value))
+            elif isinstance(value, (list, dict)) and value is default:
+                value = copy(default)
+            setattr(self, name, value)
+
+    def __repr__(self) -> str:
+        return f"{model.__name__}Struct({', '.join(f'{name}={getattr(self, name)!r}' for name, _ in fields)})"
+
+    def __eq__(self, other) -> bool:
+        return type(other) is type(self) and all(getattr(self, name) == getattr(other, name) for name, _ in fields)
+
+    def model_dump(self) -> Dict:
+        return {name: dump(getattr(self, name)) if name in nested else getattr(self, name) for name, _ in fields}
+
+    namespace = {"__slots__": tuple(name for name, _ in fields), "__init__": __init__, "__repr__": __repr__,
+                 "__eq__": __eq__, "__hash__": None, "model_dump": model_dump}
+    namespace.update({name: attr for name, attr in vars(model).items() if isinstance(attr, property)})
+    return type(f"{model.__name__}Struct", (), namespace)
+
+
+def construct(target: Any, data: Any) -> Any:
+    """Build lightweight structs of the target type from already-parsed JSON, without validation"""
+    model, is_list = _model_of(target)
+    if model is None:
+        return data
+    struct = struct_type(model)
+    return [struct(item) for item in data] if is_list else struct(data)
+
+
+def convert(data: Any, target: Any, validate: Optional[bool] = None) -> Any:
+    """Models (or structs, without validation) of the target type from already-parsed JSON"""
+    if BACKEND_VALIDATION if validate is None else validate:
+        return validator(target).validate_python(data)
+    if data is None:
+        return None
+    return construct(target, data)
+
+
+def dump(value: Any) -> Any:
+    """Plain JSON data of a model or struct, or a list of them, e.g. to snapshot conversation state"""
+    if isinstance(value, list):
+        return [dump(item) for item in value]
+    if value is None:
+        return None
+    return value.model_dump()
+
+
+def decode(content: bytes, target: Any = None, validate: Optional[bool] = None) -> Any:
+    """Decode a response body: plain JSON without a target, else models of the target type.
+
+    Validation parses and checks in one pass in pydantic-core and returns
+    models; without it the body is parsed with the fast JSON loader into
+    structs that have the same attributes but no checks.
+    """
+    if target is None:
+        return loads(content)
+    if BACKEND_VALIDATION if validate is None else validate:
+        return validator(target).validate_json(content)
+    return construct(target, loads(content))
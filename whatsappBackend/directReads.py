@@ -0,0 +1,355 @@
+"""Read-only fast lane from the bot straight to the attendance database.
+
+The bot's hottest reads (a teacher's assignments, an assignment's sessions
+and a session's roster) normally go bot -> Express -> Prisma -> Postgres and
+are serialised to JSON twice on the way. When DIRECT_DATABASE_URL is set,
+AttendanceService runs them as SQL on a small async connection pool instead.
+Writes always stay on the HTTP API.
+
+Authorization mirrors the teacher routes: the bearer token is checked here
+(HS256 with the backend's JWT_SECRET), the user must still exist with a
+role the routes admit (TEACHER or ADMIN), and the assignment or session must
+be theirs. Every query
+joins through "Teacher" and "User", so a revoked teacher loses access
+exactly as with the middleware's per-request user lookup.
+
+Results have the same shape as the route bodies, so callers treat both paths
+alike. Anything the direct path can't answer (an unverifiable token, a
+database error) is retried over HTTP and the backend decides.
+
+Pools:
+  postgresql://...  asyncpg, which prepares each statement once per connection
+  sqlite:///path    sqlite3 in worker threads, a stand-in with the same tables
+                    for tests and benchmarks (see SQLITE_SCHEMA)
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime, timezone
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+DIRECT_DATABASE_URL = os.getenv("DIRECT_DATABASE_URL")
+JWT_SECRET = os.getenv("JWT_SECRET")
+DIRECT_POOL_SIZE = int(os.getenv("DIRECT_POOL_SIZE", "5"))
+
+# Prisma's table and column names; identifiers are quoted because they are mixed case
+QUERIES = {
+    "assignments": """
+        SELECT ta.id, ta."teacherId", ta."courseId", ta."branchId", ta.semester, ta.section,
+               ta."academicYear", ta.active, ta."updatedAt",
+               c.code AS "courseCode", c.name AS "courseName", c.semester AS "courseSemester",
+               c."branchId" AS "courseBranchId", b.name AS "branchName"
+        FROM "TeachingAssignment" ta
+        JOIN "Teacher" t ON t.id = ta."teacherId"
+        JOIN "User" u ON u.id = t."userId"
+        JOIN "Course" c ON c.id = ta."courseId"
+        JOIN "Branch" b ON b.id = ta."branchId"
+        WHERE u.id = $1 AND u.role IN ('TEACHER', 'ADMIN') AND ta.active
+        ORDER BY c.name""",
+    "owns_assignment": """
+        SELECT ta.id
+        FROM "TeachingAssignment" ta
+        JOIN "Teacher" t ON t.id = ta."teacherId"
+        JOIN "User" u ON u.id = t."userId"
+        WHERE ta.id = $1 AND u.id = $2 AND u.role IN ('TEACHER', 'ADMIN') AND ta.active""",
+    "sessions": """
+        SELECT s.id, s.date, s.topic, s."assignmentId", s."updatedAt"
+        FROM "Session" s
+        WHERE s."assignmentId" = $1
+        ORDER BY s.date DESC""",
+    "sessions_page": """
+        SELECT s.id, s.date, s.topic, s."assignmentId", s."updatedAt"
+        FROM "Session" s
+        WHERE s."assignmentId" = $1
+        ORDER BY s.date DESC, s.id DESC
+        LIMIT $2""",
+    # Prisma's cursor pagination: the rows after the cursor row in (date, id) descending order
+    "sessions_after": """
+        SELECT s.id, s.date, s.topic, s."assignmentId", s."updatedAt"
+        FROM "Session" s
+        JOIN "Session" c ON c.id = $2
+        WHERE s."assignmentId" = $1 AND (s.date < c.date OR (s.date = c.date AND s.id < c.id))
+        ORDER BY s.date DESC, s.id DESC
+        LIMIT $3""",
+    "roster": """
+        SELECT a."studentId", a.present, a."markedAt", st."rollNumber", su."firstName", su."lastName"
+        FROM "Attendance" a
+        JOIN "Session" s ON s.id = a."sessionId"
+        JOIN "TeachingAssignment" ta ON ta.id = s."assignmentId"
+        JOIN "Teacher" t ON t.id = ta."teacherId"
+        JOIN "User" u ON u.id = t."userId"
+        JOIN "Student" st ON st.id = a."studentId"
+        JOIN "User" su ON su.id = st."userId"
+        WHERE a."sessionId" = $1 AND u.id = $2 AND u.role IN ('TEACHER', 'ADMIN')
+        ORDER BY st."rollNumber"
+    """,
+    "owns_session": """
+        SELECT s.id
+        FROM "Session" s
+        JOIN "TeachingAssignment" ta ON ta.id = s."assignmentId"
+        JOIN "Teacher" t ON t.id = ta."teacherId"
+        JOIN "User" u ON u.id = t."userId"
+        WHERE s.id = $1 AND u.id = $2 AND u.role IN ('TEACHER', 'ADMIN')"""
+}
+
+# The tables the queries read, for the SQLite stand-in; timestamps are stored as ISO strings
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS "User" (id TEXT PRIMARY KEY, email TEXT UNIQUE, firstName TEXT, lastName TEXT,
+    role TEXT NOT NULL, updatedAt TEXT);
+CREATE TABLE IF NOT EXISTS "Teacher" (id TEXT PRIMARY KEY, userId TEXT UNIQUE NOT NULL, employeeId TEXT);
+CREATE TABLE IF NOT EXISTS "Student" (id TEXT PRIMARY KEY, userId TEXT UNIQUE NOT NULL, rollNumber TEXT UNIQUE,
+    currentSemester INTEGER, branchId TEXT, section TEXT);
+CREATE TABLE IF NOT EXISTS "Branch" (id TEXT PRIMARY KEY, name TEXT UNIQUE);
+CREATE TABLE IF NOT EXISTS "Course" (id TEXT PRIMARY KEY, code TEXT UNIQUE, name TEXT, semester INTEGER,
+    branchId TEXT);
+CREATE TABLE IF NOT EXISTS "TeachingAssignment" (id TEXT PRIMARY KEY, teacherId TEXT, courseId TEXT,
+    branchId TEXT, semester INTEGER, section TEXT, academicYear TEXT, active BOOLEAN DEFAULT 1, updatedAt TEXT);
+CREATE TABLE IF NOT EXISTS "Session" (id TEXT PRIMARY KEY, date TEXT, topic TEXT, assignmentId TEXT,
+    updatedAt TEXT);
+CREATE INDEX IF NOT EXISTS "Session_assignmentId_date" ON "Session" (assignmentId, date, id);
+CREATE TABLE IF NOT EXISTS "Attendance" (id TEXT PRIMARY KEY, sessionId TEXT, studentId TEXT,
+    enrollmentId TEXT, present BOOLEAN, markedAt TEXT, markedBy TEXT, UNIQUE (sessionId, studentId));
+"""
+
+
+class Forbidden(Exception):
+    """The teacher may not read this; the HTTP route would answer 403"""
+
+
+class Unavailable(Exception):
+    """The direct path can't answer (unverifiable token, database error); use the HTTP API"""
+
+
+def b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+def verify_jwt(token: str, secret: str) -> Dict:
+    """Claims of an HS256 token signed with secret (as jsonwebtoken signs them); Unavailable if not valid"""
+    try:
+        header, payload, signature = token.split(".")
+        if json.loads(b64decode(header)).get("alg") != "HS256":
+            raise Unavailable("token is not HS256")
+        expected = hmac.new(secret.encode(), f"{header}.{payload}".encode(), hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, b64decode(signature)):
+            raise Unavailable("token signature does not match")
+        claims = json.loads(b64decode(payload))
+    except (ValueError, AttributeError) as e:
+        raise Unavailable(f"malformed token: {e}")
+    if not isinstance(claims, dict):
+        raise Unavailable("malformed token: claims are not an object")
+    if "exp" in claims and claims["exp"] <= time.time():
+        raise Unavailable("token has expired")
+    return claims
+
+
+def iso_timestamp(value: Any) -> Optional[str]:
+    """A timestamp as JSON.stringify writes a Prisma DateTime (Prisma stores naive UTC)"""
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc)
+        return value.strftime("%Y-%m-%dT%H:%M:%S.") + f"{value.microsecond // 1000:03d}Z"
+    return value
+
+
+class PostgresReadPool:
+    """asyncpg pool; each connection prepares a statement once and reuses it (requires the asyncpg package)"""
+
+    def __init__(self, url: str, size: int = DIRECT_POOL_SIZE):
+        try:
+            import asyncpg
+        except ImportError:
+            raise RuntimeError("DIRECT_DATABASE_URL is set but the asyncpg package is not installed")
+
+        self.asyncpg = asyncpg
+        self.url = url
+        self.size = size
+        self.pool = None
+        self.lock = asyncio.Lock()
+
+    async def fetch(self, name: str, *args) -> List[Dict]:
+        if self.pool is None:
+            async with self.lock:
+                if self.pool is None:
+                    self.pool = await self.asyncpg.create_pool(
+                        self.url, min_size=1, max_size=self.size,
+                        # Read-only sessions: a stray write through this lane fails instead of landing
+                        server_settings={"default_transaction_read_only": "on"}
+                    )
+        rows = await self.pool.fetch(QUERIES[name], *args)
+        return [dict(row) for row in rows]
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+
+class SQLiteReadPool:
+    """Stand-in pool over a SQLite file: size connections, each used by one worker thread at a time"""
+
+    def __init__(self, path: str, size: int = DIRECT_POOL_SIZE):
+        self.path = path
+        self.size = size
+        self.connections: Optional[asyncio.Queue] = None
+        # SQLite takes ?NNN for the numbered $N parameters Postgres uses
+        self.queries = {name: re.sub(r"\$(\d+)", r"?\1", sql) for name, sql in QUERIES.items()}
+
+    def connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    async def fetch(self, name: str, *args) -> List[Dict]:
+        if self.connections is None:
+            self.connections = asyncio.Queue()
+            for _ in range(self.size):
+                self.connections.put_nowait(self.connect())
+        connection = await self.connections.get()
+        try:
+            # sqlite3 caches the prepared statement per connection, keyed by the SQL text
+            rows = await asyncio.to_thread(lambda: connection.execute(self.queries[name], args).fetchall())
+        finally:
+            self.connections.put_nowait(connection)
+        return [dict(row) for row in rows]
+
+    async def close(self):
+        while self.connections is not None and not self.connections.empty():
+            self.connections.get_nowait().close()
+
+
+class DirectReader:
+    """The teacher routes' reads, authorized and shaped like their response bodies"""
+
+    def __init__(self, pool, secret: str):
+        self.pool = pool
+        self.secret = secret
+        self.reads = 0
+        self.fallbacks = 0
+        self.forbidden = 0
+
+    async def read(self, name: str, *args) -> Tuple[Optional[int], Any]:
+        """Run the read named (assignments, sessions or roster) as (status, body).
+
+        The status is 200, 403 where the route would refuse, or None when the
+        HTTP API should answer instead.
+        """
+        try:
+            with tracer.span("direct", read=name):
+                body = await getattr(self, name)(*args)
+        except Forbidden as e:
+            self.forbidden += 1
+            logger.warning(f"Direct read refused: {e}")
+            return 403, None
+        except Unavailable as e:
+            self.fallbacks += 1
+            logger.warning(f"Direct read of {name} falls back to HTTP: {e}")
+            return None, None
+        self.reads += 1
+        return 200, body
+
+    async def fetch(self, name: str, *args) -> List[Dict]:
+        try:
+            return await self.pool.fetch(name, *args)
+        except Exception as e:
+            raise Unavailable(f"{name} query failed: {e}")
+
+    def user_id(self, token: str) -> str:
+        user_id = verify_jwt(token, self.secret).get("id")
+        if not user_id:
+            raise Unavailable("token has no user id")
+        return user_id
+
+    async def assignments(self, token: str) -> List[Dict]:
+        """GET /api/teachers/assignments"""
+        rows = await self.fetch("assignments", self.user_id(token))
+        return [
+            {
+                "id": row["id"], "teacherId": row["teacherId"], "courseId": row["courseId"],
+                "branchId": row["branchId"], "semester": row["semester"], "section": row["section"],
+                "academicYear": row["academicYear"], "active": bool(row["active"]),
+                "updatedAt": iso_timestamp(row["updatedAt"]),
+                "course": {"id": row["courseId"], "code": row["courseCode"], "name": row["courseName"],
+                           "semester": row["courseSemester"], "branchId": row["courseBranchId"]},
+                "branch": {"id": row["branchId"], "name": row["branchName"]}
+            }
+            for row in rows
+        ]
+
+    async def sessions(self, assignment_id: str, token: str, limit: Optional[int] = None,
+                       cursor: Optional[str] = None):
+        """GET /api/teachers/sessions/:assignmentId, paged like the route when a limit is given"""
+        user_id = self.user_id(token)
+        if not await self.fetch("owns_assignment", assignment_id, user_id):
+            raise Forbidden(f"assignment {assignment_id}")
+
+        take = None if limit is None else min(max(int(limit), 1), 100)
+        if take is None:
+            rows = await self.fetch("sessions", assignment_id)
+        elif cursor:
+            rows = await self.fetch("sessions_after", assignment_id, cursor, take + 1)
+        else:
+            # One extra row tells whether another page exists
+            rows = await self.fetch("sessions_page", assignment_id, take + 1)
+        sessions = [
+            {"id": row["id"], "date": iso_timestamp(row["date"]), "topic": row["topic"],
+             "assignmentId": row["assignmentId"], "updatedAt": iso_timestamp(row["updatedAt"])}
+            for row in rows
+        ]
+        if take is None:
+            return sessions
+        page = sessions[:take]
+        return {"sessions": page, "nextCursor": page[-1]["id"] if len(sessions) > take else None}
+
+    async def roster(self, session_id: str, token: str) -> Dict:
+        """GET /api/teachers/sessions/:sessionId/attendance?format=roster"""
+        user_id = self.user_id(token)
+        rows = await self.fetch("roster", session_id, user_id)
+        # An empty result is either an empty session or someone else's; only then is ownership checked
+        if not rows and not await self.fetch("owns_session", session_id, user_id):
+            raise Forbidden(f"session {session_id}")
+        marked = [iso_timestamp(row["markedAt"]) for row in rows]
+        return {
+            "cursor": max(marked, default=None),
+            "studentIds": [row["studentId"] for row in rows],
+            "present": [1 if row["present"] else 0 for row in rows],
+            "rollNumbers": [row["rollNumber"] for row in rows],
+            "firstNames": [row["firstName"] for row in rows],
+            "lastNames": [row["lastName"] for row in rows]
+        }
+
+    async def close(self):
+        await self.pool.close()
+
+    def stats(self) -> Dict:
+        return {
+            "pool": type(self.pool).__name__,
+            "size": self.pool.size,
+            "reads": self.reads,
+            "fallbacks": self.fallbacks,
+            "forbidden": self.forbidden
+        }
+
+
+def create_direct_reader(url: Optional[str] = DIRECT_DATABASE_URL, secret: Optional[str] = JWT_SECRET,
+                         size: int = DIRECT_POOL_SIZE) -> Optional[DirectReader]:
+    """The direct read path for url, or None when it is not configured"""
+    if not url:
+        return None
+    if not secret:
+        logger.error("DIRECT_DATABASE_URL is set without JWT_SECRET; reads stay on the HTTP API")
+        return None
+    if url.startswith("sqlite:///"):
+        return DirectReader(SQLiteReadPool(url[len("sqlite:///"):], size), secret)
+    return DirectReader(PostgresReadPool(url, size), secret)
@@ -0,0 +1,95 @@
+from typing import Awaitable, Callable, Dict, Optional
+from datetime import datetime, timedelta
+import base64
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# How long a successful /api/auth/me check is trusted before the token is checked again
+VERIFY_TTL = timedelta(minutes=5)
+# Used when the token's expiry can't be read; matches the backend's expiresIn
+DEFAULT_TOKEN_LIFETIME = timedelta(hours=8)
+
+# Checks a token with the backend: {"status": valid|invalid|unreachable, "user": ...}
+VerifyToken = Callable[[str], Awaitable[Dict]]
+
+
+def token_expiry(token: str) -> Optional[datetime]:
+    """Read the exp claim of a JWT without verifying it (the backend does that)"""
+    try:
+        payload = token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        return datetime.fromtimestamp(claims["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+class LoginBindings:
+    """Per-phone login that outlives the conversation session.
+
+    When a session times out only the conversation state is lost. The phone's
+    token stays bound until it expires, is rejected by /api/auth/me or the user
+    logs out, so the next message resumes without another password login.
+    """
+
+    def __init__(self, verify_ttl: timedelta = VERIFY_TTL):
+        self.verify_ttl = verify_ttl
+        self.bindings: Dict[str, Dict] = {}
+        self.restored = 0
+        self.verifications = 0
+        self.rejected = 0
+
+    def bind(self, phone_number: str, token: str, user_info: Dict):
+        self.purge_expired()
+        now = datetime.now()
+        self.bindings[phone_number] = {
+            "token": token,
+            "user_info": user_info,
+            "expires_at": token_expiry(token) or now + DEFAULT_TOKEN_LIFETIME,
+            "verified_at": now
+        }
+
+    def unbind(self, phone_number: str):
+        self.bindings.pop(phone_number, None)
+
+    def purge_expired(self):
+        now = datetime.now()
+        expired = [phone for phone, binding in self.bindings.items() if now >= binding["expires_at"]]
+        for phone in expired:
+            del self.bindings[phone]
+
+    async def restore(self, phone_number: str, verify: VerifyToken) -> Optional[Dict]:
+        """The phone's still-valid binding, checking the token with the backend if not checked recently"""
+        binding = self.bindings.get(phone_number)
+        if binding is None:
+            return None
+
+        now = datetime.now()
+        if now >= binding["expires_at"]:
+            self.unbind(phone_number)
+            return None
+
+        if now - binding["verified_at"] > self.verify_ttl:
+            self.verifications += 1
+            result = await verify(binding["token"])
+            if result["status"] == "invalid":
+                logger.info(f"Stored login for {phone_number} was rejected by the backend")
+                self.rejected += 1
+                self.unbind(phone_number)
+                return None
+            if result["status"] == "valid":
+                binding["user_info"] = {**binding["user_info"], **result["user"]}
+                binding["verified_at"] = now
+            # If the backend is unreachable, keep the binding; a password login wouldn't work either
+
+        self.restored += 1
+        return binding
+
+    def stats(self) -> Dict:
+        return {
+            "bindings": len(self.bindings),
+            "restored": self.restored,
+            "verifications": self.verifications,
+            "rejected": self.rejected
+        }
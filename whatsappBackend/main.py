@@ -1,6 +1,6 @@
-from fastapi import FastAPI, HTTPException, Request, Depends
+from fastapi import FastAPI, HTTPException, Request, Depends, File, UploadFile
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import Response
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
 from typing import Dict, List, Optional, Any, Union
 import httpx
@@ -13,7 +13,22 @@ import asyncio
 from urllib.parse import quote
 import traceback
 import re
-from classImplementation import UserState,WhatsAppMessage,TeachingAssignment,Session,AttendanceRecord,AttendanceService,WhatsAppBot
+from classImplementation import UserState,WhatsAppMessage,AttendanceService,WhatsAppBot,attendance_service,register_exports,student_attendance_cache,response_cache,rate_limiter,SESSIONS_PAGE_SIZE,login_bindings,user_sessions,new_user_session,checkin_registry,checkin_coalescer
+from attendanceAnalytics import DEFAULT_THRESHOLD, THRESHOLD_ERROR
+from registerExport import stream_register_csv
+from bulkImport import BulkImporter, ImportAborted, load_checkpoint
+from tracing import TRACE_HEADER, inbound_trace_id, tracer
+from admission import PRIORITY_NAMES, AdmissionController
+from rateLimit import RateLimitDecision
+from sessionSnapshot import SESSION_SNAPSHOT_KEY, SESSION_SNAPSHOT_PATH, SnapshotError, load_snapshot, save_snapshot
+import time
+from sharding import SHARD_PEERS, SHARD_SECRET, SHARD_SELF_URL, ShardNode, checkin_routing_key, resource_routing_key, routing_key
+import math
+import secrets
+import tempfile
+from messageBuilder import WHATSAPP_MESSAGE_LIMIT
+from prewarm import PREWARM_TIMETABLE, PrewarmFetchers, PrewarmScheduler, load_timetable
+from classImplementation import attendance_archive, direct_reader, roster_cache
 # Configure comprehensive logging
 logging.basicConfig(
     level=logging.INFO,
@@ -33,25 +48,200 @@ TWILIO_WHATSAPP_NUMBER = os.getenv("TWILIO_WHATSAPP_NUMBER", "whatsapp:+14155238
 # Session timeout (30 minutes)
 SESSION_TIMEOUT = timedelta(minutes=30)
 
-# In-memory session storage with cleanup (use Redis in production)
-user_sessions: Dict[str, Dict] = {}
+# How long shutdown waits for background work (export links, import jobs) before cancelling it
+SHUTDOWN_DRAIN_TIMEOUT = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "20"))
+
+# In-memory session storage lives in classImplementation; snapshotted across restarts
 
 # Initialize bot
 bot = WhatsAppBot()
 
-def create_twiml_response(message: str) -> str:
-    """Create TwiML response for Twilio with enhanced error handling"""
+# Bulk import jobs started through the API (uploaded CSV, checkpoint and results live in IMPORT_DIR)
+IMPORT_DIR = os.getenv("IMPORT_DIR", os.path.join(tempfile.gettempdir(), "attendance_imports"))
+import_jobs: Dict[str, Dict] = {}
+
+# Caps concurrent webhook processing; excess traffic is queued by priority or shed
+admission = AdmissionController()
+BUSY_TWIML = """<?xml version="1.0" encoding="UTF-8"?>
+<Response>
+    <Message>⏳ The bot is busy right now. Please send your message again in a minute.</Message>
+</Response>"""
+
+# Sharding mode: each instance owns a hash range of phones and forwards the rest
+shard_node: Optional[ShardNode] = None
+if SHARD_PEERS:
+    shard_node = ShardNode(
+        SHARD_SELF_URL, SHARD_PEERS, user_sessions, login_bindings.bindings,
+        new_user_session, UserState, SHARD_SECRET
+    )
+    # Codes must hash to this instance so students' check-ins are forwarded here
+    checkin_registry.code_filter = lambda code: shard_node.owns(checkin_routing_key(code))
+    # Likewise export and import ids, so their requests can be forwarded to the instance holding them
+    register_exports.id_filter = lambda export_id: shard_node.owns(resource_routing_key("export", export_id))
+
+# Refreshes teachers' caches ahead of their class periods, when a timetable is configured
+prewarm_scheduler: Optional[PrewarmScheduler] = None
+
+async def prewarm_sessions(assignment_id: str, user_token: str) -> List[Dict]:
+    """The first page of sessions, as the bot fetches it when an assignment is selected"""
+    sessions, _ = await attendance_service.get_sessions(assignment_id, user_token, limit=SESSIONS_PAGE_SIZE)
+    return sessions
+
+@app.on_event("startup")
+async def restore_sessions():
+    """Warm restart: pick up the sessions and logins the previous process saved on shutdown"""
+    if not SESSION_SNAPSHOT_KEY or not os.path.exists(SESSION_SNAPSHOT_PATH):
+        return
+    
+    start = time.perf_counter()
+    try:
+        sessions, bindings = load_snapshot(
+            SESSION_SNAPSHOT_PATH, SESSION_SNAPSHOT_KEY, SESSION_TIMEOUT, UserState, new_user_session
+        )
+    except (SnapshotError, OSError, ValueError, KeyError) as e:
+        logger.error(f"Could not restore session snapshot: {e}")
+        return
+    finally:
+        # A snapshot is used once, so its tokens don't linger on disk
+        os.remove(SESSION_SNAPSHOT_PATH)
+    
+    user_sessions.update(sessions)
+    login_bindings.bindings.update(bindings)
+    logger.info(f"Restored {len(sessions)} sessions and {len(bindings)} logins in {time.perf_counter() - start:.3f}s")
+
+@app.on_event("startup")
+async def restore_import_jobs():
+    """Bring back import jobs a previous process left unfinished, as aborted so they can be resumed.
+
+    An upload is deleted once its job completes, so every upload still in
+    IMPORT_DIR belongs to a job that was interrupted or failed.
+    """
+    if not os.path.isdir(IMPORT_DIR):
+        return
+    
+    for name in os.listdir(IMPORT_DIR):
+        job_id, extension = os.path.splitext(name)
+        if extension != ".csv" or "." in job_id or job_id in import_jobs:
+            continue
+        if shard_node and not shard_node.owns(resource_routing_key("import", job_id)):
+            continue
+        job = {
+            "id": job_id,
+            # The original file name isn't kept on disk
+            "filename": name,
+            "csv_path": os.path.join(IMPORT_DIR, name),
+            "checkpoint_path": os.path.join(IMPORT_DIR, f"{job_id}.checkpoint.json"),
+            "results_path": os.path.join(IMPORT_DIR, f"{job_id}.results.csv"),
+            "status": "aborted",
+            "summary": None,
+            "error": "Interrupted by a restart"
+        }
+        import_jobs[job_id] = job
+        logger.info(f"Restored interrupted import job {job_id}")
+
+@app.on_event("startup")
+async def start_prewarm():
+    """Start the timetable pre-warm scheduler (after restore_sessions has brought back logins)"""
+    global prewarm_scheduler
+    if not PREWARM_TIMETABLE:
+        return
+    if direct_reader:
+        # Pre-warming fills the ETag cache, which reads on the direct path never consult
+        logger.info("Direct database reads are on; the pre-warm timetable is ignored")
+        return
+    
     try:
-        # Escape XML characters
-        message = message.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+        timetable = load_timetable(PREWARM_TIMETABLE)
+    except (OSError, ValueError) as e:
+        logger.error(f"Could not load pre-warm timetable {PREWARM_TIMETABLE}: {e}")
+        return
+    
+    prewarm_scheduler = PrewarmScheduler(
+        timetable,
+        login_bindings.bindings,
+        PrewarmFetchers(attendance_service.get_teaching_assignments, prewarm_sessions,
+                        attendance_service.get_session_attendance),
+        lambda: (response_cache.not_modified, response_cache.modified)
+    )
+    prewarm_scheduler.start()
+    logger.info(f"Pre-warming caches for {len(timetable)} timetabled assignments")
+
+@app.on_event("shutdown")
+async def drain_pending_work():
+    """Finish outbound work before the process exits: queued check-in writes, export links, import jobs.
+
+    Runs after the server has stopped accepting and finished in-flight
+    requests, and before the session snapshot is taken. Import jobs still
+    running at the deadline are cancelled; the next process lists them as
+    aborted (restore_import_jobs) and they resume from their checkpoint.
+    """
+    start = time.perf_counter()
+    await checkin_coalescer.drain()
+    pending = set(bot.background_tasks)
+    if pending:
+        _, pending = await asyncio.wait(pending, timeout=SHUTDOWN_DRAIN_TIMEOUT)
+        for task in pending:
+            task.cancel()
+    logger.info(f"Drained pending work in {time.perf_counter() - start:.3f}s ({len(pending)} background tasks cancelled)")
+
+@app.on_event("shutdown")
+async def stop_prewarm():
+    if prewarm_scheduler:
+        await prewarm_scheduler.stop()
+
+@app.on_event("shutdown")
+async def close_direct_reader():
+    if direct_reader:
+        await direct_reader.close()
+
+@app.on_event("shutdown")
+async def close_shard_node():
+    if shard_node:
+        await shard_node.close()
+
+@app.on_event("shutdown")
+async def snapshot_sessions():
+    """Save sessions and logins so the next process can carry on (see restore_sessions)"""
+    if not SESSION_SNAPSHOT_KEY:
+        return
+    
+    start = time.perf_counter()
+    try:
+        size = save_snapshot(
+            SESSION_SNAPSHOT_PATH, SESSION_SNAPSHOT_KEY, user_sessions, login_bindings.bindings, new_user_session
+        )
+        logger.info(f"Saved {len(user_sessions)} sessions ({size} bytes) in {time.perf_counter() - start:.3f}s")
+    except (SnapshotError, OSError) as e:
+        logger.error(f"Could not save session snapshot: {e}")
+
+@app.on_event("shutdown")
+async def flush_traces():
+    """Write out spans still batched in file exporters"""
+    tracer.close()
+
+def create_twiml_response(message: Union[str, List[str]]) -> str:
+    """Create TwiML response for Twilio with enhanced error handling.
+
+    A list of parts (see MessageBuilder) is sent as one <Message> per part.
+    """
+    try:
+        parts = [message] if isinstance(message, str) else message
         
-        # Ensure message is not too long for SMS/WhatsApp
-        if len(message) > 1600:
-            message = message[:1597] + "..."
+        messages = []
+        for part in parts:
+            # Escape XML characters
+            part = part.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+            
+            # Ensure message is not too long for SMS/WhatsApp
+            if len(part) > WHATSAPP_MESSAGE_LIMIT:
+                part = part[:WHATSAPP_MESSAGE_LIMIT - 3] + "..."
+            
+            messages.append(f"    <Message>{part}</Message>")
         
+        body = "\n".join(messages)
         return f"""<?xml version="1.0" encoding="UTF-8"?>
 <Response>
-    <Message>{message}</Message>
+{body}
 </Response>"""
     except Exception as e:
         logger.error(f"Error creating TwiML response: {e}")
@@ -60,13 +250,61 @@ def create_twiml_response(message: str) -> str:
     <Message>Sorry, there was an error processing your request. Please try again.</Message>
 </Response>"""
 
+async def forward_to_owner(request: Request, key: str) -> Optional[Response]:
+    """Replay a request for an export or import job on the instance holding it; None if that is this one"""
+    if not shard_node or shard_node.is_internal(request.headers) or shard_node.owns(key):
+        return None
+    
+    headers = {name: request.headers[name] for name in ("authorization", "content-type") if name in request.headers}
+    path = f"{request.url.path}?{request.url.query}" if request.url.query else request.url.path
+    response = await shard_node.forward(shard_node.owner(key), path, await request.body(), headers, request.method)
+    if response is None:
+        raise HTTPException(status_code=503, detail="The instance holding this resource is unreachable")
+    passed = {name: response.headers[name] for name in ("content-type", "content-disposition") if name in response.headers}
+    return Response(content=response.content, status_code=response.status_code, headers=passed)
+
+async def forward_webhook(request: Request, owner: str) -> Response:
+    """Hand a webhook to the instance that owns its phone (or check-in code)"""
+    headers = {"Content-Type": request.headers.get("content-type", "application/x-www-form-urlencoded")}
+    trace_id = tracer.current_trace_id()
+    if trace_id:
+        headers[TRACE_HEADER] = trace_id
+    
+    with tracer.span("shard_forward", owner=owner):
+        response = await shard_node.forward(owner, "/webhook/whatsapp", await request.body(), headers)
+    
+    if response is None:
+        return Response(content=BUSY_TWIML, media_type="application/xml")
+    return Response(content=response.content, status_code=response.status_code, media_type="application/xml")
+
+def rate_limit_message(decision: RateLimitDecision) -> str:
+    wait = f"{math.ceil(decision.retry_after / 60)} minute(s)" if decision.retry_after >= 60 else f"{math.ceil(decision.retry_after)} seconds"
+    if decision.command_class == "login":
+        return f"🔒 Too many login attempts. Please wait {wait} before trying again."
+    if decision.command_class == "message":
+        return f"⏰ You're sending messages too quickly. Please wait {wait}."
+    return f"⏰ Too many '{decision.command_class}' requests. Please wait {wait} before trying again."
+
 @app.post("/webhook/whatsapp")
 async def whatsapp_webhook(request: Request):
     """Handle incoming WhatsApp messages with comprehensive error handling"""
+    # Peers forwarding a webhook pass their trace id along; a malformed one starts a new trace
+    with tracer.span("webhook", trace_id=inbound_trace_id(request.headers.get(TRACE_HEADER))) as span:
+        response = await process_webhook(request)
+        if span:
+            response.headers[TRACE_HEADER] = span.trace_id
+        return response
+
+
+async def process_webhook(request: Request) -> Response:
     try:
         # Parse form data from Twilio
-        form_data = await request.form()
-        message_data = dict(form_data)
+        with tracer.span("parse_form"):
+            if shard_node:
+                # Keep the raw body around in case the webhook is forwarded
+                await request.body()
+            form_data = await request.form()
+            message_data = dict(form_data)
         
         phone_number = message_data.get("From", "").strip()
         message_body = message_data.get("Body", "").strip()
@@ -89,8 +327,33 @@ async def whatsapp_webhook(request: Request):
         
         logger.info(f"Received message from {phone_number}: {message_body}")
 
-        # Process the message using bot
-        response_message = await bot.process_message(phone_number, message_body)
+        if shard_node and not shard_node.is_internal(request.headers):
+            key = routing_key(phone_number, message_body)
+            owner = shard_node.owner(key)
+            if owner != shard_node.self_url and not shard_node.holds(key):
+                return await forward_webhook(request, owner)
+
+        decision = await rate_limiter.check(phone_number, message_body)
+        if not decision.allowed:
+            logger.warning(f"Rate limited {decision.command_class} message from {phone_number}")
+            return Response(
+                content=create_twiml_response(rate_limit_message(decision)),
+                media_type="application/xml"
+            )
+
+        priority = bot.message_priority(phone_number, message_body)
+        async with admission.slot(priority) as (admitted, waited):
+            span = tracer.current_span()
+            if span:
+                span.set("priority", PRIORITY_NAMES[priority])
+                span.set("queue_wait_ms", round(waited * 1000, 1))
+            
+            if not admitted:
+                logger.warning(f"Shed {PRIORITY_NAMES[priority]} message from {phone_number} after {waited:.2f}s")
+                return Response(content=BUSY_TWIML, media_type="application/xml")
+            
+            # Process the message using bot
+            response_message = await bot.process_message(phone_number, message_body)
 
         # Create and return TwiML response
         twiml_response = create_twiml_response(response_message)
@@ -113,6 +376,385 @@ async def health_check():
     }
 
 
+@app.get("/analytics/assignments/{assignment_id}")
+async def assignment_analytics(
+    assignment_id: str,
+    threshold: float = DEFAULT_THRESHOLD,
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
+    """Per-student attendance percentages, absence streaks and defaulters for an assignment"""
+    if not 0 < threshold <= 100:
+        raise HTTPException(status_code=400, detail=THRESHOLD_ERROR)
+    
+    matrix = await attendance_service.get_attendance_matrix(assignment_id, credentials.credentials)
+    if matrix is None:
+        raise HTTPException(status_code=404, detail="Assignment not found or not authorized")
+    
+    report = matrix.summary(threshold)
+    report["students"] = matrix.student_stats()
+    return report
+
+
+async def require_admin(credentials: HTTPAuthorizationCredentials) -> None:
+    """Archive reports and bulk imports are checked here rather than by the backend"""
+    verification = await attendance_service.verify_token(credentials.credentials)
+    if verification["status"] == "unreachable":
+        raise HTTPException(status_code=503, detail="Could not verify the token")
+    if verification["status"] != "valid" or (verification.get("user") or {}).get("role") != "ADMIN":
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+def require_archive():
+    if attendance_archive is None:
+        raise HTTPException(status_code=404, detail="Attendance archive is not configured")
+    return attendance_archive
+
+
+async def archive_coverage(archive, branch: Optional[str], semester: Optional[int], partial: bool) -> List[str]:
+    """Backfill the selected assignments the archive only has some sessions of.
+
+    Returns the ones still partial; unless partial reports were asked for,
+    refuses with 409 rather than answer from part of their sessions.
+    """
+    missing = await asyncio.to_thread(archive.partial_assignments, branch, semester)
+    if missing:
+        await bot.backfill_archive(missing)
+        missing = await asyncio.to_thread(archive.partial_assignments, branch, semester)
+    if missing and not partial:
+        raise HTTPException(
+            status_code=409,
+            detail=f"{len(missing)} assignments have only some sessions archived and no teacher "
+                   f"conversation to load the rest with; pass partial=true to report on them anyway"
+        )
+    return missing
+
+
+@app.get("/reports/attendance")
+async def attendance_report(
+    group: str = "branch",
+    branch: Optional[str] = None,
+    semester: Optional[int] = None,
+    partial: bool = False,
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
+    """Attendance percentage per branch, course, semester or assignment from the archive (admin token required)"""
+    archive = require_archive()
+    await require_admin(credentials)
+    missing = await archive_coverage(archive, branch, semester, partial)
+    try:
+        rows = await asyncio.to_thread(archive.report, group, branch=branch, semester=semester)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"group": group, "rows": rows, "partialAssignments": missing, "archive": await asyncio.to_thread(archive.stats)}
+
+
+@app.get("/reports/defaulters")
+async def defaulters_report(
+    threshold: float = DEFAULT_THRESHOLD,
+    branch: Optional[str] = None,
+    semester: Optional[int] = None,
+    limit: int = 500,
+    partial: bool = False,
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
+    """Students below the threshold in any archived course, lowest first (admin token required)"""
+    if not 0 < threshold <= 100:
+        raise HTTPException(status_code=400, detail=THRESHOLD_ERROR)
+    archive = require_archive()
+    await require_admin(credentials)
+    missing = await archive_coverage(archive, branch, semester, partial)
+    defaulters = await asyncio.to_thread(
+        archive.defaulters, threshold, branch=branch, semester=semester, limit=max(1, min(limit, 5000))
+    )
+    return {"threshold": threshold, "defaulters": defaulters, "partialAssignments": missing,
+            "archive": await asyncio.to_thread(archive.stats)}
+
+
+@app.get("/exports/assignments/{assignment_id}/register.csv")
+async def stream_register(
+    assignment_id: str,
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
+    """Stream the attendance register of an assignment as CSV, one page of students at a time"""
+    fetch_page = attendance_service.register_page_fetcher(assignment_id, credentials.credentials)
+    
+    # Fetch the first page up front so authorization errors become a proper status code
+    first_page = await fetch_page(None)
+    if first_page is None:
+        raise HTTPException(status_code=404, detail="Assignment not found or not authorized")
+    
+    async def fetch_with_first_page(cursor: Optional[str]) -> Optional[Dict]:
+        return first_page if cursor is None else await fetch_page(cursor)
+    
+    return StreamingResponse(
+        stream_register_csv(fetch_with_first_page),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="register_{assignment_id}.csv"'}
+    )
+
+
+@app.get("/exports/{export_id}")
+async def download_export(export_id: str, request: Request):
+    """Download a finished register export by the id sent to the teacher"""
+    forwarded = await forward_to_owner(request, resource_routing_key("export", export_id))
+    if forwarded:
+        return forwarded
+    
+    export = register_exports.get(export_id)
+    if export is None or not os.path.exists(export["path"]):
+        raise HTTPException(status_code=404, detail="Export not found or expired")
+    
+    return FileResponse(export["path"], filename=export["filename"])
+
+
+async def run_import_job(job: Dict, user_token: str):
+    """Run (or resume) a bulk import job in the background"""
+    job["status"] = "running"
+    importer = BulkImporter(user_token)
+    job["importer"] = importer
+    try:
+        job["summary"] = await importer.run(job["csv_path"], job["checkpoint_path"], job["results_path"])
+        job["status"] = "completed"
+        # The upload carries passwords; nothing needs it once every row is imported
+        try:
+            os.remove(job["csv_path"])
+        except OSError as e:
+            logger.error(f"Could not delete the upload of import job {job['id']}: {e}")
+    except ImportAborted as e:
+        job["status"] = "aborted"
+        job["error"] = str(e)
+    except asyncio.CancelledError:
+        job["status"] = "aborted"
+        job["error"] = "Interrupted by shutdown"
+        raise
+    except Exception as e:
+        logger.error(f"Import job {job['id']} failed: {e}")
+        job["status"] = "failed"
+        job["error"] = str(e)
+
+
+def start_import_job(job: Dict, user_token: str):
+    job["status"] = "queued"
+    job["error"] = None
+    task = asyncio.create_task(run_import_job(job, user_token))
+    bot.background_tasks.add(task)
+    task.add_done_callback(bot.background_tasks.discard)
+
+
+@app.post("/admin/import")
+async def start_import(
+    file: UploadFile = File(...),
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
+    """Upload a student CSV and import it in the background (admin token required)"""
+    await require_admin(credentials)
+    os.makedirs(IMPORT_DIR, mode=0o700, exist_ok=True)
+    job_id = secrets.token_urlsafe(12)
+    while shard_node and not shard_node.owns(resource_routing_key("import", job_id)):
+        job_id = secrets.token_urlsafe(12)
+    csv_path = os.path.join(IMPORT_DIR, f"{job_id}.csv")
+    
+    # Copy the upload to disk in chunks rather than reading it into memory; only this user may read it
+    with os.fdopen(os.open(csv_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), "wb") as f:
+        while chunk := await file.read(1024 * 1024):
+            f.write(chunk)
+    
+    job = {
+        "id": job_id,
+        "filename": file.filename,
+        "csv_path": csv_path,
+        "checkpoint_path": os.path.join(IMPORT_DIR, f"{job_id}.checkpoint.json"),
+        "results_path": os.path.join(IMPORT_DIR, f"{job_id}.results.csv"),
+        "summary": None,
+        "error": None
+    }
+    import_jobs[job_id] = job
+    start_import_job(job, credentials.credentials)
+    return {"jobId": job_id, "status": job["status"]}
+
+
+@app.get("/admin/import/{job_id}")
+async def import_status(
+    job_id: str,
+    request: Request,
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
+    """Progress of a bulk import job (admin token required)"""
+    forwarded = await forward_to_owner(request, resource_routing_key("import", job_id))
+    if forwarded:
+        return forwarded
+    
+    await require_admin(credentials)
+    job = import_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    
+    try:
+        progress = job["importer"].progress if job.get("importer") else load_checkpoint(job["checkpoint_path"])
+    except (OSError, ValueError) as e:
+        logger.error(f"Could not read the checkpoint of import job {job_id}: {e}")
+        progress = {}
+    return {
+        "jobId": job_id,
+        "filename": job["filename"],
+        "status": job["status"],
+        "lastRow": progress.get("last_row", 0),
+        "summary": job["summary"] or progress.get("summary", {}),
+        "error": job["error"]
+    }
+
+
+@app.post("/admin/import/{job_id}/resume")
+async def resume_import(
+    job_id: str,
+    request: Request,
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
+    """Resume an aborted or failed import from its last checkpoint (admin token required)"""
+    forwarded = await forward_to_owner(request, resource_routing_key("import", job_id))
+    if forwarded:
+        return forwarded
+    
+    await require_admin(credentials)
+    job = import_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    if job["status"] in ("queued", "running", "completed"):
+        raise HTTPException(status_code=409, detail=f"Import job is {job['status']}")
+    
+    start_import_job(job, credentials.credentials)
+    return {"jobId": job_id, "status": job["status"]}
+
+
+@app.get("/admin/import/{job_id}/results")
+async def import_results(
+    job_id: str,
+    request: Request,
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
+    """Per-row results CSV of a bulk import job (admin token required)"""
+    forwarded = await forward_to_owner(request, resource_routing_key("import", job_id))
+    if forwarded:
+        return forwarded
+    
+    await require_admin(credentials)
+    job = import_jobs.get(job_id)
+    if job is None or not os.path.exists(job["results_path"]):
+        raise HTTPException(status_code=404, detail="Import results not found")
+    
+    return FileResponse(job["results_path"], filename=f"import_results_{job_id}.csv", media_type="text/csv")
+
+
+def require_shard_secret(request: Request):
+    if shard_node is None:
+        raise HTTPException(status_code=404, detail="Sharding is not enabled")
+    if not shard_node.is_internal(request.headers):
+        raise HTTPException(status_code=403, detail="Invalid shard secret")
+
+
+@app.get("/internal/shard")
+async def shard_status(request: Request):
+    """This instance's ring membership and forwarding counters"""
+    require_shard_secret(request)
+    return shard_node.stats()
+
+
+@app.post("/internal/shard/sessions")
+async def receive_sessions(request: Request):
+    """Accept sessions handed off by a peer after a membership change"""
+    require_shard_secret(request)
+    accepted = shard_node.accept_handoff(await request.json())
+    return {"accepted": accepted}
+
+
+@app.post("/internal/shard/membership")
+async def update_membership(request: Request):
+    """Switch to a new peer list (sent to every instance) and hand off sessions owned elsewhere"""
+    require_shard_secret(request)
+    peers = [peer.rstrip("/") for peer in (await request.json()).get("peers", [])]
+    try:
+        moved = await shard_node.set_peers(peers)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"peers": shard_node.ring.nodes, "handedOff": moved}
+
+
+@app.get("/metrics/admission")
+async def admission_metrics():
+    """Webhook concurrency, queue wait and shed counts"""
+    return admission.metrics()
+
+
+@app.get("/metrics/rate-limit")
+async def rate_limit_metrics():
+    """Messages allowed and denied by the per-phone rate limiter"""
+    return rate_limiter.stats()
+
+
+@app.get("/metrics/prewarm")
+async def prewarm_metrics():
+    """Upcoming period and, per past period, warm-up counts and the cache hit ratio at its start"""
+    if not prewarm_scheduler:
+        raise HTTPException(status_code=404, detail="Pre-warming is not configured")
+    return prewarm_scheduler.stats()
+
+
+@app.get("/metrics/direct-reads")
+async def direct_read_metrics():
+    """Reads answered from the database directly, refused, and handed back to the HTTP API"""
+    if not direct_reader:
+        raise HTTPException(status_code=404, detail="Direct database reads are not configured")
+    return direct_reader.stats()
+
+
+@app.get("/metrics/logins")
+async def login_metrics():
+    """Stored phone logins and how often they spared a password login"""
+    return login_bindings.stats()
+
+
+@app.get("/debug/traces")
+async def debug_traces(
+    trace_id: Optional[str] = None,
+    name: Optional[str] = None,
+    min_duration_ms: float = 0,
+    limit: int = 100
+):
+    """Recent spans, newest first (debug endpoint)"""
+    return {
+        "enabled": tracer.enabled,
+        "buffered": len(tracer.buffer.spans),
+        "spans": tracer.buffer.query(trace_id, name, min_duration_ms, min(limit, 1000))
+    }
+
+
+@app.get("/debug/traces/{trace_id}")
+async def debug_trace(trace_id: str):
+    """All buffered spans of one trace, in start order (debug endpoint)"""
+    spans = tracer.buffer.trace(trace_id)
+    if not spans:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return {"traceId": trace_id, "spans": spans}
+
+
+@app.get("/debug/student-cache")
+async def debug_student_cache():
+    """Return hit/miss statistics for the student attendance cache"""
+    return student_attendance_cache.stats()
+
+
+@app.get("/debug/response-cache")
+async def debug_response_cache():
+    """Return conditional GET statistics for cached rosters, sessions and assignments"""
+    return response_cache.stats()
+
+
+@app.get("/debug/roster-cache")
+async def debug_roster_cache():
+    """Return sharing and memory statistics for class section rosters"""
+    return roster_cache.stats()
+
+
 @app.get("/debug/sessions")
 async def debug_sessions():
     """Return sanitized active session data for debugging"""
@@ -121,6 +763,7 @@ async def debug_sessions():
             phone: {
                 k: (v if k != "user_token" else "***")  # Mask tokens
                 for k, v in session.items()
+                if k not in ("roster", "name_index")  # shared; see /debug/roster-cache
             }
             for phone, session in user_sessions.items()
         }
@@ -134,5 +777,6 @@ async def debug_sessions():
 
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="localhost", port=8001)
+    # Same as python server.py; see there for workers, event loop and draining options
+    from server import main
+    main(app)
@@ -0,0 +1,92 @@
+from typing import Dict, Iterable, List, Union
+
+from models import AttendanceRecord
+
+# WhatsApp (via Twilio) rejects message bodies longer than this
+WHATSAPP_MESSAGE_LIMIT = 1600
+
+# Space kept free in every part for the "(i/n)" header and the truncation notice
+PART_RESERVE = 40
+TRUNCATION_NOTICE = "... (message truncated)"
+
+
+def format_student_line(record: AttendanceRecord) -> str:
+    """Format the display line for one attendance record: '<roll> - <name>'"""
+    student = record.student or {}
+    user = student.get('user') or {}
+    name = f"{user.get('firstName', '')} {user.get('lastName', '')}".strip()
+    roll_number = student.get('rollNumber') or 'N/A'
+    return f"{roll_number} - {name}"
+
+
+def build_roster_lines(attendance_records: List[AttendanceRecord]) -> Dict[str, str]:
+    """Precompute studentId -> display line for a roster"""
+    return {
+        record.studentId: format_student_line(record)
+        for record in attendance_records
+    }
+
+
+class MessageBuilder:
+    """Collects reply lines and assembles them into WhatsApp sized parts.
+
+    Lines are kept in per-part lists and joined once in build(). When a line
+    would push the current part over the limit a new part is started, so long
+    replies are split into numbered parts instead of being cut off.
+    """
+
+    def __init__(self, limit: int = WHATSAPP_MESSAGE_LIMIT, max_parts: int = 10):
+        self.budget = limit - PART_RESERVE
+        self.max_parts = max_parts
+        self.parts: List[List[str]] = [[]]
+        self.part_size = 0
+        self.truncated = False
+
+    def add(self, line: str = "") -> "MessageBuilder":
+        """Append a line (may contain newlines) to the reply"""
+        if self.truncated:
+            return self
+
+        # Hard-split lines that could never fit in a single part
+        while len(line) > self.budget:
+            self.add(line[:self.budget])
+            line = line[self.budget:]
+
+        current = self.parts[-1]
+        needed = len(line) + (1 if current else 0)
+
+        if self.part_size + needed > self.budget:
+            if len(self.parts) >= self.max_parts:
+                self.truncated = True
+                return self
+            current = []
+            self.parts.append(current)
+            self.part_size = 0
+            needed = len(line)
+            if not line:
+                # Don't start a new part with a blank line
+                return self
+
+        current.append(line)
+        self.part_size += needed
+        return self
+
+    def extend(self, lines: Iterable[str], prefix: str = "") -> "MessageBuilder":
+        """Append several lines, optionally prefixing each one"""
+        for line in lines:
+            self.add(f"{prefix}{line}")
+        return self
+
+    def build(self) -> Union[str, List[str]]:
+        """Return the reply as one string, or numbered parts when it had to be split"""
+        if self.truncated:
+            self.parts[-1].append(TRUNCATION_NOTICE)
+
+        if len(self.parts) == 1:
+            return "\n".join(self.parts[0])
+
+        total = len(self.parts)
+        return [
+            f"({i}/{total})\n" + "\n".join(lines)
+            for i, lines in enumerate(self.parts, 1)
+        ]
@@ -0,0 +1,69 @@
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, ConfigDict
+
+
+class BackendModel(BaseModel):
+    # Keep fields the backend adds later instead of failing or dropping them
+    model_config = ConfigDict(extra="allow")
+
+
+class TeachingAssignment(BackendModel):
+    id: str
+    teacherId: str
+    courseId: str
+    branchId: str
+    semester: int
+    section: str
+    academicYear: str
+    active: bool
+    course: Dict[str, Any]
+    branch: Dict[str, Any]
+
+
+class Session(BackendModel):
+    id: str
+    date: str
+    topic: Optional[str] = None
+    assignmentId: Optional[str] = None
+
+
+class SessionPage(BackendModel):
+    """GET /api/teachers/sessions/:assignmentId with a limit"""
+    sessions: List[Session] = []
+    nextCursor: Optional[str] = None
+
+
+class AttendanceRecord(BackendModel):
+    sessionId: str
+    studentId: str
+    present: bool = False
+    id: Optional[str] = None
+    enrollmentId: Optional[str] = None
+    markedAt: Optional[str] = None
+    student: Optional[Dict[str, Any]] = None
+
+
+class AttendanceChanges(BackendModel):
+    """GET /api/teachers/sessions/:sessionId/attendance?since=<markedAt>"""
+    records: List[AttendanceRecord]
+    cursor: Optional[str] = None
+
+
+class StudentInfo(BackendModel):
+    id: str
+    rollNumber: Optional[str] = None
+    user: Optional[Dict[str, Any]] = None
+
+    @property
+    def name(self) -> str:
+        user = self.user or {}
+        return f"{user.get('firstName', '')} {user.get('lastName', '')}".strip()
+
+
+class AssignmentAttendance(BackendModel):
+    """One page (or all) of GET /api/teachers/assignments/:id/attendance"""
+    sessions: List[Session] = []
+    students: List[StudentInfo] = []
+    records: List[AttendanceRecord] = []
+    nextCursor: Optional[str] = None
@@ -0,0 +1,164 @@
+"""Trigram index for resolving student names in a roster.
+
+Names are case-folded, stripped of accents and split into words, padded
+like pg_trgm pads them ("  rahul  sharma "), so word starts weigh a little
+more and typos still share most trigrams. A query is scored against a name
+by the trigrams they share, relative to the query's own trigrams, with a
+light penalty for the rest of the name:
+
+    score = shared / (query + EXTRA_WEIGHT * (name - shared))
+
+so "Priya" matches every Priya about equally well, "Rahul Sharma" matches
+Rahul Sharma far better than Rahul Verma, and "Rahul Shrama" still finds him.
+
+A trigram is packed into one integer (21 bits per code point), so the whole
+roster is indexed with a few NumPy passes over its concatenated names
+instead of a Python loop per name.
+"""
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import re
+import unicodedata
+
+import numpy as np
+
+# Weight of name trigrams the query doesn't cover
+EXTRA_WEIGHT = 0.25
+# Below this a candidate is not considered a match at all
+MIN_SCORE = 0.45
+# Candidates within this of the best one are too close to pick between
+CLOSE_MARGIN = 0.1
+MAX_CANDIDATES = 5
+
+# Separates names in the concatenated roster text; survives normalize()
+SEPARATOR = "\x00"
+NON_WORD = re.compile(r"[^\w\x00]+|_")
+
+
+def normalize(text: str) -> str:
+    """Case-folded words separated by single spaces, without accents or punctuation"""
+    text = text.casefold()
+    if text.isascii() and text.replace(" ", "").replace(SEPARATOR, "").isalpha():
+        return text
+    if not text.isascii():
+        text = "".join(char for char in unicodedata.normalize("NFKD", text) if not unicodedata.combining(char))
+    return NON_WORD.sub(" ", text)
+
+
+def padded(words: str) -> str:
+    """Two spaces before each word and one after: 'rahul sharma' -> '  rahul  sharma '"""
+    return "  " + words.replace(" ", "  ") + " "
+
+
+def trigram_codes(name: str) -> Set[int]:
+    text = padded(" ".join(normalize(name).split()))
+    points = [ord(char) for char in text]
+    return {(a << 42) | (b << 21) | c for a, b, c in zip(points, points[1:], points[2:])}
+
+
+def student_name(record: Dict) -> str:
+    user = (record.get('student') or {}).get('user') or {}
+    return f"{user.get('firstName', '')} {user.get('lastName', '')}"
+
+
+class NameIndex:
+    """Trigram postings over one roster's student names, built once per cached roster.
+
+    codes holds each distinct trigram once, sorted; the students having
+    codes[i] are students[offsets[i]:offsets[i + 1]], and sizes holds how
+    many distinct trigrams each student's name has.
+    """
+    __slots__ = ("records", "codes", "offsets", "students", "sizes")
+
+    def __init__(self, records: Iterable[Dict]):
+        self.records: List[Dict] = list(records)
+        text = " ".join(normalize(SEPARATOR.join([student_name(record) for record in self.records])).split())
+        text = text.replace(" " + SEPARATOR, SEPARATOR).replace(SEPARATOR + " ", SEPARATOR)
+        text = padded(text).replace(SEPARATOR, " " + SEPARATOR + "  ")
+        points = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+
+        # Trigram at each position, and whose name it is in; windows touching a separator are dropped
+        owners = np.cumsum(points == 0)[:-2]
+        valid = (points[:-2] != 0) & (points[1:-1] != 0) & (points[2:] != 0)
+        codes = (points[:-2] << np.uint64(42)) | (points[1:-1] << np.uint64(21)) | points[2:]
+        codes, owners = codes[valid], owners[valid]
+
+        # Distinct (trigram, student) pairs, grouped by trigram
+        order = np.lexsort((owners, codes))
+        codes, owners = codes[order], owners[order]
+        distinct = np.ones(len(codes), dtype=bool)
+        distinct[1:] = (codes[1:] != codes[:-1]) | (owners[1:] != owners[:-1])
+        codes, owners = codes[distinct], owners[distinct]
+
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.zeros(0, dtype=np.int64)
+        self.codes = codes[starts]
+        self.offsets = np.r_[starts, len(codes)]
+        self.students = owners.astype(np.int32)
+        self.sizes = np.bincount(self.students, minlength=len(self.records))
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def scores(self, query: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Score and coverage of every name for a query, or None when no name shares a trigram.
+
+        coverage is the share of the query's trigrams found in the name,
+        whatever else the name has.
+        """
+        grams = np.fromiter(trigram_codes(query), dtype=np.uint64)
+        if not len(grams) or not len(self.codes):
+            return None
+        found = np.searchsorted(self.codes, grams)
+        inside = found < len(self.codes)
+        found = found[inside][self.codes[found[inside]] == grams[inside]]
+        if not len(found):
+            return None
+
+        matched = np.concatenate([self.students[self.offsets[i]:self.offsets[i + 1]] for i in found])
+        shared = np.bincount(matched, minlength=len(self.records))
+        return shared / (len(grams) + EXTRA_WEIGHT * (self.sizes - shared)), shared / len(grams)
+
+    def best(self, scores: np.ndarray, positions: np.ndarray, limit: int) -> List[Tuple[float, Dict]]:
+        if len(positions) > limit:
+            positions = positions[np.argpartition(-scores[positions], limit - 1)[:limit]]
+        positions = positions[np.argsort(-scores[positions], kind="stable")]
+        return [(round(float(scores[i]), 3), self.records[i]) for i in positions]
+
+    def search(self, query: str, limit: int = MAX_CANDIDATES) -> List[Tuple[float, Dict]]:
+        """Best matching records for a name, as (score, record), best first"""
+        scored = self.scores(query)
+        if scored is None:
+            return []
+        return self.best(scored[0], np.flatnonzero(scored[1]), limit)
+
+    def mask(self, student_ids: Set[str]) -> np.ndarray:
+        """Which records are of the given students, for resolve()"""
+        return np.fromiter((record.get("studentId") in student_ids for record in self.records),
+                           dtype=bool, count=len(self.records))
+
+    def resolve(self, query: str,
+                allowed: Optional[np.ndarray] = None) -> Tuple[Optional[Dict], List[Tuple[float, Dict]]]:
+        """The record a name refers to, or None and the close candidates to choose from.
+
+        Candidates are close when the query is about as fully found in their
+        names as in the best covered one, so "Priya" lists the Priyas whatever
+        their surnames. The candidate list is empty when nothing matches well enough.
+        With an allowed mask (see mask()) only those records are considered.
+        """
+        scored = self.scores(query)
+        if scored is None:
+            return None, []
+        scores, coverage = scored
+        if allowed is not None:
+            scores, coverage = np.where(allowed, scores, 0.0), np.where(allowed, coverage, 0.0)
+        close = np.flatnonzero((coverage > coverage.max() - CLOSE_MARGIN) & (scores >= MIN_SCORE))
+        if not len(close):
+            return None, []
+        if len(close) == 1:
+            return self.records[close[0]], []
+        return None, self.best(scores, close, MAX_CANDIDATES)
+
+
+def split_names(message: str) -> List[str]:
+    """Names from 'Rahul Sharma, Priya and Anil K' (commas, semicolons, new lines, '&' or 'and')"""
+    parts = re.split(r"[,;&\n]|\band\b", message, flags=re.IGNORECASE)
+    return [part.strip() for part in parts if part.strip()]
@@ -0,0 +1,230 @@
+"""Timetable-driven cache pre-warming.
+
+Teachers tend to open the bot in the few minutes around the start of a class
+period, so assignment lists, session lists and rosters are all fetched at
+once. A few minutes before each period in the timetable, the scheduler
+refreshes these for every teacher with a bound login who teaches one of that
+period's assignments. It fills the revalidation cache, so the teachers' own
+fetches are answered with cheap 304s. Warm-ups are spread with jitter and run
+with bounded concurrency, so the warm-up itself doesn't become the spike.
+With DIRECT_DATABASE_URL set those reads skip the cache, so there is nothing
+to warm and the timetable is ignored.
+
+The timetable is a JSON file mapping assignment ids to weekly period starts
+in local time:
+
+    {"<assignmentId>": ["mon 09:00", "wed 11:15"], ...}
+"""
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+from collections import deque
+from datetime import datetime, time as clock_time, timedelta
+import asyncio
+import json
+import logging
+import os
+import random
+
+from models import Session, TeachingAssignment
+
+logger = logging.getLogger(__name__)
+
+PREWARM_TIMETABLE = os.getenv("PREWARM_TIMETABLE")
+# How long before a period starts the warm-up begins, and how far it is spread
+PREWARM_LEAD = timedelta(minutes=int(os.getenv("PREWARM_LEAD_MINUTES", "5")))
+PREWARM_JITTER = timedelta(minutes=2)
+PREWARM_CONCURRENCY = int(os.getenv("PREWARM_CONCURRENCY", "8"))
+# Backend fetches in this window after a period starts count towards its hit ratio
+HIT_RATIO_WINDOW = timedelta(minutes=10)
+MAX_PERIOD_REPORTS = 50
+# A teacher's assignment list is fetched again after this long even if no warmed period needed it
+TAUGHT_TTL = timedelta(days=1)
+
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+
+class Slot(NamedTuple):
+    weekday: int
+    start: clock_time
+
+
+class PrewarmFetchers(NamedTuple):
+    """The service calls a warm-up makes, each taking the teacher's token"""
+    assignments: Callable[[str], Awaitable[List[TeachingAssignment]]]
+    sessions: Callable[[str, str], Awaitable[List[Session]]]
+    roster: Callable[[str, str], Awaitable[object]]
+
+
+def parse_slot(value: str) -> Slot:
+    day, _, start = value.strip().partition(" ")
+    if day.lower()[:3] not in WEEKDAYS:
+        raise ValueError(f"Unknown weekday in period {value!r}")
+    try:
+        hour, minute = (int(part) for part in start.split(":"))
+        return Slot(WEEKDAYS.index(day.lower()[:3]), clock_time(hour, minute))
+    except ValueError:
+        raise ValueError(f"Period {value!r} should look like 'mon 09:00'")
+
+
+def parse_timetable(data: Dict[str, List[str]]) -> Dict[str, List[Slot]]:
+    if not isinstance(data, dict):
+        raise ValueError("The timetable should map assignment ids to lists of periods")
+    return {assignment_id: [parse_slot(slot) for slot in slots] for assignment_id, slots in data.items()}
+
+
+def load_timetable(path: str) -> Dict[str, List[Slot]]:
+    with open(path) as f:
+        return parse_timetable(json.load(f))
+
+
+def next_period(timetable: Dict[str, List[Slot]], after: datetime) -> Optional[Tuple[datetime, Set[str]]]:
+    """The first period start strictly after a time, and the assignments meeting then"""
+    upcoming: Dict[datetime, Set[str]] = {}
+    for assignment_id, slots in timetable.items():
+        for slot in slots:
+            days_ahead = (slot.weekday - after.weekday()) % 7
+            start = datetime.combine(after.date() + timedelta(days=days_ahead), slot.start)
+            if start <= after:
+                start += timedelta(days=7)
+            upcoming.setdefault(start, set()).add(assignment_id)
+    if not upcoming:
+        return None
+    start = min(upcoming)
+    return start, upcoming[start]
+
+
+class PrewarmScheduler:
+    """Warms each teacher's caches ahead of their class periods.
+
+    bindings is the phone -> login binding dict (see loginBinding); only
+    teachers whose login is still bound are warmed. counters returns the
+    revalidation cache's (not modified, modified) totals, used for the
+    per-period hit ratio.
+    """
+
+    def __init__(self, timetable: Dict[str, List[Slot]], bindings: Dict[str, Dict],
+                 fetchers: PrewarmFetchers, counters: Callable[[], Tuple[int, int]],
+                 lead: timedelta = PREWARM_LEAD, jitter: timedelta = PREWARM_JITTER,
+                 concurrency: int = PREWARM_CONCURRENCY, window: timedelta = HIT_RATIO_WINDOW):
+        self.timetable = timetable
+        self.bindings = bindings
+        self.fetchers = fetchers
+        self.counters = counters
+        self.lead = lead
+        self.jitter = jitter
+        self.concurrency = concurrency
+        self.window = window
+        self.reports = deque(maxlen=MAX_PERIOD_REPORTS)
+        self.task: Optional[asyncio.Task] = None
+        self.measurements: Set[asyncio.Task] = set()
+        self.upcoming: Optional[Tuple[datetime, Set[str]]] = None
+        # token -> (assignment ids, when learned), so teachers of other periods aren't fetched every period
+        self.taught: Dict[str, Tuple[Set[str], datetime]] = {}
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        tasks = [task for task in (self.task, *self.measurements) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.task = None
+
+    async def run(self):
+        last_start = datetime.now()
+        while True:
+            self.upcoming = next_period(self.timetable, last_start)
+            if self.upcoming is None:
+                return
+            start, assignment_ids = self.upcoming
+            await asyncio.sleep(max((start - self.lead - datetime.now()).total_seconds(), 0))
+
+            report = {"periodStart": start.isoformat(), "assignments": sorted(assignment_ids)}
+            self.reports.append(report)
+            try:
+                report.update(await self.prewarm(assignment_ids))
+            except Exception as e:
+                logger.error(f"Pre-warm for the {start:%a %H:%M} period failed: {e}")
+                report["error"] = str(e)
+
+            # Measured alongside, so a period starting within the window is still warmed in time
+            measurement = asyncio.create_task(self.measure(report, start))
+            self.measurements.add(measurement)
+            measurement.add_done_callback(self.measurements.discard)
+            last_start = start
+
+    async def measure(self, report: Dict, start: datetime):
+        """Hit ratio of the revalidation cache over the window after a period starts"""
+        await asyncio.sleep(max((start - datetime.now()).total_seconds(), 0))
+        before = self.counters()
+        await asyncio.sleep(self.window.total_seconds())
+        report.update(self.hit_ratio(before, self.counters()))
+
+    def teacher_tokens(self) -> Dict[str, str]:
+        """Token per bound teacher login (one per token if several phones share it)"""
+        now = datetime.now()
+        return {
+            binding["token"]: phone
+            for phone, binding in list(self.bindings.items())
+            if now < binding["expires_at"] and (binding.get("user_info") or {}).get("role") == "TEACHER"
+        }
+
+    async def prewarm(self, assignment_ids: Set[str]) -> Dict:
+        """Refresh assignments, recent sessions and the latest roster for each bound teacher of these assignments"""
+        tokens = self.teacher_tokens()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        counts = {"teachers": 0, "fetches": 0, "errors": 0}
+        started = datetime.now()
+
+        async def warm(token: str):
+            known = self.taught.get(token)
+            if known and not known[0] & assignment_ids and started - known[1] < TAUGHT_TTL:
+                return  # teaches none of this period's assignments
+            await asyncio.sleep(random.uniform(0, self.jitter.total_seconds()))
+            async with semaphore:
+                try:
+                    assignments = await self.fetchers.assignments(token)
+                    counts["fetches"] += 1
+                    self.taught[token] = ({a.id for a in assignments}, datetime.now())
+                    taught = [a for a in assignments if a.id in assignment_ids]
+                    if taught:
+                        counts["teachers"] += 1
+                    for assignment in taught:
+                        sessions = await self.fetchers.sessions(assignment.id, token)
+                        counts["fetches"] += 1
+                        if sessions:
+                            await self.fetchers.roster(sessions[0].id, token)
+                            counts["fetches"] += 1
+                except Exception as e:
+                    counts["errors"] += 1
+                    logger.warning(f"Pre-warm for {tokens[token]} failed: {e}")
+
+        await asyncio.gather(*(warm(token) for token in tokens))
+        for token in set(self.taught) - set(tokens):
+            del self.taught[token]
+        logger.info(f"Pre-warmed {counts['teachers']} teachers ({counts['fetches']} fetches) "
+                    f"for assignments {sorted(assignment_ids)}")
+        return {**counts, "boundLogins": len(tokens), "durationSeconds": round((datetime.now() - started).total_seconds(), 2)}
+
+    @staticmethod
+    def hit_ratio(before: Tuple[int, int], after: Tuple[int, int]) -> Dict:
+        hits = after[0] - before[0]
+        misses = after[1] - before[1]
+        return {
+            "periodHits": hits,
+            "periodMisses": misses,
+            "periodHitRatio": round(hits / (hits + misses), 3) if hits + misses else None
+        }
+
+    def stats(self) -> Dict:
+        upcoming = None
+        if self.upcoming:
+            start, assignment_ids = self.upcoming
+            upcoming = {"periodStart": start.isoformat(), "assignments": sorted(assignment_ids)}
+        return {
+            "running": self.task is not None and not self.task.done(),
+            "assignments": len(self.timetable),
+            "upcoming": upcoming,
+            "periods": list(self.reports)
+        }
@@ -0,0 +1,172 @@
+from typing import Dict, NamedTuple, Optional, Tuple
+from collections import OrderedDict
+import logging
+import math
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Shared store used when set (e.g. redis://localhost:6379/0), so every worker sees the same buckets
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL")
+# Buckets kept by the in-memory store; the least recently used phone is forgotten first
+MAX_BUCKETS = 50000
+
+
+class BucketLimit(NamedTuple):
+    capacity: float
+    refill_per_second: float
+
+
+# Every message spends from "message"; some commands also spend from their own class
+RATE_LIMITS: Dict[str, BucketLimit] = {
+    "message": BucketLimit(30, 0.5),          # bursts of 30, then one message every 2 seconds
+    "login": BucketLimit(5, 1 / 180),         # 5 attempts, then one more every 3 minutes
+    "checkin": BucketLimit(3, 1 / 20),
+    "report": BucketLimit(3, 1 / 60)          # exports and defaulter lists hit the backend hardest
+}
+COMMAND_CLASSES = {
+    "login": "login",
+    "checkin": "checkin",
+    "export": "report",
+    "defaulters": "report"
+}
+
+
+class RateLimitDecision(NamedTuple):
+    allowed: bool
+    command_class: str
+    retry_after: float
+
+
+def command_class(message: str) -> Optional[str]:
+    words = message.lower().split()
+    return COMMAND_CLASSES.get(words[0]) if words else None
+
+
+class MemoryBucketStore:
+    """Token buckets in a bounded LRU dict; state is per process"""
+
+    def __init__(self, max_buckets: int = MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self.buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def take(self, key: str, limit: BucketLimit, cost: float = 1) -> Tuple[bool, float]:
+        """Spend cost tokens if available; returns (allowed, tokens left)"""
+        now = time.monotonic()
+        tokens, updated = self.buckets.get(key, (limit.capacity, now))
+        tokens = min(limit.capacity, tokens + (now - updated) * limit.refill_per_second)
+
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+
+        self.buckets[key] = (tokens, now)
+        self.buckets.move_to_end(key)
+        if len(self.buckets) > self.max_buckets:
+            self.buckets.popitem(last=False)
+        return allowed, tokens
+
+
+# Refill, spend and store in one round trip. Uses the server clock so workers agree,
+# and expires the key once the bucket would be full again.
+TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + (now - updated) * rate)
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate * 1000) + 1000)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisBucketStore:
+    """Token buckets in Redis, shared by all workers and instances (requires the redis package)"""
+
+    def __init__(self, url: str, prefix: str = "ratelimit:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_REDIS_URL is set but the redis package is not installed")
+
+        self.client = redis.from_url(url)
+        self.prefix = prefix
+        self.script = self.client.register_script(TAKE_SCRIPT)
+
+    async def take(self, key: str, limit: BucketLimit, cost: float = 1) -> Tuple[bool, float]:
+        allowed, tokens = await self.script(
+            keys=[self.prefix + key],
+            args=[limit.capacity, limit.refill_per_second, cost]
+        )
+        return bool(allowed), float(tokens)
+
+
+class RateLimiter:
+    """Per-phone token buckets, one for all messages plus one per command class.
+
+    If the store fails the message is let through: the limiter protects the
+    backend, it must not take the bot down with it.
+    """
+
+    def __init__(self, store, limits: Dict[str, BucketLimit] = RATE_LIMITS):
+        self.store = store
+        self.limits = limits
+        self.allowed = 0
+        self.denied = {name: 0 for name in limits}
+
+    async def _take(self, phone_number: str, name: str, cost: float = 1) -> Tuple[bool, float]:
+        try:
+            return await self.store.take(f"{phone_number}:{name}", self.limits[name], cost)
+        except Exception as e:
+            logger.error(f"Rate limit store error for {phone_number}: {e}")
+            return True, self.limits[name].capacity
+
+    def _retry_after(self, name: str, tokens: float) -> float:
+        return max(0.0, (1 - tokens) / self.limits[name].refill_per_second)
+
+    async def check(self, phone_number: str, message: str) -> RateLimitDecision:
+        """Spend a token for the message (and its command class); decide whether to process it"""
+        allowed, tokens = await self._take(phone_number, "message")
+        if not allowed:
+            self.denied["message"] += 1
+            return RateLimitDecision(False, "message", self._retry_after("message", tokens))
+
+        name = command_class(message)
+        if name:
+            allowed, tokens = await self._take(phone_number, name)
+            if not allowed:
+                self.denied[name] += 1
+                return RateLimitDecision(False, name, self._retry_after(name, tokens))
+
+        self.allowed += 1
+        return RateLimitDecision(True, name or "message", 0.0)
+
+    async def remaining(self, phone_number: str, name: str) -> int:
+        """Whole tokens left in a bucket, without spending any"""
+        _, tokens = await self._take(phone_number, name, cost=0)
+        return math.floor(tokens)
+
+    def stats(self) -> Dict:
+        return {
+            "store": type(self.store).__name__,
+            "allowed": self.allowed,
+            "denied": dict(self.denied),
+            "limits": {name: limit._asdict() for name, limit in self.limits.items()}
+        }
+
+
+def create_rate_limiter() -> RateLimiter:
+    if RATE_LIMIT_REDIS_URL:
+        return RateLimiter(RedisBucketStore(RATE_LIMIT_REDIS_URL))
+    return RateLimiter(MemoryBucketStore())
@@ -0,0 +1,201 @@
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+from datetime import datetime, timedelta
+import asyncio
+import csv
+import io
+import logging
+import os
+import secrets
+import tempfile
+
+from models import AssignmentAttendance, Session
+
+logger = logging.getLogger(__name__)
+
+# Where finished exports are written, and how long their download links stay valid
+EXPORT_DIR = os.getenv("EXPORT_DIR", os.path.join(tempfile.gettempdir(), "attendance_exports"))
+EXPORT_TTL = timedelta(hours=1)
+# Students fetched from the backend per page while exporting
+EXPORT_PAGE_SIZE = 200
+EXPORT_FORMATS = ("csv", "xlsx")
+# Flush streamed CSV to the client in chunks of roughly this many characters
+STREAM_CHUNK_SIZE = 64 * 1024
+# Register rows handed to the file-writing thread at a time
+WRITE_BATCH_ROWS = EXPORT_PAGE_SIZE
+
+# Fetches one page of /assignments/:id/attendance given the previous page's cursor
+FetchPage = Callable[[Optional[str]], Awaitable[Optional[AssignmentAttendance]]]
+
+
+class RegisterExportError(Exception):
+    """Raised when a page of the attendance register could not be fetched"""
+
+
+def session_header(session: Session) -> str:
+    date_str = session.date.split('T')[0]
+    return f"{date_str} {session.topic}" if session.topic else date_str
+
+
+async def iter_register_rows(fetch_page: FetchPage) -> AsyncIterator[List]:
+    """Yield the register header and then one row per student, a page at a time.
+
+    Only the current page of students and their records is held in memory.
+    """
+    sessions = None
+    column: Dict[str, int] = {}
+    cursor = None
+
+    while True:
+        page = await fetch_page(cursor)
+        if page is None:
+            raise RegisterExportError(f"Failed to fetch register page (cursor={cursor})")
+
+        if sessions is None:
+            sessions = page.sessions
+            column = {session.id: j for j, session in enumerate(sessions)}
+            yield ["Roll Number", "Name"] + [session_header(s) for s in sessions] + ["Attended", "Percentage"]
+
+        marks: Dict[str, List[str]] = {}
+        for record in page.records:
+            j = column.get(record.sessionId)
+            if j is None:
+                continue
+            cells = marks.get(record.studentId)
+            if cells is None:
+                cells = marks[record.studentId] = [""] * len(sessions)
+            cells[j] = "P" if record.present else "A"
+
+        for student in page.students:
+            cells = marks.get(student.id) or [""] * len(sessions)
+            attended = cells.count("P")
+            percentage = round(attended / len(sessions) * 100, 1) if sessions else 0.0
+            yield [student.rollNumber or '', student.name] + cells + [attended, percentage]
+
+        cursor = page.nextCursor
+        if not cursor:
+            break
+
+
+async def stream_register_csv(fetch_page: FetchPage) -> AsyncIterator[str]:
+    """Yield the register as CSV text in chunks, for a streaming HTTP response"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    async for row in iter_register_rows(fetch_page):
+        writer.writerow(row)
+        if buffer.tell() >= STREAM_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+async def iter_row_batches(fetch_page: FetchPage, size: int = WRITE_BATCH_ROWS) -> AsyncIterator[List[List]]:
+    batch = []
+    async for row in iter_register_rows(fetch_page):
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def write_register(fetch_page: FetchPage, fmt: str, path: str) -> int:
+    """Write the register to path a batch of rows at a time; returns the number of student rows.
+
+    File writes run in a worker thread, so a large export doesn't hold up the
+    event loop between page fetches.
+    """
+    rows = 0
+
+    if fmt == "csv":
+        f = await asyncio.to_thread(open, path, "w", newline="", encoding="utf-8")
+        try:
+            writer = csv.writer(f)
+            async for batch in iter_row_batches(fetch_page):
+                await asyncio.to_thread(writer.writerows, batch)
+                rows += len(batch)
+        finally:
+            await asyncio.to_thread(f.close)
+    elif fmt == "xlsx":
+        try:
+            from openpyxl import Workbook
+        except ImportError:
+            raise RegisterExportError("XLSX export requires openpyxl")
+
+        # Write-only workbooks stream rows to disk instead of building a sheet in memory
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet("Register")
+
+        def append_rows(batch: List[List]):
+            for row in batch:
+                sheet.append(row)
+
+        async for batch in iter_row_batches(fetch_page):
+            await asyncio.to_thread(append_rows, batch)
+            rows += len(batch)
+        await asyncio.to_thread(workbook.save, path)
+    else:
+        raise RegisterExportError(f"Unsupported export format: {fmt}")
+
+    # Don't count the header row
+    return max(rows - 1, 0)
+
+
+class RegisterExports:
+    """Finished export files, addressed by an unguessable id used in download links"""
+
+    def __init__(self, directory: str = EXPORT_DIR, ttl: timedelta = EXPORT_TTL,
+                 id_filter: Optional[Callable[[str], bool]] = None):
+        self.directory = directory
+        self.ttl = ttl
+        # Restricts which ids may be issued, e.g. to ids a sharded instance owns
+        self.id_filter = id_filter
+        self.exports: Dict[str, Dict] = {}
+
+    def cleanup_expired(self):
+        current_time = datetime.now()
+        expired = [
+            export_id for export_id, export in self.exports.items()
+            if current_time - export["created_at"] > self.ttl
+        ]
+        for export_id in expired:
+            export = self.exports.pop(export_id)
+            try:
+                os.remove(export["path"])
+            except OSError:
+                pass
+
+    async def create(self, fetch_page: FetchPage, fmt: str, download_name: str) -> Dict:
+        """Write a new export file and register it for download"""
+        self.cleanup_expired()
+        os.makedirs(self.directory, exist_ok=True)
+
+        export_id = secrets.token_urlsafe(16)
+        while self.id_filter and not self.id_filter(export_id):
+            export_id = secrets.token_urlsafe(16)
+        path = os.path.join(self.directory, f"{export_id}.{fmt}")
+        try:
+            rows = await write_register(fetch_page, fmt, path)
+        except Exception:
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+
+        export = {
+            "id": export_id,
+            "path": path,
+            "filename": f"{download_name}.{fmt}",
+            "rows": rows,
+            "created_at": datetime.now()
+        }
+        self.exports[export_id] = export
+        logger.info(f"Created register export {export_id} with {rows} rows")
+        return export
+
+    def get(self, export_id: str) -> Optional[Dict]:
+        self.cleanup_expired()
+        return self.exports.get(export_id)
@@ -0,0 +1,79 @@
+from typing import Any, Callable, Dict, Hashable, NamedTuple, Optional
+from collections import OrderedDict
+import copy
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bounds on the cached decoded bodies; the backend revalidates them, so there is no TTL
+MAX_CACHED_RESPONSES = 5000
+MAX_CACHED_BYTES = 64 * 1024 * 1024
+
+
+class CachedResponse(NamedTuple):
+    etag: str
+    value: Any
+    size: int
+
+
+class RevalidatingCache:
+    """Decoded backend responses kept with their ETags for conditional GETs.
+
+    A cached entry's validator is sent as If-None-Match; on a 304 the decoded
+    value is reused without downloading or parsing the body again. Callers get
+    a value built from the body (a shallow copy by default), never the cached
+    body itself, since conversation state mutates what it fetched. Least
+    recently used entries are evicted first.
+    """
+
+    def __init__(self, max_entries: int = MAX_CACHED_RESPONSES, max_bytes: int = MAX_CACHED_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[Hashable, CachedResponse]" = OrderedDict()
+        self.total_bytes = 0
+        self.not_modified = 0
+        self.modified = 0
+        self.bytes_saved = 0
+
+    def lookup(self, key: Hashable) -> Optional[CachedResponse]:
+        return self.entries.get(key)
+
+    def revalidated(self, key: Hashable, entry: CachedResponse,
+                    copy_value: Optional[Callable[[Any], Any]] = None) -> Any:
+        """The value of an entry whose validator just got a 304"""
+        if self.entries.get(key) is entry:
+            self.entries.move_to_end(key)
+        self.not_modified += 1
+        self.bytes_saved += entry.size
+        return (copy_value or copy.copy)(entry.value)
+
+    def store(self, key: Hashable, etag: Optional[str], value: Any, size: int,
+              copy_value: Optional[Callable[[Any], Any]] = None) -> Any:
+        """Keep a fresh 200 body (if it has a validator) and return the caller's value"""
+        self.modified += 1
+        self.discard(key)
+        if not etag or size > self.max_bytes:
+            return (copy_value or copy.copy)(value)
+
+        self.entries[key] = CachedResponse(etag, value, size)
+        self.total_bytes += size
+        while len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.total_bytes -= evicted.size
+        return (copy_value or copy.copy)(value)
+
+    def discard(self, key: Hashable):
+        entry = self.entries.pop(key, None)
+        if entry:
+            self.total_bytes -= entry.size
+
+    def stats(self) -> Dict:
+        fetches = self.not_modified + self.modified
+        return {
+            "entries": len(self.entries),
+            "cachedBytes": self.total_bytes,
+            "notModified": self.not_modified,
+            "modified": self.modified,
+            "bytesSaved": self.bytes_saved,
+            "notModifiedRatio": round(self.not_modified / fetches, 3) if fetches else 0.0
+        }
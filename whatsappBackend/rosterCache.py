@@ -0,0 +1,156 @@
+"""Class section rosters shared between the conversations showing them.
+
+Theory, lab and tutorial teachers of a section often have its roster open at
+the same time. Rather than each conversation keeping its own copy of every
+student's details and display line, attendance records point at one shared
+student dict per student, and the display lines are built once per section.
+Each conversation only keeps its own present flags.
+"""
+from typing import Dict, Hashable, List, Optional, Tuple
+from collections import OrderedDict
+import logging
+import os
+import sys
+import weakref
+
+from messageBuilder import format_student_line
+from models import AttendanceRecord, TeachingAssignment
+
+logger = logging.getLogger(__name__)
+
+# Bytes of rosters no conversation is using that are kept for the next one to open them
+ROSTER_CACHE_MAX_BYTES = int(os.getenv("ROSTER_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+# Size of an empty str object; ASCII strings add one byte per character
+STR_OVERHEAD = sys.getsizeof("")
+
+
+def class_section_key(assignment: Optional[TeachingAssignment]) -> Optional[Tuple]:
+    """Rosters of assignments with the same course, branch, semester and section list the same students"""
+    if assignment is None:
+        return None
+    return (assignment.courseId, assignment.branchId, assignment.semester, assignment.section)
+
+
+def student_size(student_id: str, student: Dict, line: str) -> int:
+    """Approximate bytes held for one student: the nested dicts, their strings and the display line.
+
+    The strings may also be referenced by a cached response body, so this is an upper bound.
+    """
+    user = student.get('user') or {}
+    text = [value for value in (*student.values(), *user.values()) if isinstance(value, str)]
+    return (sys.getsizeof(student) + sys.getsizeof(user) + len(student_id) + len(line)
+            + sum(map(len, text)) + STR_OVERHEAD * (len(text) + 2))
+
+
+class SharedRoster:
+    """The student part of a class section's roster, shared by every conversation showing it.
+
+    students maps studentId to the nested student dict that attendance
+    records point at, lines to the display line. Both are only ever read, so
+    a change (a renamed student) replaces the entry rather than editing it.
+    name_index is built from students on first use and dropped on any change.
+    """
+    __slots__ = ("key", "students", "lines", "size", "name_index", "holders", "__weakref__")
+
+    def __init__(self, key: Hashable):
+        self.key = key
+        self.students: Dict[str, Dict] = {}
+        self.lines: Dict[str, str] = {}
+        self.size = 0
+        self.name_index = None
+        # Holds of the conversations showing this roster; each leaves the set when its conversation lets go
+        self.holders: "weakref.WeakSet[RosterHold]" = weakref.WeakSet()
+
+
+class RosterHold:
+    """A conversation's hold on a shared roster, kept in its session next to the roster.
+
+    The session is the only strong reference, so the hold goes away with the
+    session or when the session moves to another roster.
+    """
+    __slots__ = ("__weakref__",)
+
+
+class RosterCache:
+    """Process-wide, reference-counted cache of class section rosters.
+
+    Conversations hold their SharedRoster in the session, so a roster lives
+    as long as any conversation uses it and is released by ordinary
+    reference counting when the last one moves on, logs out or expires.
+    The cache itself keeps the most recently used rosters alive up to
+    max_bytes for the next conversation to open them; least recently used
+    ones are let go first. Per-session attendance stays on the records.
+    """
+
+    def __init__(self, max_bytes: int = ROSTER_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        # Every roster still alive, whether held by conversations or only by recent
+        self.live: "weakref.WeakValueDictionary[Hashable, SharedRoster]" = weakref.WeakValueDictionary()
+        self.recent: "OrderedDict[Hashable, SharedRoster]" = OrderedDict()
+        self.recent_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def share(self, key: Hashable, records: List[AttendanceRecord]) -> SharedRoster:
+        """Point the records' student dicts at the shared roster of key, adding students it lacks.
+
+        The roster is kept in the session; its lines serve as the session's
+        roster lines (students of other sessions in there are never looked up).
+        """
+        roster = self.live.get(key)
+        if roster is None:
+            roster = self.live[key] = SharedRoster(key)
+        elif key in self.recent:
+            self.recent_bytes -= roster.size
+
+        for record in records:
+            student_id = record.studentId
+            student = record.student or {}
+            shared = roster.students.get(student_id)
+            if shared is None or shared != student:
+                self.misses += 1
+                if shared is not None:
+                    roster.size -= student_size(student_id, shared, roster.lines[student_id])
+                line = format_student_line(record)
+                roster.students[student_id], roster.lines[student_id] = student, line
+                roster.name_index = None
+                roster.size += student_size(student_id, student, line)
+            else:
+                self.hits += 1
+                record.student = shared
+
+        self.recent[key] = roster
+        self.recent.move_to_end(key)
+        self.recent_bytes += roster.size
+        self.evict()
+        return roster
+
+    def hold(self, roster: SharedRoster) -> RosterHold:
+        """A new hold on roster, for the session that is about to show it"""
+        hold = RosterHold()
+        roster.holders.add(hold)
+        return hold
+
+    def evict(self):
+        while self.recent_bytes > self.max_bytes and len(self.recent) > 1:
+            _, roster = self.recent.popitem(last=False)
+            self.recent_bytes -= roster.size
+            self.evictions += 1
+
+    def stats(self) -> Dict:
+        live = list(self.live.values())
+        in_use = [roster for roster in live if roster.holders]
+        lookups = self.hits + self.misses
+        return {
+            "rosters": len(live),
+            "inUse": len(in_use),
+            "retained": len(self.recent),
+            "bytes": sum(roster.size for roster in live),
+            "retainedBytes": self.recent_bytes,
+            "maxBytes": self.max_bytes,
+            "studentHits": self.hits,
+            "studentMisses": self.misses,
+            "hitRatio": round(self.hits / lookups, 3) if lookups else None,
+            "evictions": self.evictions
+        }
@@ -0,0 +1,245 @@
+"""Production launcher: worker processes, uvloop and httptools, tuned sockets and graceful draining.
+
+Usage:
+    python server.py [--host 0.0.0.0] [--port 8001] [--workers 4] [--backlog 2048]
+                     [--keep-alive 75] [--graceful-timeout 30] [--loop auto] [--http auto]
+
+Every option also reads an environment variable (see --help), so the same
+command works under systemd, Docker or a process manager.
+
+Conversations live in each process's memory, so several workers shard them
+among themselves exactly as separate instances do (see sharding.py): every
+worker accepts on the shared public socket and forwards webhooks for phones
+it doesn't own, and requests for exports and import jobs it didn't create,
+to the owning worker over loopback. Worker i listens internally on
+--internal-port + i, so a restarted worker (or a restarted launcher with the
+same worker count) keeps its place on the ring and restores its own session
+snapshot. The attendance archive has a single writer and needs one worker.
+
+SIGTERM drains: each worker stops accepting, finishes in-flight requests for
+up to --graceful-timeout seconds, then runs the app's shutdown hooks, which
+flush queued check-in writes, wait for export links and import jobs
+(SHUTDOWN_DRAIN_TIMEOUT) and save the session snapshot.
+"""
+from typing import Any, Dict, List, Optional
+import argparse
+import importlib.util
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import secrets
+import signal
+import socket
+import sys
+import time
+
+import uvicorn
+
+from attendanceArchive import ATTENDANCE_ARCHIVE_DIR
+from sessionSnapshot import SESSION_SNAPSHOT_PATH
+from sharding import SHARD_PEERS, SHARD_SECRET
+from tracing import TRACE_EXPORT_FILE
+
+logger = logging.getLogger(__name__)
+
+APP = "main:app"
+SERVER_HOST = os.getenv("SERVER_HOST", "localhost")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8001"))
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "1"))
+# Capped by net.core.somaxconn; absorbs a class's check-in burst while workers catch up
+SERVER_BACKLOG = int(os.getenv("SERVER_BACKLOG", "2048"))
+# Longer than the idle timeout of the proxy in front (60s on most load balancers), so the
+# proxy never reuses a connection the server has just closed and answers 502
+SERVER_KEEP_ALIVE = int(os.getenv("SERVER_KEEP_ALIVE", "75"))
+SERVER_GRACEFUL_TIMEOUT = int(os.getenv("SERVER_GRACEFUL_TIMEOUT", "30"))
+SERVER_LOOP = os.getenv("SERVER_LOOP", "auto")
+SERVER_HTTP = os.getenv("SERVER_HTTP", "auto")
+# Worker i listens for forwarded requests on 127.0.0.1:<SERVER_INTERNAL_PORT + i> (default: port + 1000)
+SERVER_INTERNAL_PORT = os.getenv("SERVER_INTERNAL_PORT")
+SERVER_ACCESS_LOG = os.getenv("SERVER_ACCESS_LOG", "false").lower() == "true"
+
+# A worker exiting sooner than this after starting is broken, not crashed; don't restart it in a loop
+WORKER_MIN_UPTIME = 5.0
+# Extra time the launcher gives workers after the graceful timeout to run their shutdown hooks
+SHUTDOWN_HOOKS_TIMEOUT = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "20")) + 10
+
+LOOPS = {"uvloop": "uvloop", "asyncio": None}
+HTTP_PARSERS = {"httptools": "httptools", "h11": "h11"}
+
+
+def implementation(choice: str, options: Dict[str, Optional[str]], kind: str) -> str:
+    """The first installed option for 'auto', else the chosen one if its package is installed"""
+    if choice == "auto":
+        for name, module in options.items():
+            if module is None or importlib.util.find_spec(module):
+                return name
+        raise RuntimeError(f"None of the {kind} implementations ({', '.join(options)}) is installed")
+
+    if choice not in options:
+        raise ValueError(f"Unknown {kind}: {choice} (choose from auto, {', '.join(options)})")
+    module = options[choice]
+    if module and not importlib.util.find_spec(module):
+        raise RuntimeError(f"{kind} {choice} requires the {module} package (pip install 'uvicorn[standard]')")
+    return choice
+
+
+def listen(host: str, port: int, backlog: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.create_server((host, port), family=family, backlog=backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def somaxconn() -> Optional[int]:
+    try:
+        with open("/proc/sys/net/core/somaxconn") as f:
+            return int(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def serve(app: Any, options: Dict, sockets: List[socket.socket]):
+    """Run one server process on already bound sockets"""
+    uvicorn.Server(uvicorn.Config(app, **options)).run(sockets=sockets)
+
+
+def worker_env(index: int, urls: List[str], secret: str) -> Dict[str, str]:
+    """Shard settings and per-process file paths for worker index"""
+    env = {
+        "SHARD_SELF_URL": urls[index],
+        "SHARD_PEERS": ",".join(urls),
+        "SHARD_SECRET": secret,
+        "SESSION_SNAPSHOT_PATH": f"{SESSION_SNAPSHOT_PATH}.worker{index}"
+    }
+    if TRACE_EXPORT_FILE:
+        env["TRACE_EXPORT_FILE"] = f"{TRACE_EXPORT_FILE}.worker{index}"
+    return env
+
+
+def supervise(options: Dict, public: socket.socket, internal: List[socket.socket], graceful_timeout: int) -> int:
+    """Run one worker per internal socket, restart crashed ones, and drain them all on SIGTERM"""
+    context = multiprocessing.get_context("spawn")
+    urls = [f"http://127.0.0.1:{sock.getsockname()[1]}" for sock in internal]
+    secret = SHARD_SECRET or secrets.token_urlsafe(32)
+    processes: List[multiprocessing.Process] = []
+    started: List[float] = []
+
+    def start(index: int) -> multiprocessing.Process:
+        process = context.Process(target=serve, args=(APP, options, [public, internal[index]]), name=f"worker-{index}")
+        # Spawned workers inherit the environment; settings are read when the modules are first imported
+        env = worker_env(index, urls, secret)
+        saved = {name: os.environ.get(name) for name in env}
+        os.environ.update(env)
+        try:
+            process.start()
+        finally:
+            for name, value in saved.items():
+                if value is None:
+                    os.environ.pop(name)
+                else:
+                    os.environ[name] = value
+        logger.info(f"Started worker {index} (pid {process.pid}) on {urls[index]}")
+        return process
+
+    for index in range(len(internal)):
+        processes.append(start(index))
+        started.append(time.monotonic())
+
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+    signal.signal(signal.SIGINT, lambda signum, frame: stopping.append(signum))
+
+    exit_code = 0
+    while not stopping:
+        exited = multiprocessing.connection.wait([process.sentinel for process in processes], timeout=1.0)
+        for index, process in enumerate(processes):
+            if process.sentinel not in exited or stopping:
+                continue
+            if time.monotonic() - started[index] < WORKER_MIN_UPTIME:
+                logger.error(f"Worker {index} exited with {process.exitcode} right after starting; shutting down")
+                stopping.append(signal.SIGTERM)
+                exit_code = 1
+                break
+            logger.error(f"Worker {index} (pid {process.pid}) exited with {process.exitcode}; restarting")
+            processes[index] = start(index)
+            started[index] = time.monotonic()
+
+    # Ctrl-C already reached the workers through the process group, and a second SIGINT would make them force-exit
+    if stopping[0] != signal.SIGINT or exit_code:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+    logger.info(f"Draining {sum(process.is_alive() for process in processes)} workers")
+
+    deadline = time.monotonic() + graceful_timeout + SHUTDOWN_HOOKS_TIMEOUT
+    for process in processes:
+        process.join(max(0.0, deadline - time.monotonic()))
+    for index, process in enumerate(processes):
+        if process.is_alive():
+            logger.error(f"Worker {index} (pid {process.pid}) did not drain in time; killing it")
+            process.kill()
+            process.join()
+    return exit_code
+
+
+def main(app: Any = APP):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=SERVER_HOST, help="(default: $SERVER_HOST or localhost)")
+    parser.add_argument("--port", type=int, default=SERVER_PORT, help="(default: $SERVER_PORT or 8001)")
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS, help="(default: $SERVER_WORKERS or 1)")
+    parser.add_argument("--backlog", type=int, default=SERVER_BACKLOG, help="(default: $SERVER_BACKLOG or 2048)")
+    parser.add_argument("--keep-alive", type=int, default=SERVER_KEEP_ALIVE,
+                        help="idle keep-alive seconds (default: $SERVER_KEEP_ALIVE or 75)")
+    parser.add_argument("--graceful-timeout", type=int, default=SERVER_GRACEFUL_TIMEOUT,
+                        help="seconds to finish in-flight requests on SIGTERM (default: $SERVER_GRACEFUL_TIMEOUT or 30)")
+    parser.add_argument("--loop", default=SERVER_LOOP, help="auto, uvloop or asyncio (default: $SERVER_LOOP or auto)")
+    parser.add_argument("--http", default=SERVER_HTTP, help="auto, httptools or h11 (default: $SERVER_HTTP or auto)")
+    parser.add_argument("--internal-port", type=int, default=int(SERVER_INTERNAL_PORT) if SERVER_INTERNAL_PORT else None,
+                        help="first loopback port for forwarding between workers (default: $SERVER_INTERNAL_PORT or port + 1000)")
+    parser.add_argument("--access-log", action="store_true", default=SERVER_ACCESS_LOG,
+                        help="log every request (default: $SERVER_ACCESS_LOG or off; the bot logs each message anyway)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.workers > 1 and SHARD_PEERS:
+        parser.error("SHARD_PEERS is set: run one worker per configured shard instance")
+    if args.workers > 1 and ATTENDANCE_ARCHIVE_DIR:
+        parser.error("ATTENDANCE_ARCHIVE_DIR is set: the attendance archive needs a single worker")
+    try:
+        loop = implementation(args.loop, LOOPS, "event loop")
+        http = implementation(args.http, HTTP_PARSERS, "HTTP parser")
+    except (RuntimeError, ValueError) as e:
+        parser.error(str(e))
+
+    limit = somaxconn()
+    if limit is not None and args.backlog > limit:
+        logger.warning(f"Backlog {args.backlog} is capped at net.core.somaxconn={limit}")
+
+    options = {
+        "loop": loop,
+        "http": http,
+        "lifespan": "on",
+        "backlog": args.backlog,
+        "timeout_keep_alive": args.keep_alive,
+        "timeout_graceful_shutdown": args.graceful_timeout,
+        "access_log": args.access_log,
+        "server_header": False
+    }
+    public = listen(args.host, args.port, args.backlog)
+    logger.info(f"Serving on {args.host}:{args.port} with {args.workers} worker(s), {loop} loop, {http} parser, "
+                f"backlog {args.backlog}, keep-alive {args.keep_alive}s")
+
+    if args.workers == 1:
+        serve(app, options, [public])
+        return
+
+    internal_port = args.internal_port if args.internal_port is not None else args.port + 1000
+    internal = [listen("127.0.0.1", internal_port + index, args.backlog) for index in range(args.workers)]
+    sys.exit(supervise(options, public, internal, args.graceful_timeout))
+
+
+if __name__ == "__main__":
+    main()
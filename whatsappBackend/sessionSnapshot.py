@@ -0,0 +1,238 @@
+"""Session snapshots for warm restarts.
+
+On shutdown the bot writes its conversation sessions and login bindings to a
+file; on startup it reads them back, so a deploy doesn't log every teacher out
+mid roll-call.
+
+The file is streamed line by line, one JSON document per line:
+    header      {"version", "createdAt", "phones"}
+    tokens      Fernet-encrypted JSON list of the distinct tokens
+    users       JSON list of the distinct user_info dicts
+    phones      one flat array per phone, see PHONE_FIELDS
+
+Tokens are the only secret, so they are encrypted together in one blob (one
+decryption on restore instead of one per session). Sessions only store the
+fields that differ from a fresh session, which keeps idle sessions to a short
+array. Rosters of sessions mid roll-call are left out and fetched again on
+the teacher's next message, since a roster may have changed anyway while the
+bot was down. That and sharing token/user entries between a phone's session
+and binding is what keeps restore of 50k phones well under a second.
+
+Assignments, sessions and rosters are held as models and stored as the JSON
+the backend sent (see MODEL_SESSION_KEYS). Every other stored value must be
+JSON already; anything else fails the snapshot with SnapshotError rather than
+being restored as a string.
+
+Snapshots are disabled unless SESSION_SNAPSHOT_KEY holds a Fernet key, so
+tokens never hit the disk in clear text.
+"""
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from datetime import datetime, timedelta
+from itertools import islice
+import gc
+import json
+import logging
+import os
+import tempfile
+import time
+
+from decoding import convert, dump
+from models import AttendanceRecord, Session, TeachingAssignment
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+SESSION_SNAPSHOT_PATH = os.getenv(
+    "SESSION_SNAPSHOT_PATH", os.path.join(tempfile.gettempdir(), "attendance_bot_sessions.snapshot")
+)
+# Generate with: python -c "from cryptography.fernet import Fernet; print(Fernet.generate_key().decode())"
+SESSION_SNAPSHOT_KEY = os.getenv("SESSION_SNAPSHOT_KEY")
+
+# Positions in a phone's array; session fields are null when the phone has no session, same for binding
+PHONE_FIELDS = ("phone", "state", "token", "user", "lastActivity", "changes",
+                "bindingToken", "bindingUser", "expiresAt", "verifiedAt")
+# Session keys stored in their own field, or not at all
+SESSION_CORE_KEYS = ("state", "user_token", "user_info", "last_activity", "created_at")
+# Derived per-session caches, left out of snapshots and handoffs and rebuilt lazily from attendance_records
+DERIVED_SESSION_KEYS = ("roster_index", "roster_lines", "roster", "roster_hold", "name_index")
+# The roster and its delta cursor; WhatsAppBot.reload_attendance fetches them on first use after a restore
+REFETCHED_SESSION_KEYS = ("attendance_records", "attendance_synced_at")
+# Session keys holding backend models, stored and handed off as plain JSON
+MODEL_SESSION_KEYS = {
+    "current_assignment": Optional[TeachingAssignment],
+    "current_session": Optional[Session],
+    "assignments": List[TeachingAssignment],
+    "sessions": List[Session],
+    "attendance_records": List[AttendanceRecord],
+}
+# Phone lines decoded per json.loads call on restore
+LOAD_BATCH_SIZE = 4096
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot can't be written or read (bad key, corrupt file, missing cryptography)"""
+
+
+def get_cipher(key: str):
+    try:
+        from cryptography.fernet import Fernet
+    except ImportError:
+        raise SnapshotError("Session snapshots require the cryptography package")
+    try:
+        return Fernet(key)
+    except ValueError as e:
+        raise SnapshotError(f"Invalid SESSION_SNAPSHOT_KEY: {e}")
+
+
+class Interner:
+    """Distinct values in first-seen order, so repeated tokens and user dicts are stored once"""
+
+    def __init__(self, key: Callable = lambda value: value):
+        self.values: List = []
+        self.index: Dict = {}
+        self.key = key
+
+    def add(self, value) -> Optional[int]:
+        if value is None:
+            return None
+        key = self.key(value)
+        i = self.index.get(key)
+        if i is None:
+            i = self.index[key] = len(self.values)
+            self.values.append(value)
+        return i
+
+
+def dump_session_fields(fields: Dict) -> Dict:
+    """Session fields with models turned into plain JSON data"""
+    return {key: dump(value) if key in MODEL_SESSION_KEYS else value for key, value in fields.items()}
+
+
+def load_session_fields(fields: Dict) -> Dict:
+    """Session fields with stored JSON turned back into models"""
+    return {
+        key: convert(value, MODEL_SESSION_KEYS[key]) if key in MODEL_SESSION_KEYS else value
+        for key, value in fields.items()
+    }
+
+
+def save_snapshot(path: str, key: str, sessions: Dict[str, Dict], bindings: Dict[str, Dict],
+                  new_session: Callable[[], Dict]) -> int:
+    """Write sessions and bindings to path atomically; returns the bytes written"""
+    cipher = get_cipher(key)
+    tokens = Interner()
+    # user_info dicts are shared between a phone's session and binding, so intern by identity
+    users = Interner(key=id)
+    defaults = new_session()
+    skipped = set(SESSION_CORE_KEYS + DERIVED_SESSION_KEYS + REFETCHED_SESSION_KEYS)
+
+    rows = []
+    for phone in sessions.keys() | bindings.keys():
+        row = [phone, None, None, None, None, None, None, None, None, None]
+        session = sessions.get(phone)
+        if session is not None:
+            changes = {
+                field: value for field, value in session.items()
+                if field not in skipped and value != defaults.get(field)
+            }
+            row[1] = session["state"].value
+            row[2] = tokens.add(session.get("user_token"))
+            row[3] = users.add(session.get("user_info"))
+            row[4] = session["last_activity"].timestamp()
+            row[5] = dump_session_fields(changes) if changes else None
+        binding = bindings.get(phone)
+        if binding is not None:
+            row[6] = tokens.add(binding["token"])
+            row[7] = users.add(binding["user_info"])
+            row[8] = binding["expires_at"].timestamp()
+            row[9] = binding["verified_at"].timestamp()
+        rows.append(row)
+
+    header = {"version": SNAPSHOT_VERSION, "createdAt": time.time(), "phones": len(rows)}
+    encrypted_tokens = cipher.encrypt(json.dumps(tokens.values).encode()).decode()
+
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(header) + "\n")
+            f.write(encrypted_tokens + "\n")
+            f.write(encode(users.values, "user details") + "\n")
+            for row in rows:
+                f.write(encode(row, f"session of {row[0]}"))
+                f.write("\n")
+            size = f.tell()
+    except SnapshotError:
+        os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+    return size
+
+
+def encode(value, what: str) -> str:
+    try:
+        return json.dumps(value, separators=(",", ":"))
+    except (TypeError, ValueError) as e:
+        raise SnapshotError(f"Could not store the {what}: {e}")
+
+
+def iter_rows(f, batch_size: int = LOAD_BATCH_SIZE) -> Iterator[List]:
+    """Decode the remaining lines a batch at a time, one json.loads call per batch"""
+    while True:
+        lines = list(islice(f, batch_size))
+        if not lines:
+            return
+        yield from json.loads("[" + ",".join(lines) + "]")
+
+
+def load_snapshot(path: str, key: str, session_timeout: timedelta, states: Iterable,
+                  new_session: Callable[[], Dict]) -> Tuple[Dict[str, Dict], Dict[str, Dict]]:
+    """Read a snapshot back into (sessions, bindings), dropping anything expired since it was taken"""
+    cipher = get_cipher(key)
+    state_by_value = {state.value: state for state in states}
+    now = datetime.now()
+    now_ts = now.timestamp()
+    oldest_activity = (now - session_timeout).timestamp()
+    fromtimestamp = datetime.fromtimestamp
+    sessions: Dict[str, Dict] = {}
+    bindings: Dict[str, Dict] = {}
+
+    # Restore allocates a lot of long-lived objects; cyclic GC passes over them are wasted work
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        with open(path, encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            if header.get("version") != SNAPSHOT_VERSION:
+                raise SnapshotError(f"Unsupported snapshot version: {header.get('version')}")
+            try:
+                tokens = json.loads(cipher.decrypt(f.readline().strip().encode()))
+            except Exception:
+                raise SnapshotError("Could not decrypt snapshot tokens (wrong SESSION_SNAPSHOT_KEY?)")
+            users = json.loads(f.readline())
+
+            for row in iter_rows(f):
+                (phone, state, token, user, last_activity, changes,
+                 binding_token, binding_user, expires_at, verified_at) = row
+
+                if state is not None and last_activity >= oldest_activity and state in state_by_value:
+                    session = new_session()
+                    if changes:
+                        session.update(load_session_fields(changes))
+                    session["state"] = state_by_value[state]
+                    session["user_token"] = tokens[token] if token is not None else None
+                    session["user_info"] = users[user] if user is not None else None
+                    session["last_activity"] = fromtimestamp(last_activity)
+                    sessions[phone] = session
+
+                if binding_token is not None and expires_at > now_ts:
+                    bindings[phone] = {
+                        "token": tokens[binding_token],
+                        "user_info": users[binding_user],
+                        "expires_at": fromtimestamp(expires_at),
+                        "verified_at": fromtimestamp(verified_at)
+                    }
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    return sessions, bindings
@@ -0,0 +1,285 @@
+"""Consistent-hash sharding of conversation state across bot instances.
+
+Each instance owns the phone numbers that hash to it on a ring of virtual
+nodes. A webhook landing on another instance is forwarded to the owner over a
+pooled HTTP client, so sessions stay in local memory with no shared store on
+the hot path. Check-ins are routed by their code rather than the student's
+phone, and codes are only issued if they hash to the teacher's instance.
+
+When the peer list changes, each instance sends the sessions and login
+bindings it no longer owns to their new owner. Until a phone's session lands
+there, its messages are still handled by the instance sending it, and a
+session the new owner opened in the meantime gives way to the handed-off one.
+Internal endpoints are authenticated with SHARD_SECRET.
+"""
+from typing import Callable, Dict, Iterable, List, Optional, Set
+from bisect import bisect
+from datetime import datetime
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+
+import httpx
+
+from sessionSnapshot import DERIVED_SESSION_KEYS, dump_session_fields, load_session_fields
+
+logger = logging.getLogger(__name__)
+
+# This instance's base URL as its peers reach it, and the full peer list (comma-separated, including self)
+SHARD_SELF_URL = os.getenv("SHARD_SELF_URL", "").rstrip("/")
+SHARD_PEERS = [peer.strip().rstrip("/") for peer in os.getenv("SHARD_PEERS", "").split(",") if peer.strip()]
+SHARD_SECRET = os.getenv("SHARD_SECRET")
+# Virtual nodes per instance; more means a more even split of phones
+SHARD_VNODES = 512
+SHARD_FORWARD_HEADER = "X-Shard-Forwarded-By"
+SHARD_SECRET_HEADER = "X-Shard-Secret"
+# Rounds of resending sessions that changed while their handoff batch was in flight
+HANDOFF_ROUNDS = 3
+
+
+def ring_hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+def routing_key(phone_number: str, message: str) -> str:
+    """Check-ins go to the instance holding the code; everything else to the phone's owner"""
+    words = message.split()
+    if len(words) >= 2 and words[0].lower() == "checkin":
+        return checkin_routing_key(words[1])
+    return phone_number
+
+
+def checkin_routing_key(code: str) -> str:
+    return f"checkin:{code.upper()}"
+
+
+def resource_routing_key(kind: str, resource_id: str) -> str:
+    """Register exports and import jobs live on the instance that created them"""
+    return f"{kind}:{resource_id}"
+
+
+class HashRing:
+    def __init__(self, nodes: Iterable[str], vnodes: int = SHARD_VNODES):
+        self.nodes = sorted(set(nodes))
+        points = sorted(
+            (ring_hash(f"{node}#{i}"), node)
+            for node in self.nodes for i in range(vnodes)
+        )
+        self.hashes = [point for point, _ in points]
+        self.owners = [node for _, node in points]
+
+    def owner(self, key: str) -> str:
+        i = bisect(self.hashes, ring_hash(key))
+        return self.owners[i % len(self.owners)]
+
+
+def encode_session(session: Dict) -> Dict:
+    record = dump_session_fields({key: value for key, value in session.items() if key not in DERIVED_SESSION_KEYS})
+    record["state"] = session["state"].value
+    record["last_activity"] = session["last_activity"].timestamp()
+    return record
+
+
+def json_object(members: Dict[str, str]) -> str:
+    """A JSON object from already serialised member values"""
+    return "{" + ",".join(f"{json.dumps(key)}:{value}" for key, value in members.items()) + "}"
+
+
+def encode_binding(binding: Dict) -> Dict:
+    return {
+        **binding,
+        "expires_at": binding["expires_at"].timestamp(),
+        "verified_at": binding["verified_at"].timestamp()
+    }
+
+
+class ShardNode:
+    """One instance's view of the ring, plus forwarding and session handoff"""
+
+    def __init__(self, self_url: str, peers: List[str], sessions: Dict[str, Dict], bindings: Dict[str, Dict],
+                 new_session: Callable[[], Dict], states: Iterable, secret: str,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        if not secret:
+            raise ValueError("SHARD_SECRET is required when sharding is enabled")
+        if self_url not in peers:
+            raise ValueError(f"SHARD_SELF_URL {self_url} is not in SHARD_PEERS")
+
+        self.self_url = self_url
+        self.ring = HashRing(peers)
+        self.sessions = sessions
+        self.bindings = bindings
+        self.new_session = new_session
+        self.state_by_value = {state.value: state for state in states}
+        self.secret = secret
+        # One pooled client for all peers; keep-alive connections avoid a handshake per forwarded webhook
+        self.http_client = httpx.AsyncClient(
+            transport=transport,
+            timeout=httpx.Timeout(12.0, connect=2.0),
+            limits=httpx.Limits(max_connections=200, max_keepalive_connections=50)
+        )
+        # When the ring last changed here, and the phones whose sessions are in a handoff batch right now
+        self.ring_changed_at = 0.0
+        self.moving: Set[str] = set()
+        self.forwarded = 0
+        self.forward_failures = 0
+        self.handed_off = 0
+        self.received = 0
+
+    def owner(self, key: str) -> str:
+        return self.ring.owner(key)
+
+    def owns(self, key: str) -> bool:
+        return self.ring.owner(key) == self.self_url
+
+    def holds(self, key: str) -> bool:
+        """Whether a phone's session is on its way to its new owner; its messages are handled here until it lands"""
+        return key in self.moving and key in self.sessions
+
+    def internal_headers(self) -> Dict[str, str]:
+        return {SHARD_FORWARD_HEADER: self.self_url, SHARD_SECRET_HEADER: self.secret}
+
+    def is_internal(self, headers) -> bool:
+        return hmac.compare_digest(headers.get(SHARD_SECRET_HEADER, ""), self.secret)
+
+    async def forward(self, owner: str, path: str, body: bytes, headers: Dict[str, str],
+                      method: str = "POST") -> Optional[httpx.Response]:
+        """Replay a request on its owner; None if the owner couldn't be reached"""
+        try:
+            response = await self.http_client.request(
+                method, f"{owner}{path}", content=body, headers={**headers, **self.internal_headers()}
+            )
+            self.forwarded += 1
+            return response
+        except httpx.HTTPError as e:
+            self.forward_failures += 1
+            logger.error(f"Failed to forward {path} to {owner}: {e}")
+            return None
+
+    async def set_peers(self, peers: List[str]) -> Dict[str, int]:
+        """Switch to a new peer list and hand off the sessions this instance no longer owns.
+
+        A list without this instance drains it: everything is handed off and
+        later webhooks are forwarded.
+        """
+        if not peers:
+            raise ValueError("The peer list can't be empty")
+        self.ring = HashRing(peers)
+        self.ring_changed_at = time.time()
+        return await self.handoff()
+
+    async def handoff(self) -> Dict[str, int]:
+        """Send the sessions and bindings owned elsewhere to their owners, then drop them here.
+
+        A message handled while a batch is in flight may still change a phone's
+        session here; such phones are kept and sent again in the next round.
+        """
+        moved: Dict[str, int] = {}
+        phones = set(self.sessions) | set(self.bindings)
+        for _ in range(HANDOFF_ROUNDS):
+            # Each record is serialised once: for the request body, and to tell later whether it changed
+            outgoing: Dict[str, Dict[str, Dict[str, str]]] = {}
+            for phone in phones:
+                owner = self.ring.owner(phone)
+                if owner == self.self_url:
+                    continue
+                batch = outgoing.setdefault(owner, {"sessions": {}, "bindings": {}})
+                if phone in self.sessions:
+                    batch["sessions"][phone] = json.dumps(encode_session(self.sessions[phone]))
+                if phone in self.bindings:
+                    batch["bindings"][phone] = json.dumps(encode_binding(self.bindings[phone]))
+                self.moving.add(phone)
+
+            changed = set()
+            for owner, batch in outgoing.items():
+                body = json_object({
+                    "since": json.dumps(self.ring_changed_at),
+                    **{kind: json_object(records) for kind, records in batch.items()}
+                })
+                try:
+                    response = await self.http_client.post(
+                        f"{owner}/internal/shard/sessions", content=body,
+                        headers={"Content-Type": "application/json", **self.internal_headers()}
+                    )
+                    response.raise_for_status()
+                except httpx.HTTPError as e:
+                    # Keep them here; a later membership update or handoff retries
+                    logger.error(f"Session handoff to {owner} failed: {e}")
+                    self.moving -= batch["sessions"].keys() | batch["bindings"].keys()
+                    continue
+
+                count = 0
+                for kind, local, encode in (("sessions", self.sessions, encode_session),
+                                            ("bindings", self.bindings, encode_binding)):
+                    for phone, record in batch[kind].items():
+                        current = local.get(phone)
+                        if current is not None and json.dumps(encode(current)) != record:
+                            changed.add(phone)
+                            continue
+                        local.pop(phone, None)
+                        count += 1
+                self.moving -= (batch["sessions"].keys() | batch["bindings"].keys()) - changed
+                moved[owner] = moved.get(owner, 0) + count
+                self.handed_off += count
+                logger.info(f"Handed off {count} sessions and bindings to {owner}")
+
+            if not changed:
+                break
+            phones = changed
+        else:
+            self.moving -= phones
+            logger.warning(f"{len(phones)} sessions kept changing during handoff; a later handoff retries")
+        return moved
+
+    def accept_handoff(self, payload: Dict) -> int:
+        """Take over sessions and bindings from another instance.
+
+        A handed-off session replaces one opened here since the ring changed:
+        while it was on its way, webhooks forwarded by instances already on the
+        new ring found no session here and started a fresh one. Otherwise the
+        most recently active session wins.
+        """
+        # The earlier of the two ring changes; a peer may have switched before either of us
+        since = payload.get("since", 0.0)
+        if self.ring_changed_at:
+            since = min(since, self.ring_changed_at)
+        accepted = 0
+        for phone, record in payload.get("sessions", {}).items():
+            state = self.state_by_value.get(record["state"])
+            current = self.sessions.get(phone)
+            # A session resent after a late change has the same last_activity, and replaces the first copy
+            if state is None or (current and current["last_activity"].timestamp() > record["last_activity"]
+                                 and current.get("created_at", 0.0) < since):
+                continue
+            session = self.new_session()
+            session.update(load_session_fields(record))
+            session["state"] = state
+            session["last_activity"] = datetime.fromtimestamp(record["last_activity"])
+            self.sessions[phone] = session
+            accepted += 1
+
+        for phone, record in payload.get("bindings", {}).items():
+            self.bindings[phone] = {
+                **record,
+                "expires_at": datetime.fromtimestamp(record["expires_at"]),
+                "verified_at": datetime.fromtimestamp(record["verified_at"])
+            }
+
+        self.received += accepted
+        return accepted
+
+    def stats(self) -> Dict:
+        return {
+            "self": self.self_url,
+            "peers": self.ring.nodes,
+            "localSessions": len(self.sessions),
+            "forwarded": self.forwarded,
+            "forwardFailures": self.forward_failures,
+            "handedOff": self.handed_off,
+            "received": self.received
+        }
+
+    async def close(self):
+        await self.http_client.aclose()
@@ -0,0 +1,83 @@
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on how stale a student's overview can be when changed outside the bot
+STUDENT_CACHE_TTL = timedelta(minutes=10)
+MAX_CACHED_STUDENTS = 20000
+
+
+class StudentAttendanceCache:
+    """Per-student attendance overview cache with request coalescing.
+
+    Concurrent misses for the same student share one backend call. Entries are
+    dropped when the bot marks attendance for that student, and otherwise
+    expire after the TTL. Least recently used entries are evicted first.
+    """
+
+    def __init__(self, ttl: timedelta = STUDENT_CACHE_TTL, max_entries: int = MAX_CACHED_STUDENTS):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self.inflight: Dict[str, asyncio.Future] = {}
+        self.stale_inflight = set()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get(self, student_id: str, loader: Callable[[], Awaitable[Optional[List[Dict]]]]) -> Optional[List[Dict]]:
+        entry = self.entries.get(student_id)
+        if entry is not None:
+            if datetime.now() - entry["fetched_at"] <= self.ttl:
+                self.entries.move_to_end(student_id)
+                self.hits += 1
+                return entry["overview"]
+            del self.entries[student_id]
+
+        inflight = self.inflight.get(student_id)
+        if inflight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[student_id] = future
+        overview = None
+        try:
+            overview = await loader()
+            # Skip storing if attendance changed while this load was in flight
+            if overview is not None and student_id not in self.stale_inflight:
+                self.store(student_id, overview)
+        except Exception as e:
+            logger.error(f"Error loading attendance overview for student {student_id}: {e}")
+        finally:
+            self.inflight.pop(student_id, None)
+            self.stale_inflight.discard(student_id)
+            future.set_result(overview)
+        return overview
+
+    def store(self, student_id: str, overview: List[Dict]):
+        self.entries[student_id] = {"overview": overview, "fetched_at": datetime.now()}
+        self.entries.move_to_end(student_id)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, student_ids: Iterable[str]):
+        for student_id in student_ids:
+            self.entries.pop(student_id, None)
+            if student_id in self.inflight:
+                self.stale_inflight.add(student_id)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hitRatio": round((self.hits + self.coalesced) / lookups, 3) if lookups else 0.0
+        }
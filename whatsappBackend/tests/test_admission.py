@@ -0,0 +1,104 @@
+"""Priority admission: displacement by more urgent requests and deadline shedding."""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from admission import PRIORITY_BROWSING, PRIORITY_INTERACTIVE, PRIORITY_ROLL_CALL, AdmissionController
+
+DEADLINES = {PRIORITY_ROLL_CALL: 5.0, PRIORITY_INTERACTIVE: 5.0, PRIORITY_BROWSING: 5.0}
+
+
+async def queued(controller, priority):
+    """Start a request that has to wait, and let it reach the queue"""
+    task = asyncio.create_task(controller.acquire(priority))
+    await asyncio.sleep(0)
+    return task
+
+
+def test_free_slot_admits_without_queueing():
+    async def run():
+        controller = AdmissionController(max_concurrent=2, max_queue=1, deadlines=DEADLINES)
+        assert await controller.acquire(PRIORITY_BROWSING) == (True, 0.0)
+        assert controller.active == 1 and controller.queued == 0
+        controller.release()
+        assert controller.active == 0
+
+    asyncio.run(run())
+
+
+def test_more_urgent_request_displaces_the_least_urgent_queued_one():
+    async def run():
+        controller = AdmissionController(max_concurrent=1, max_queue=2, deadlines=DEADLINES)
+        assert (await controller.acquire(PRIORITY_BROWSING))[0]
+        interactive = await queued(controller, PRIORITY_INTERACTIVE)
+        browsing = await queued(controller, PRIORITY_BROWSING)
+
+        roll_call = await queued(controller, PRIORITY_ROLL_CALL)
+        assert (await browsing)[0] is False
+        assert controller.shed["displaced"][PRIORITY_BROWSING] == 1
+        assert controller.queued == 2
+
+        # The freed slot goes to the most urgent waiter
+        controller.release()
+        assert (await roll_call)[0] is True
+        assert not interactive.done()
+        controller.release()
+        assert (await interactive)[0] is True
+        controller.release()
+        assert controller.active == 0 and controller.queued == 0
+
+    asyncio.run(run())
+
+
+def test_full_queue_sheds_a_request_that_is_not_more_urgent():
+    async def run():
+        controller = AdmissionController(max_concurrent=1, max_queue=1, deadlines=DEADLINES)
+        assert (await controller.acquire(PRIORITY_ROLL_CALL))[0]
+        waiting = await queued(controller, PRIORITY_INTERACTIVE)
+
+        assert await controller.acquire(PRIORITY_INTERACTIVE) == (False, 0.0)
+        assert await controller.acquire(PRIORITY_BROWSING) == (False, 0.0)
+        assert controller.shed["queue_full"][PRIORITY_INTERACTIVE] == 1
+        assert controller.shed["queue_full"][PRIORITY_BROWSING] == 1
+        assert not waiting.done()
+
+        controller.release()
+        assert (await waiting)[0] is True
+        controller.release()
+
+    asyncio.run(run())
+
+
+def test_queued_request_is_shed_at_its_deadline():
+    async def run():
+        deadlines = {**DEADLINES, PRIORITY_BROWSING: 0.05}
+        controller = AdmissionController(max_concurrent=1, max_queue=2, deadlines=deadlines)
+        assert (await controller.acquire(PRIORITY_ROLL_CALL))[0]
+        browsing = await queued(controller, PRIORITY_BROWSING)
+        roll_call = await queued(controller, PRIORITY_ROLL_CALL)
+
+        admitted, waited = await browsing
+        assert admitted is False and waited >= 0.05
+        assert controller.shed["deadline"][PRIORITY_BROWSING] == 1
+        assert controller.queued == 1
+
+        # The expired entry is skipped when the slot is handed on
+        controller.release()
+        assert (await roll_call)[0] is True
+        assert controller.active == 1 and controller.queued == 0
+        controller.release()
+        assert controller.metrics()["queueWaitMs"]["samples"] == 2
+
+    asyncio.run(run())
+
+
+def test_slot_is_released_after_the_block():
+    async def run():
+        controller = AdmissionController(max_concurrent=1, max_queue=1, deadlines=DEADLINES)
+        async with controller.slot(PRIORITY_INTERACTIVE) as (admitted, _):
+            assert admitted and controller.active == 1
+        assert controller.active == 0
+
+    asyncio.run(run())
@@ -0,0 +1,340 @@
+"""The direct read path against the HTTP API it stands in for.
+
+A small school is seeded into a SQLite stand-in database, and the same rows
+back a stand-in for the Express teacher routes (behind httpx.MockTransport),
+written from the routes' Prisma queries rather than from QUERIES. The direct
+path must answer exactly as those routes do, refuse what they refuse, and
+leave tokens it can't verify to them.
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import sqlite3
+import sys
+import time
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import classImplementation
+from classImplementation import attendance_service
+from decoding import dump
+from directReads import SQLITE_SCHEMA, create_direct_reader
+from responseCache import RevalidatingCache
+
+SECRET = "test-secret"
+BACKEND_URL = "http://backend.test"
+
+
+def stamp(day: int, hour: int = 9) -> str:
+    return f"2024-09-{day:02d}T{hour:02d}:00:00.000Z"
+
+
+# Rows by table, in SQLITE_SCHEMA's column order
+TABLES = {
+    "User": [
+        {"id": "user-t", "email": "t@example.edu", "firstName": "Ada", "lastName": "Teacher", "role": "TEACHER",
+         "updatedAt": stamp(1)},
+        {"id": "user-a", "email": "a@example.edu", "firstName": "Grace", "lastName": "Admin", "role": "ADMIN",
+         "updatedAt": stamp(1)},
+        {"id": "user-s", "email": "s@example.edu", "firstName": "Old", "lastName": "Staff", "role": "STUDENT",
+         "updatedAt": stamp(1)},
+    ] + [
+        {"id": f"user-{j}", "email": f"s{j}@example.edu", "firstName": f"First{j}", "lastName": f"Last{j}",
+         "role": "STUDENT", "updatedAt": stamp(1)}
+        for j in range(4)
+    ],
+    "Teacher": [
+        {"id": "teacher-1", "userId": "user-t", "employeeId": "E001"},
+        {"id": "teacher-2", "userId": "user-a", "employeeId": "E002"},
+        # A teacher record left behind by a user whose role was changed
+        {"id": "teacher-3", "userId": "user-s", "employeeId": "E003"},
+    ],
+    # Roll numbers out of insertion order, so the roster's ordering is checked
+    "Student": [
+        {"id": f"student-{j}", "userId": f"user-{j}", "rollNumber": f"CS{1000 + (3 - j)}", "currentSemester": 3,
+         "branchId": "branch-1", "section": "A"}
+        for j in range(4)
+    ],
+    "Branch": [{"id": "branch-1", "name": "Computer Science"}],
+    "Course": [
+        {"id": "course-1", "code": "CS201", "name": "Data Structures", "semester": 3, "branchId": "branch-1"},
+        {"id": "course-2", "code": "CS202", "name": "Algorithms", "semester": 3, "branchId": "branch-1"},
+        {"id": "course-3", "code": "CS301", "name": "Compilers", "semester": 5, "branchId": "branch-1"},
+    ],
+    "TeachingAssignment": [
+        {"id": "assignment-1", "teacherId": "teacher-1", "courseId": "course-1", "branchId": "branch-1",
+         "semester": 3, "section": "A", "academicYear": "2024-25", "active": True, "updatedAt": stamp(1)},
+        {"id": "assignment-2", "teacherId": "teacher-1", "courseId": "course-2", "branchId": "branch-1",
+         "semester": 3, "section": "A", "academicYear": "2024-25", "active": True, "updatedAt": stamp(2)},
+        {"id": "assignment-old", "teacherId": "teacher-1", "courseId": "course-3", "branchId": "branch-1",
+         "semester": 5, "section": "A", "academicYear": "2023-24", "active": False, "updatedAt": stamp(1)},
+        {"id": "assignment-3", "teacherId": "teacher-2", "courseId": "course-3", "branchId": "branch-1",
+         "semester": 5, "section": "A", "academicYear": "2024-25", "active": True, "updatedAt": stamp(1)},
+        {"id": "assignment-4", "teacherId": "teacher-3", "courseId": "course-2", "branchId": "branch-1",
+         "semester": 3, "section": "B", "academicYear": "2024-25", "active": True, "updatedAt": stamp(1)},
+    ],
+    "Session": [
+        {"id": f"session-1-{s}", "date": stamp(s + 2), "topic": f"Lecture {s}" if s != 3 else None,
+         "assignmentId": "assignment-1", "updatedAt": stamp(s + 2, 10)}
+        for s in range(7)
+    ] + [
+        # Created just now, nobody marked yet
+        {"id": "session-1-new", "date": stamp(20), "topic": None, "assignmentId": "assignment-1",
+         "updatedAt": stamp(20)},
+        {"id": "session-3-0", "date": stamp(3), "topic": "Parsing", "assignmentId": "assignment-3",
+         "updatedAt": stamp(3)},
+        {"id": "session-4-0", "date": stamp(3), "topic": "Sorting", "assignmentId": "assignment-4",
+         "updatedAt": stamp(3)},
+    ],
+    "Attendance": [
+        {"id": f"att-{s}-{j}", "sessionId": f"session-1-{s}", "studentId": f"student-{j}", "enrollmentId": f"enr-{j}",
+         "present": (j + s) % 3 != 0, "markedAt": stamp(s + 2, 9 + j), "markedBy": "user-t"}
+        for s in range(7) for j in range(4)
+    ] + [
+        {"id": f"att-admin-{j}", "sessionId": "session-3-0", "studentId": f"student-{j}", "enrollmentId": f"enr-{j}",
+         "present": True, "markedAt": stamp(3), "markedBy": "user-a"}
+        for j in range(2)
+    ],
+}
+
+
+def sign(claims, secret: str = SECRET) -> str:
+    def b64(data: bytes) -> str:
+        return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+    signing_input = f"{b64(json.dumps({'alg': 'HS256', 'typ': 'JWT'}).encode())}.{b64(json.dumps(claims).encode())}"
+    signature = hmac.new(secret.encode(), signing_input.encode(), hashlib.sha256).digest()
+    return f"{signing_input}.{b64(signature)}"
+
+
+def token(user_id: str, expires_in: float = 3600, secret: str = SECRET) -> str:
+    return sign({"id": user_id, "exp": time.time() + expires_in}, secret)
+
+
+def rows(table: str, **where):
+    return [row for row in TABLES[table] if all(row[key] == value for key, value in where.items())]
+
+
+class ExpressStandIn:
+    """The three teacher routes of backend/src/routes/teacher.js over TABLES.
+
+    Tokens are looked up in accepted (as jsonwebtoken would accept them, with
+    the backend's own secret) and the user must be a TEACHER or ADMIN with a
+    teacher record, like authMiddleware(['TEACHER', 'ADMIN']).
+    """
+
+    def __init__(self):
+        self.accepted = {}
+        self.requests = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        url = urlsplit(str(request.url))
+        query = {name: values[0] for name, values in parse_qs(url.query).items()}
+        user_id = self.accepted.get(request.headers.get("Authorization", "").replace("Bearer ", ""))
+        users = rows("User", id=user_id)
+        if not users:
+            return httpx.Response(401, json={"message": "Token is not valid"})
+        if users[0]["role"] not in ("TEACHER", "ADMIN"):
+            return httpx.Response(403, json={"message": "Forbidden: insufficient permissions"})
+        teacher_id = rows("Teacher", userId=user_id)[0]["id"]
+
+        parts = url.path.split("/")[3:]
+        if parts == ["assignments"]:
+            status, body = 200, self.assignments(teacher_id)
+        elif len(parts) == 3 and parts[0] == "sessions" and parts[2] == "attendance":
+            status, body = self.roster(parts[1], teacher_id)
+        elif len(parts) == 2 and parts[0] == "sessions":
+            status, body = self.sessions(parts[1], teacher_id, query.get("limit"), query.get("cursor"))
+        else:
+            status, body = 404, {"message": "Not found"}
+        return httpx.Response(status, json=body)
+
+    def assignments(self, teacher_id: str):
+        assignments = [
+            {**assignment, "course": rows("Course", id=assignment["courseId"])[0],
+             "branch": rows("Branch", id=assignment["branchId"])[0]}
+            for assignment in rows("TeachingAssignment", teacherId=teacher_id, active=True)
+        ]
+        return sorted(assignments, key=lambda assignment: assignment["course"]["name"])
+
+    def sessions(self, assignment_id: str, teacher_id: str, limit, cursor):
+        if not rows("TeachingAssignment", id=assignment_id, teacherId=teacher_id, active=True):
+            return 403, {"message": "Not authorized to view sessions for this course"}
+        sessions = sorted(rows("Session", assignmentId=assignment_id),
+                          key=lambda session: (session["date"], session["id"]), reverse=True)
+        if limit is None:
+            return 200, sessions
+        take = min(max(int(limit) or 10, 1), 100)
+        if cursor:
+            ids = [session["id"] for session in sessions]
+            sessions = sessions[ids.index(cursor) + 1:] if cursor in ids else []
+        page = sessions[:take]
+        return 200, {"sessions": page, "nextCursor": page[-1]["id"] if len(sessions) > take else None}
+
+    def roster(self, session_id: str, teacher_id: str):
+        sessions = rows("Session", id=session_id)
+        if not sessions or rows("TeachingAssignment", id=sessions[0]["assignmentId"])[0]["teacherId"] != teacher_id:
+            return 403, {"message": "Not authorized to view this session"}
+        marks = []
+        for mark in rows("Attendance", sessionId=session_id):
+            student = rows("Student", id=mark["studentId"])[0]
+            marks.append((student["rollNumber"], mark, rows("User", id=student["userId"])[0]))
+        marks.sort(key=lambda item: item[0])
+        return 200, {
+            "cursor": max((mark["markedAt"] for _, mark, _ in marks), default=None),
+            "studentIds": [mark["studentId"] for _, mark, _ in marks],
+            "present": [1 if mark["present"] else 0 for _, mark, _ in marks],
+            "rollNumbers": [roll_number for roll_number, _, _ in marks],
+            "firstNames": [user["firstName"] for _, _, user in marks],
+            "lastNames": [user["lastName"] for _, _, user in marks]
+        }
+
+
+@pytest.fixture
+def database(tmp_path):
+    path = str(tmp_path / "standin.db")
+    db = sqlite3.connect(path)
+    db.executescript(SQLITE_SCHEMA)
+    for table, table_rows in TABLES.items():
+        placeholders = ", ".join("?" * len(table_rows[0]))
+        db.executemany(f'INSERT INTO "{table}" VALUES ({placeholders})', [tuple(row.values()) for row in table_rows])
+    db.commit()
+    db.close()
+    return f"sqlite:///{path}"
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    """The stand-in routes behind attendance_service, with a fresh ETag cache and no direct path"""
+    standin = ExpressStandIn()
+    monkeypatch.setattr(classImplementation, "EXISTING_BACKEND_URL", BACKEND_URL)
+    monkeypatch.setattr(classImplementation, "response_cache", RevalidatingCache())
+    monkeypatch.setattr(classImplementation, "direct_reader", None)
+    monkeypatch.setattr(attendance_service, "http_client", httpx.AsyncClient(transport=httpx.MockTransport(standin)))
+    return standin
+
+
+def over_http(backend: ExpressStandIn, path: str, user_token: str, **params):
+    """Status and body of a route as the bot receives it over HTTP"""
+    backend.accepted[user_token] = json.loads(base64.urlsafe_b64decode(user_token.split(".")[1] + "=="))["id"]
+    response = backend(httpx.Request("GET", f"{BACKEND_URL}{path}", params=params,
+                                     headers={"Authorization": f"Bearer {user_token}"}))
+    return response.status_code, response.json()
+
+
+def direct(database: str, name: str, *args):
+    async def read():
+        reader = create_direct_reader(database, SECRET, size=2)
+        try:
+            return await reader.read(name, *args)
+        finally:
+            await reader.close()
+    return asyncio.run(read())
+
+
+@pytest.mark.parametrize("user_id", ["user-t", "user-a"])
+def test_assignments_match_http(database, backend, user_id):
+    user_token = token(user_id)
+    status, body = direct(database, "assignments", user_token)
+    assert (status, body) == over_http(backend, "/api/teachers/assignments", user_token)
+    assert body
+
+
+def test_assignments_need_a_teacher_or_admin_role(database):
+    assert direct(database, "assignments", token("user-s")) == (200, [])
+
+
+def test_session_pages_match_http(database, backend):
+    user_token = token("user-t")
+    assert direct(database, "sessions", "assignment-1", user_token) == \
+        over_http(backend, "/api/teachers/sessions/assignment-1", user_token)
+
+    cursor, pages = None, 0
+    while True:
+        params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+        status, body = direct(database, "sessions", "assignment-1", user_token, 3, cursor)
+        assert (status, body) == over_http(backend, "/api/teachers/sessions/assignment-1", user_token, **params)
+        pages += 1
+        cursor = body["nextCursor"]
+        if cursor is None:
+            break
+    assert pages == 3
+
+
+def test_roster_matches_http(database, backend):
+    user_token = token("user-t")
+    status, body = direct(database, "roster", "session-1-2", user_token)
+    assert (status, body) == over_http(backend, "/api/teachers/sessions/session-1-2/attendance", user_token,
+                                       format="roster")
+    assert body["rollNumbers"] == sorted(body["rollNumbers"])
+
+
+def test_admin_reads_their_own_sessions_and_roster(database, backend):
+    user_token = token("user-a")
+    assert direct(database, "sessions", "assignment-3", user_token) == \
+        over_http(backend, "/api/teachers/sessions/assignment-3", user_token)
+    assert direct(database, "roster", "session-3-0", user_token) == \
+        over_http(backend, "/api/teachers/sessions/session-3-0/attendance", user_token, format="roster")
+
+
+def test_empty_roster_of_own_session_is_not_forbidden(database, backend):
+    user_token = token("user-t")
+    status, body = direct(database, "roster", "session-1-new", user_token)
+    assert (status, body) == over_http(backend, "/api/teachers/sessions/session-1-new/attendance", user_token,
+                                       format="roster")
+    assert body["studentIds"] == []
+
+
+@pytest.mark.parametrize("name, args, path", [
+    ("sessions", ("assignment-3",), "/api/teachers/sessions/assignment-3"),
+    ("sessions", ("assignment-3", 5, None), "/api/teachers/sessions/assignment-3"),
+    ("sessions", ("assignment-old",), "/api/teachers/sessions/assignment-old"),
+    ("roster", ("session-3-0",), "/api/teachers/sessions/session-3-0/attendance"),
+    ("roster", ("session-missing",), "/api/teachers/sessions/session-missing/attendance"),
+])
+def test_other_teachers_data_is_forbidden(database, backend, name, args, path):
+    user_token = token("user-t")
+    assert direct(database, name, args[0], user_token, *args[1:]) == (403, None)
+    assert over_http(backend, path, user_token)[0] == 403
+
+
+@pytest.mark.parametrize("user_token", [
+    token("user-t", expires_in=-60),
+    token("user-t", secret="another-secret"),
+    "not-a-jwt",
+])
+def test_unverifiable_tokens_fall_back_to_http(database, backend, monkeypatch, user_token):
+    assert direct(database, "assignments", user_token) == (None, None)
+
+    # The backend has the final say; here it accepts the token (its clock or secret differs)
+    backend.accepted[user_token] = "user-t"
+
+    async def fetch():
+        reader = create_direct_reader(database, SECRET, size=2)
+        monkeypatch.setattr(classImplementation, "direct_reader", reader)
+        try:
+            assignments = await attendance_service.get_teaching_assignments(user_token)
+            sessions, next_cursor = await attendance_service.get_sessions("assignment-1", user_token, limit=3)
+            roster, _ = await attendance_service.get_session_attendance("session-1-0", user_token)
+            return assignments, sessions, next_cursor, roster, reader.fallbacks
+        finally:
+            await reader.close()
+
+    assignments, sessions, next_cursor, roster, fallbacks = asyncio.run(fetch())
+    assert fallbacks == 3
+    assert [request.url.path for request in backend.requests] == [
+        "/api/teachers/assignments", "/api/teachers/sessions/assignment-1",
+        "/api/teachers/sessions/session-1-0/attendance"
+    ]
+    assert dump(assignments) == backend.assignments("teacher-1")
+    assert [session.id for session in sessions] == ["session-1-new", "session-1-6", "session-1-5"]
+    assert next_cursor == "session-1-5"
+    assert [record.studentId for record in roster] == ["student-3", "student-2", "student-1", "student-0"]
@@ -0,0 +1,121 @@
+"""Token-bucket rate limits: refill, retry_after and failing open when the store errors."""
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rateLimit
+from rateLimit import BucketLimit, MemoryBucketStore, RateLimiter
+
+PHONE = "whatsapp:+910000000001"
+LIMITS = {"message": BucketLimit(3, 1.0), "login": BucketLimit(2, 0.1)}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FailingStore:
+    """Stands in for a Redis store whose server is unreachable"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def take(self, key, limit, cost=1):
+        self.calls += 1
+        raise ConnectionError("Error 111 connecting to localhost:6379. Connection refused.")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rateLimit.time, "monotonic", clock)
+    return clock
+
+
+def test_bucket_refills_over_time(clock):
+    async def run():
+        limiter = RateLimiter(MemoryBucketStore(), LIMITS)
+        for _ in range(3):
+            assert (await limiter.check(PHONE, "status")).allowed
+        assert not (await limiter.check(PHONE, "status")).allowed
+
+        clock.now += 1.0
+        assert (await limiter.check(PHONE, "status")).allowed
+        assert not (await limiter.check(PHONE, "status")).allowed
+
+        # Never refilled past capacity
+        clock.now += 60.0
+        assert await limiter.remaining(PHONE, "message") == 3
+
+    asyncio.run(run())
+
+
+def test_denied_message_reports_retry_after(clock):
+    async def run():
+        limiter = RateLimiter(MemoryBucketStore(), LIMITS)
+        assert (await limiter.check(PHONE, "login a b")).allowed
+        assert (await limiter.check(PHONE, "login a b")).allowed
+
+        decision = await limiter.check(PHONE, "login a b")
+        assert not decision.allowed
+        assert decision.command_class == "login"
+        assert decision.retry_after == pytest.approx(10.0)
+        assert limiter.denied["login"] == 1
+
+        clock.now += 4.0
+        assert (await limiter.check(PHONE, "login a b")).retry_after == pytest.approx(6.0)
+
+        # Other phones and other commands have buckets of their own
+        assert (await limiter.check("whatsapp:+910000000002", "login a b")).allowed
+        assert (await limiter.check(PHONE, "help")).allowed
+
+    asyncio.run(run())
+
+
+def test_store_errors_fail_open():
+    async def run():
+        store = FailingStore()
+        limiter = RateLimiter(store, LIMITS)
+        for _ in range(10):
+            decision = await limiter.check(PHONE, "login a b")
+            assert decision.allowed and decision.retry_after == 0.0
+        assert store.calls == 20
+        assert limiter.allowed == 10
+        assert limiter.denied == {"message": 0, "login": 0}
+        assert await limiter.remaining(PHONE, "login") == 2
+
+    asyncio.run(run())
+
+
+def test_unreachable_redis_fails_open():
+    pytest.importorskip("redis")
+
+    async def run():
+        # Nothing listens on port 1
+        limiter = RateLimiter(rateLimit.RedisBucketStore("redis://127.0.0.1:1/0"), LIMITS)
+        for _ in range(5):
+            assert (await limiter.check(PHONE, "status")).allowed
+        await limiter.store.client.aclose()
+
+    asyncio.run(run())
+
+
+def test_least_recently_used_bucket_is_forgotten(clock):
+    async def run():
+        store = MemoryBucketStore(max_buckets=2)
+        limit = BucketLimit(1, 0.001)
+        assert (await store.take("a", limit))[0]
+        assert (await store.take("b", limit))[0]
+        assert not (await store.take("a", limit))[0]
+        assert (await store.take("c", limit))[0]
+        assert list(store.buckets) == ["a", "c"]
+
+    asyncio.run(run())
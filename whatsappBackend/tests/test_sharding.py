@@ -0,0 +1,230 @@
+"""Forwarding and session handoff between in-process instances on a hash ring.
+
+Instances talk through an httpx.MockTransport that dispatches on the URL host,
+so ShardNode's forwarding and handoff requests run as they would over HTTP.
+Cluster.webhook is the sharding part of main.process_webhook, with a counter
+standing in for conversation progress.
+"""
+import asyncio
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+from urllib.parse import parse_qs, urlencode
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from classImplementation import UserState, new_user_session
+from sharding import HashRing, ShardNode, routing_key
+
+SECRET = "test-secret"
+PHONES = [f"whatsapp:+91{i:010d}" for i in range(300)]
+
+
+class Cluster:
+    def __init__(self, urls, peers=None):
+        self.nodes = {}
+        # Called with the receiving node before each handoff is accepted, to interleave other traffic
+        self.before_handoff = None
+        self.fail_handoffs = False
+        for url in urls:
+            self.add(url, peers or urls)
+
+    def add(self, url, peers):
+        self.nodes[url] = ShardNode(url, peers, {}, {}, new_user_session, UserState, SECRET,
+                                    transport=httpx.MockTransport(self.dispatch))
+
+    async def dispatch(self, request: httpx.Request) -> httpx.Response:
+        node = self.nodes[f"http://{request.url.host}"]
+        if request.url.path == "/internal/shard/sessions":
+            assert node.is_internal(request.headers)
+            if self.fail_handoffs:
+                return httpx.Response(503)
+            if self.before_handoff:
+                await self.before_handoff(node)
+            return httpx.Response(200, json={"accepted": node.accept_handoff(json.loads(request.content))})
+        form = {key: values[0] for key, values in parse_qs(request.content.decode()).items()}
+        return await self.webhook(node, form["From"], form["Body"], request.headers)
+
+    async def webhook(self, node, phone, message="status", headers=None) -> httpx.Response:
+        headers = headers or {}
+        if not node.is_internal(headers):
+            key = routing_key(phone, message)
+            owner = node.owner(key)
+            if owner != node.self_url and not node.holds(key):
+                body = urlencode({"From": phone, "Body": message}).encode()
+                response = await node.forward(owner, "/webhook/whatsapp", body, {})
+                return httpx.Response(response.status_code, content=response.content)
+
+        session = node.sessions.get(phone)
+        if session is None:
+            session = node.sessions[phone] = new_user_session()
+            session["state"] = UserState.AUTHENTICATED
+        session["last_activity"] = datetime.now()
+        session["sessions_offset"] += 1
+        return httpx.Response(200, content=node.self_url.encode())
+
+    async def send(self, phone, via, message="status") -> str:
+        response = await self.webhook(self.nodes[via], phone, message)
+        return response.content.decode()
+
+    def placement(self):
+        """Each phone's instance and progress, checking that no phone has a session on two instances"""
+        found = {}
+        for url, node in self.nodes.items():
+            for phone, session in node.sessions.items():
+                assert phone not in found, f"{phone} on {found[phone][0]} and {url}"
+                found[phone] = (url, session["sessions_offset"])
+        return found
+
+    async def close(self):
+        for node in self.nodes.values():
+            await node.close()
+
+
+URLS = ["http://bot-0", "http://bot-1", "http://bot-2"]
+JOINED = URLS + ["http://bot-3"]
+
+
+async def seeded_cluster(peers=URLS):
+    """Three instances, each phone with progress 2 reached through two different instances"""
+    cluster = Cluster(URLS, peers)
+    for i, phone in enumerate(PHONES):
+        await cluster.send(phone, URLS[i % 3])
+        await cluster.send(phone, URLS[(i + 1) % 3])
+    return cluster
+
+
+def moving_phone(cluster, source):
+    """A phone owned by source that moves to the joining instance"""
+    ring = HashRing(JOINED)
+    return next(phone for phone in PHONES if cluster.nodes[source].owns(phone) and ring.owner(phone) == JOINED[-1])
+
+
+def test_webhooks_are_handled_by_the_owner():
+    async def run():
+        cluster = await seeded_cluster()
+        placement = cluster.placement()
+        assert set(placement) == set(PHONES)
+        for phone, (url, progress) in placement.items():
+            assert cluster.nodes[url].owns(phone)
+            assert progress == 2
+        assert sum(node.forwarded for node in cluster.nodes.values()) > 0
+        await cluster.close()
+
+    asyncio.run(run())
+
+
+def test_checkins_are_routed_by_code():
+    async def run():
+        cluster = Cluster(URLS)
+        code_owner = cluster.nodes[URLS[0]].owner("checkin:AB12CD")
+        for url in URLS:
+            assert await cluster.send(PHONES[0], url, "checkin ab12cd") == code_owner
+        await cluster.close()
+
+    asyncio.run(run())
+
+
+def test_join_hands_off_sessions_without_loss():
+    async def run():
+        cluster = await seeded_cluster()
+        before = cluster.placement()
+        cluster.add(JOINED[-1], JOINED)
+        moved = 0
+        for url in URLS:
+            moved += sum((await cluster.nodes[url].set_peers(JOINED)).values())
+
+        after = cluster.placement()
+        assert moved == sum(1 for url, _ in after.values() if url == JOINED[-1]) > 0
+        assert {phone: progress for phone, (_, progress) in after.items()} == \
+            {phone: progress for phone, (_, progress) in before.items()}
+        for phone, (url, _) in after.items():
+            assert cluster.nodes[url].owns(phone)
+            assert not cluster.nodes[url].moving
+        await cluster.close()
+
+    asyncio.run(run())
+
+
+def test_failed_handoff_keeps_sessions():
+    async def run():
+        cluster = await seeded_cluster()
+        before = cluster.placement()
+        cluster.add(JOINED[-1], JOINED)
+        cluster.fail_handoffs = True
+        assert await cluster.nodes[URLS[0]].set_peers(JOINED) == {}
+        assert cluster.placement() == before
+        assert not cluster.nodes[URLS[0]].moving
+        await cluster.close()
+
+    asyncio.run(run())
+
+
+def test_message_at_the_sender_mid_handoff_is_kept():
+    async def run():
+        cluster = await seeded_cluster()
+        cluster.add(JOINED[-1], JOINED)
+        sender = cluster.nodes[URLS[0]]
+        phone = moving_phone(cluster, URLS[0])
+        handled_by = []
+
+        async def message_in_flight(node):
+            if not handled_by:
+                handled_by.append(await cluster.send(phone, URLS[0]))
+
+        cluster.before_handoff = message_in_flight
+        await sender.set_peers(JOINED)
+
+        # Handled against the real session at the sender, then resent to the new owner
+        assert handled_by == [URLS[0]]
+        assert phone not in sender.sessions
+        assert cluster.nodes[JOINED[-1]].sessions[phone]["sessions_offset"] == 3
+        assert not sender.moving
+        await cluster.close()
+
+    asyncio.run(run())
+
+
+def test_session_opened_by_the_new_owner_mid_handoff_is_replaced():
+    async def run():
+        cluster = await seeded_cluster()
+        cluster.add(JOINED[-1], JOINED)
+        phone = moving_phone(cluster, URLS[0])
+        # Another instance is already on the new ring and forwards the phone straight to its new owner
+        await cluster.nodes[URLS[1]].set_peers(JOINED)
+        opened = []
+
+        async def forwarded_in_flight(node):
+            if not opened:
+                opened.append(await cluster.send(phone, URLS[1]))
+                assert node.sessions[phone]["sessions_offset"] == 1
+
+        cluster.before_handoff = forwarded_in_flight
+        await cluster.nodes[URLS[0]].set_peers(JOINED)
+
+        assert opened == [JOINED[-1]]
+        assert cluster.placement()[phone] == (JOINED[-1], 2)
+        await cluster.close()
+
+    asyncio.run(run())
+
+
+def test_older_record_does_not_replace_a_newer_session():
+    async def run():
+        node = ShardNode(URLS[0], URLS, {}, {}, new_user_session, UserState, SECRET)
+        now = datetime.now()
+        session = node.sessions["p"] = new_user_session()
+        session["state"] = UserState.AUTHENTICATED
+        session["created_at"] = (now - timedelta(hours=1)).timestamp()
+        session["sessions_offset"] = 5
+        record = {"state": UserState.AUTHENTICATED.value, "last_activity": (now - timedelta(minutes=5)).timestamp(),
+                  "sessions_offset": 2}
+
+        assert node.accept_handoff({"since": now.timestamp(), "sessions": {"p": record}}) == 0
+        assert node.sessions["p"]["sessions_offset"] == 5
+        await node.close()
+
+    asyncio.run(run())
@@ -0,0 +1,206 @@
+from typing import Any, Dict, List, Optional
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Header carrying the trace id to the Express backend (and back to the caller)
+TRACE_HEADER = "X-Trace-Id"
+TRACE_ID_PATTERN = re.compile(r"[0-9a-f]{16}")
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() != "false"
+# Most recent finished spans kept in memory for /debug/traces
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "5000"))
+# Optional JSON-lines file every finished span is appended to
+TRACE_EXPORT_FILE = os.getenv("TRACE_EXPORT_FILE")
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+def new_id() -> str:
+    return f"{random.getrandbits(64):016x}"
+
+
+def inbound_trace_id(value: Optional[str]) -> Optional[str]:
+    """A trace id received in TRACE_HEADER, if it has the form new_id() gives; anything else is dropped"""
+    if value and TRACE_ID_PATTERN.fullmatch(value):
+        return value
+    return None
+
+
+class Span:
+    """One timed operation; nested spans share the trace id of their root"""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start", "start_ns", "duration_ns",
+                 "attributes", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace_id = trace_id
+        self.span_id = new_id()
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.time()
+        self.start_ns = time.perf_counter_ns()
+        self.duration_ns = 0
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    def set(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self) -> float:
+        return self.duration_ns / 1e6
+
+    def to_dict(self) -> Dict:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentId": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "durationMs": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "error": self.error
+        }
+
+
+class SpanBuffer:
+    """Bounded ring of finished spans, oldest dropped first"""
+
+    def __init__(self, max_spans: int = TRACE_BUFFER_SIZE):
+        self.spans: deque = deque(maxlen=max_spans)
+
+    def export(self, span: Span):
+        self.spans.append(span)
+
+    def query(self, trace_id: Optional[str] = None, name: Optional[str] = None,
+              min_duration_ms: float = 0, limit: int = 100) -> List[Dict]:
+        """Most recent spans first, filtered by trace id, name prefix and duration"""
+        matches = []
+        for span in reversed(self.spans):
+            if trace_id and span.trace_id != trace_id:
+                continue
+            if name and not span.name.startswith(name):
+                continue
+            if span.duration_ms < min_duration_ms:
+                continue
+            matches.append(span.to_dict())
+            if len(matches) >= limit:
+                break
+        return matches
+
+    def trace(self, trace_id: str) -> List[Dict]:
+        """All buffered spans of one trace, in start order"""
+        spans = [span for span in self.spans if span.trace_id == trace_id]
+        return [span.to_dict() for span in sorted(spans, key=lambda span: span.start_ns)]
+
+
+class FileSpanExporter:
+    """Appends finished spans to a JSON-lines file, a batch of lines per write"""
+
+    def __init__(self, path: str, batch_size: int = 100):
+        self.path = path
+        self.batch_size = batch_size
+        self.pending: List[str] = []
+        self.lock = threading.Lock()
+
+    def export(self, span: Span):
+        self.pending.append(json.dumps(span.to_dict(), default=str))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            lines, self.pending = self.pending, []
+            if not lines:
+                return
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write("\n".join(lines) + "\n")
+            except OSError as e:
+                logger.error(f"Failed to write {len(lines)} spans to {self.path}: {e}")
+
+    def close(self):
+        self.flush()
+
+
+class Tracer:
+    """Creates spans and hands finished ones to the exporters.
+
+    An exporter is any object with export(span) and, optionally, close().
+    """
+
+    def __init__(self, enabled: bool = TRACING_ENABLED, buffer: Optional[SpanBuffer] = None):
+        self.enabled = enabled
+        self.buffer = buffer or SpanBuffer()
+        self.exporters: List[Any] = [self.buffer]
+
+    def add_exporter(self, exporter: Any):
+        self.exporters.append(exporter)
+
+    @contextmanager
+    def span(self, name: str, trace_id: Optional[str] = None, **attributes):
+        """Time the enclosed block as a child of the current span (or as a new trace)"""
+        if not self.enabled:
+            yield None
+            return
+
+        parent = _current_span.get()
+        if parent is not None:
+            span = Span(name, parent.trace_id, parent.span_id, attributes)
+        else:
+            span = Span(name, trace_id or new_id(), None, attributes)
+
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.duration_ns = time.perf_counter_ns() - span.start_ns
+            _current_span.reset(token)
+            for exporter in self.exporters:
+                try:
+                    exporter.export(span)
+                except Exception as e:
+                    logger.error(f"Span exporter {type(exporter).__name__} failed: {e}")
+
+    def traced(self, name: Optional[str] = None):
+        """Decorator running an async function inside a span named after it"""
+        def decorator(func):
+            span_name = name or func.__name__
+
+            @wraps(func)
+            async def wrapper(*args, **kwargs):
+                with self.span(span_name):
+                    return await func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def current_span(self) -> Optional[Span]:
+        return _current_span.get()
+
+    def current_trace_id(self) -> Optional[str]:
+        span = _current_span.get()
+        return span.trace_id if span else None
+
+    def close(self):
+        for exporter in self.exporters:
+            close = getattr(exporter, "close", None)
+            if close:
+                close()
+
+
+tracer = Tracer()
+if TRACE_EXPORT_FILE:
+    tracer.add_exporter(FileSpanExporter(TRACE_EXPORT_FILE))